@@ -0,0 +1,315 @@
+import datetime as dt
+import gzip
+import os
+import pathlib
+import pickle
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.db import DB_PATH
+from rankr.db.models import FuruTweet, Ticker, TickerHistory
+
+
+logger = get_logger()
+
+ARCHIVE_PATH = DB_PATH.parent.joinpath("archive")
+ARCHIVE_HORIZON_DAYS = 365
+
+TWEETS_ARCHIVE = "furu_tweet"
+HISTORY_ARCHIVE = "ticker_history"
+
+
+def get_partition_path(archive: str, month: str, archive_path: pathlib.Path) -> pathlib.Path:
+    suffix = ".pkl.gz" if archive == TWEETS_ARCHIVE else ".csv.gz"
+    return archive_path.joinpath(archive, month + suffix)
+
+
+def list_partition_months(
+    archive: str, archive_path: pathlib.Path = ARCHIVE_PATH
+) -> List[str]:
+    directory = archive_path.joinpath(archive)
+    if not directory.exists():
+        return []
+    return sorted(p.name.split(".")[0] for p in directory.iterdir() if p.name.endswith(".gz"))
+
+
+def _replace_file(path: pathlib.Path, write_function):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    write_function(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def read_tweets_partition_index(path: pathlib.Path) -> Dict[int, bytes]:
+    """
+    Tweet partitions map each furu id to its own pickled records, so readers only unpickle
+    the furus they need. Partitions written as a single list of records are indexed on read.
+    """
+    if not path.exists():
+        return {}
+    with gzip.open(path, "rb") as f:
+        partition = pickle.load(f)
+    if isinstance(partition, dict):
+        return partition
+    records_by_furu_id: Dict[int, List[dict]] = {}
+    for record in partition:
+        records_by_furu_id.setdefault(record["furu_id"], []).append(record)
+    return {
+        furu_id: pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+        for furu_id, records in records_by_furu_id.items()
+    }
+
+
+def read_tweets_partition(
+    path: pathlib.Path, furu_ids: Optional[Iterable[int]] = None
+) -> List[dict]:
+    """Archived chunks of the given furus (all furus by default) in a partition"""
+    index = read_tweets_partition_index(path)
+    selected_furu_ids = index.keys() if furu_ids is None else set(furu_ids) & index.keys()
+    return [
+        record for furu_id in selected_furu_ids for record in pickle.loads(index[furu_id])
+    ]
+
+
+def write_tweets_partition(path: pathlib.Path, index: Dict[int, bytes]):
+    def write(temporary_path):
+        with gzip.open(temporary_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _replace_file(path, write)
+
+
+def merge_tweets_partition(path: pathlib.Path, records: List[dict]):
+    """Adds chunks to a partition, leaving the records of other furus pickled as they are"""
+    index = read_tweets_partition_index(path)
+    records_by_furu_id: Dict[int, List[dict]] = {}
+    for record in records:
+        records_by_furu_id.setdefault(record["furu_id"], []).append(record)
+    for furu_id, furu_records in records_by_furu_id.items():
+        archived = {r["id"]: r for r in pickle.loads(index.get(furu_id, pickle.dumps([])))}
+        archived.update({r["id"]: r for r in furu_records})
+        index[furu_id] = pickle.dumps(
+            sorted(archived.values(), key=lambda r: r["id"]), protocol=pickle.HIGHEST_PROTOCOL
+        )
+    write_tweets_partition(path, index)
+
+
+def read_history_partition(path: pathlib.Path) -> pd.DataFrame:
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_csv(path, parse_dates=["date"])
+
+
+def write_history_partition(path: pathlib.Path, frame: pd.DataFrame):
+    _replace_file(
+        path, lambda temporary_path: frame.to_csv(temporary_path, index=False, compression="gzip")
+    )
+
+
+def get_history_archive_horizon(session: Session, horizon_date: dt.date) -> dt.date:
+    """Keeps the history still needed to price pending positions in the hot database"""
+    min_pending_date = session.execute(
+        text(
+            """
+            SELECT MIN(pending_date) FROM (
+                SELECT date_entered AS pending_date FROM furu_ticker
+                WHERE price_entered IS NULL
+                UNION ALL
+                SELECT date_closed FROM furu_ticker
+                WHERE date_closed IS NOT NULL AND price_closed IS NULL
+            )
+            """
+        )
+    ).scalar()
+    if min_pending_date is not None:
+        min_pending_date = dt.date.fromisoformat(str(min_pending_date))
+        return min(horizon_date, min_pending_date - dt.timedelta(days=10))
+    return horizon_date
+
+
+def archive_ticker_history(
+    session: Session, horizon_date: dt.date, archive_path: pathlib.Path = ARCHIVE_PATH
+) -> int:
+    horizon_date = get_history_archive_horizon(session, horizon_date)
+    frame = pd.read_sql(
+        text(
+            """
+            SELECT th.id, t.symbol, th.ticker_id, th.date, th.open, th.high, th.low,
+                th.close, th.volume
+            FROM ticker_history th
+            JOIN ticker t ON t.id = th.ticker_id
+            WHERE th.date < :horizon_date
+            """
+        ),
+        session.bind,
+        params={"horizon_date": horizon_date.isoformat()},
+        parse_dates=["date"],
+    )
+    if frame.empty:
+        logger.info(f"No ticker history to archive before {horizon_date}")
+        return 0
+
+    logger.info(f"Archiving {len(frame)} ticker history rows before {horizon_date}")
+    for month, month_frame in frame.groupby(frame.date.dt.strftime("%Y-%m")):
+        path = get_partition_path(HISTORY_ARCHIVE, month, archive_path)
+        merged = pd.concat([read_history_partition(path), month_frame])
+        merged = merged.drop_duplicates(subset=["symbol", "date"], keep="last")
+        write_history_partition(path, merged.sort_values(by=["symbol", "date"]))
+
+    session.execute(
+        text("DELETE FROM ticker_history WHERE date < :horizon_date"),
+        {"horizon_date": horizon_date.isoformat()},
+    )
+    session.commit()
+
+    return len(frame)
+
+
+def archive_furu_tweets(
+    session: Session, horizon_date: dt.date, archive_path: pathlib.Path = ARCHIVE_PATH
+) -> int:
+    """Archives tweet chunks already turned into positions, always keeping each furu's latest"""
+    chunk_ids = [
+        chunk_id
+        for chunk_id, in session.execute(
+            text(
+                """
+                SELECT ft.id
+                FROM furu_tweet ft
+                JOIN furu f ON f.id = ft.furu_id
+                WHERE ft.tweets_max_date < :horizon_date
+                    AND ft.tweets_max_date < f.date_last_updated
+                    AND ft.id < (
+                        SELECT MAX(latest.id) FROM furu_tweet latest
+                        WHERE latest.furu_id = ft.furu_id
+                    )
+                """
+            ),
+            {"horizon_date": horizon_date.isoformat()},
+        )
+    ]
+    if not chunk_ids:
+        logger.info(f"No furu tweets to archive before {horizon_date}")
+        return 0
+
+    logger.info(f"Archiving {len(chunk_ids)} furu tweet chunks before {horizon_date}")
+    chunks: List[FuruTweet] = (
+        session.query(FuruTweet).filter(FuruTweet.id.in_(chunk_ids)).all()
+    )
+    records_by_month: Dict[str, List[dict]] = {}
+    for chunk in chunks:
+        records_by_month.setdefault(chunk.tweets_max_date.strftime("%Y-%m"), []).append(
+            {
+                "id": chunk.id,
+                "furu_id": chunk.furu_id,
+                "tweets_min_date": chunk.tweets_min_date,
+                "tweets_max_date": chunk.tweets_max_date,
+                "tweets_min_id": chunk.tweets_min_id,
+                "tweets_max_id": chunk.tweets_max_id,
+                "tweets": chunk.tweets,
+            }
+        )
+    for month, records in records_by_month.items():
+        merge_tweets_partition(get_partition_path(TWEETS_ARCHIVE, month, archive_path), records)
+
+    for chunk in chunks:
+        session.delete(chunk)
+    session.commit()
+
+    return len(chunks)
+
+
+def vacuum_database(session: Session):
+    logger.info("Vacuuming database to release archived pages")
+    raw_connection = session.get_bind().raw_connection()
+    try:
+        raw_connection.execute("VACUUM")
+    finally:
+        raw_connection.close()
+
+
+def archive_cold_data(
+    session: Session,
+    horizon_days: int = ARCHIVE_HORIZON_DAYS,
+    archive_path: pathlib.Path = ARCHIVE_PATH,
+    vacuum: bool = True,
+) -> Dict[str, int]:
+    horizon_date = dt.date.today() - dt.timedelta(days=horizon_days)
+    archived = {
+        TWEETS_ARCHIVE: archive_furu_tweets(session, horizon_date, archive_path),
+        HISTORY_ARCHIVE: archive_ticker_history(session, horizon_date, archive_path),
+    }
+    if vacuum and any(archived.values()):
+        vacuum_database(session)
+
+    return archived
+
+
+def load_archived_tweets_by_furu_id(
+    furu_ids: List[int] = None, archive_path: pathlib.Path = ARCHIVE_PATH
+) -> Dict[int, list]:
+    """Archived tweets of the given furus (all furus by default), oldest chunks first"""
+    tweets_by_furu_id = {}
+    for month in list_partition_months(TWEETS_ARCHIVE, archive_path):
+        records = read_tweets_partition(
+            get_partition_path(TWEETS_ARCHIVE, month, archive_path), furu_ids
+        )
+        for record in sorted(records, key=lambda r: r["id"]):
+            tweets_by_furu_id.setdefault(record["furu_id"], []).extend(record["tweets"])
+    return tweets_by_furu_id
+
+
+def load_archived_ticker_history(
+    symbol: str,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+    archive_path: pathlib.Path = ARCHIVE_PATH,
+) -> List[TickerHistory]:
+    """Transient, date-ordered TickerHistory objects for a symbol from the archive"""
+    months = [
+        month
+        for month in list_partition_months(HISTORY_ARCHIVE, archive_path)
+        if (start is None or month >= start.strftime("%Y-%m"))
+        and (end is None or month <= end.strftime("%Y-%m"))
+    ]
+    histories = []
+    for month in months:
+        frame = read_history_partition(
+            get_partition_path(HISTORY_ARCHIVE, month, archive_path)
+        )
+        for row in frame[frame.symbol == symbol].itertuples():
+            date = row.date.date()
+            if (start is None or start <= date) and (end is None or date <= end):
+                histories.append(
+                    TickerHistory(
+                        date=date,
+                        high=row.high,
+                        open=row.open,
+                        close=row.close,
+                        low=row.low,
+                        volume=row.volume,
+                        ticker_id=row.ticker_id,
+                    )
+                )
+    return sorted(histories, key=lambda h: h.date)
+
+
+def get_archived_history_at_after_date(
+    archived_histories: List[TickerHistory], date: dt.date, max_day_distance=5
+) -> Optional[TickerHistory]:
+    for history in archived_histories:
+        if date <= history.date <= date + dt.timedelta(days=max_day_distance):
+            return history
+    return None
+
+
+def get_ticker_history_with_archive(
+    ticker: Ticker, archived_histories: List[TickerHistory], date: dt.date
+) -> Optional[TickerHistory]:
+    return ticker.get_history_at_date(date) or get_archived_history_at_after_date(
+        archived_histories, date
+    )
@@ -0,0 +1,344 @@
+import concurrent.futures as cf
+import dataclasses
+import datetime as dt
+import itertools
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import holidays
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.actions.archives import (
+    ARCHIVE_PATH,
+    HISTORY_ARCHIVE,
+    get_partition_path,
+    list_partition_months,
+    load_archived_tweets_by_furu_id,
+    read_history_partition,
+)
+from rankr.actions.calculates import derive_furu_metrics_frame
+from rankr.actions.leaderboards import filter_leaderboard_metrics
+from rankr.db.models import Furu
+
+
+logger = get_logger()
+
+PRICE_POINTS = ("mid", "open", "close")
+MAX_PRICE_DAY_DISTANCE = 5
+
+MentionDates = Dict[Tuple[int, str], np.ndarray]
+PriceArrays = Dict[str, Dict[str, np.ndarray]]
+
+_worker_data: Optional[Tuple[MentionDates, PriceArrays, np.datetime64]] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class PositionRuleParameters:
+    days_silence_for_position_exit: int = Furu.DAYS_SILENCE_FOR_POSITION_EXIT
+    days_taken_to_exit_position: int = Furu.DAYS_TAKEN_TO_EXIT_POSITION
+    price_point: str = "mid"
+
+    def __post_init__(self):
+        assert self.price_point in PRICE_POINTS, f"price_point must be one of {PRICE_POINTS}"
+
+
+def get_parameter_grid(
+    days_silence_for_position_exit: Iterable[int],
+    days_taken_to_exit_position: Iterable[int],
+    price_points: Iterable[str] = ("mid",),
+) -> List[PositionRuleParameters]:
+    return [
+        PositionRuleParameters(silence, exit_days, price_point)
+        for silence, exit_days, price_point in itertools.product(
+            days_silence_for_position_exit, days_taken_to_exit_position, price_points
+        )
+    ]
+
+
+def get_mention_dates_by_symbol(tweets: list) -> Dict[str, List[dt.date]]:
+    """Mention dates per symbol, extracted the same way raw positions are created"""
+    cash_tickers = {
+        word.upper()
+        for tweet in tweets
+        for word in tweet.text.split()
+        if word.startswith("$") and word[1:].isalpha()
+    }
+    mention_dates = {}
+    for cash_ticker in cash_tickers:
+        dates = sorted(
+            {
+                tweet.created_at.date()
+                for tweet in tweets
+                if cash_ticker in tweet.text.upper().split()
+                or cash_ticker[1:] in tweet.text.upper().split()
+            }
+        )
+        if dates:
+            mention_dates[cash_ticker[1:]] = dates
+    return mention_dates
+
+
+def load_mention_dates(dbsess: Session, include_archived: bool = True) -> MentionDates:
+    furus = dbsess.query(Furu).filter(Furu.status == Furu.Status.ACTIVE).all()
+    archived_tweets_by_furu_id = (
+        load_archived_tweets_by_furu_id([furu.id for furu in furus])
+        if include_archived
+        else {}
+    )
+    mention_dates = {}
+    for furu in furus:
+        tweets = archived_tweets_by_furu_id.get(furu.id, []) + furu.get_all_furu_tweets()
+        for symbol, dates in get_mention_dates_by_symbol(tweets).items():
+            mention_dates[(furu.id, symbol)] = np.array(dates, dtype="datetime64[D]")
+    logger.info(
+        f"Loaded mention dates of {len(mention_dates)} furu symbols for {len(furus)} furus"
+    )
+    return mention_dates
+
+
+def load_price_arrays(
+    dbsess: Session, symbols: Iterable[str], include_archived: bool = True
+) -> PriceArrays:
+    """Date-sorted open/close arrays per symbol from the stored (and archived) ticker history"""
+    symbols = set(symbols)
+    frames = [
+        pd.read_sql(
+            text(
+                """
+                SELECT t.symbol, th.date, th.open, th.close
+                FROM ticker_history th
+                JOIN ticker t ON t.id = th.ticker_id
+                """
+            ),
+            dbsess.bind,
+            parse_dates=["date"],
+        )
+    ]
+    if include_archived:
+        frames += [
+            read_history_partition(get_partition_path(HISTORY_ARCHIVE, month, ARCHIVE_PATH))[
+                ["symbol", "date", "open", "close"]
+            ]
+            for month in list_partition_months(HISTORY_ARCHIVE)
+        ]
+    history = pd.concat(frames)
+    history = history[history.symbol.isin(symbols)]
+    history = history.drop_duplicates(subset=["symbol", "date"]).sort_values(
+        by=["symbol", "date"]
+    )
+    price_arrays = {
+        symbol: {
+            "date": symbol_history.date.values.astype("datetime64[D]"),
+            "open": symbol_history.open.to_numpy(dtype=float),
+            "close": symbol_history.close.to_numpy(dtype=float),
+        }
+        for symbol, symbol_history in history.groupby("symbol")
+    }
+    logger.info(f"Loaded price arrays for {len(price_arrays)} symbols")
+    return price_arrays
+
+
+def replay_mention_dates(
+    mention_dates: np.ndarray,
+    parameters: PositionRuleParameters,
+    today: np.datetime64,
+    business_holidays: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Entry and exit dates of the positions the mention state machine would create,
+    with NaT exits for positions still open today.
+    """
+    breaks = np.diff(mention_dates).astype(int) > parameters.days_silence_for_position_exit
+    first_mentions = mention_dates[np.r_[True, breaks]]
+    last_mentions = mention_dates[np.r_[breaks, True]]
+    entry_dates = np.busday_offset(
+        first_mentions, 0, roll="forward", holidays=business_holidays
+    )
+    exit_dates = last_mentions + np.timedelta64(parameters.days_taken_to_exit_position, "D")
+    if (today - last_mentions[-1]).astype(int) <= parameters.days_silence_for_position_exit:
+        exit_dates[-1] = np.datetime64("NaT")
+    return entry_dates, exit_dates
+
+
+def get_prices_at_after_dates(
+    prices: Dict[str, np.ndarray], dates: np.ndarray, price_point: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized `Ticker.get_history_at_after_date` returning priced dates and prices"""
+    if price_point == "mid":
+        price_values = (prices["open"] + prices["close"]) / 2
+    else:
+        price_values = prices[price_point]
+    history_dates = prices["date"]
+    positions = np.searchsorted(history_dates, dates, side="left")
+    in_range = (positions < len(history_dates)) & ~np.isnat(dates)
+    positions = np.where(in_range, positions, 0)
+    priced_dates = np.where(in_range, history_dates[positions], np.datetime64("NaT"))
+    in_range &= (priced_dates - dates).astype(int) <= MAX_PRICE_DAY_DISTANCE
+    priced_values = np.where(in_range, price_values[positions], np.nan)
+    return np.where(in_range, priced_dates, np.datetime64("NaT")), priced_values
+
+
+def backtest_position_rules(
+    parameters: PositionRuleParameters,
+    mention_dates: MentionDates,
+    price_arrays: PriceArrays,
+    today: np.datetime64,
+) -> pd.DataFrame:
+    """Per-furu scoring columns for one parameter set, computed fully in memory"""
+    business_holidays = np.array(
+        list(holidays.US(years=range(2000, today.astype(object).year + 2)).keys()),
+        dtype="datetime64[D]",
+    )
+    furu_ids, returns, holding_days = [], [], []
+    for (furu_id, symbol), dates in mention_dates.items():
+        prices = price_arrays.get(symbol)
+        if prices is None:
+            continue
+        entry_dates, exit_dates = replay_mention_dates(
+            dates, parameters, today, business_holidays
+        )
+        entry_dates, entry_prices = get_prices_at_after_dates(
+            prices, entry_dates, parameters.price_point
+        )
+        exit_dates, exit_prices = get_prices_at_after_dates(
+            prices, exit_dates, parameters.price_point
+        )
+        priced = (
+            ~np.isnan(entry_prices)
+            & ~np.isnan(exit_prices)
+            & (entry_prices != 0)
+            & (exit_prices != 0)
+        )
+        if not priced.any():
+            continue
+        furu_ids.append(np.full(priced.sum(), furu_id))
+        returns.append(exit_prices[priced] / entry_prices[priced] - 1)
+        holding_days.append((exit_dates[priced] - entry_dates[priced]).astype(int))
+
+    if not furu_ids:
+        return derive_furu_metrics_frame(
+            pd.DataFrame(
+                columns=[
+                    "furu_id",
+                    "trades_won",
+                    "trades_lost",
+                    "sum_profit_returns",
+                    "sum_loss_returns",
+                    "sum_holding_days",
+                ]
+            )
+        )
+    positions = pd.DataFrame(
+        {
+            "furu_id": np.concatenate(furu_ids),
+            "position_return": np.concatenate(returns),
+            "holding_days": np.concatenate(holding_days),
+        }
+    )
+    is_win = positions.position_return > 0
+    stats = (
+        positions.assign(
+            trades_won=is_win.astype(int),
+            trades_lost=(~is_win).astype(int),
+            sum_profit_returns=positions.position_return.where(is_win, 0.0),
+            sum_loss_returns=positions.position_return.where(~is_win, 0.0),
+            sum_holding_days=positions.holding_days,
+        )
+        .groupby("furu_id", as_index=False)[
+            [
+                "trades_won",
+                "trades_lost",
+                "sum_profit_returns",
+                "sum_loss_returns",
+                "sum_holding_days",
+            ]
+        ]
+        .sum()
+    )
+    return derive_furu_metrics_frame(stats)
+
+
+def summarize_backtest(
+    parameters: PositionRuleParameters, metrics: pd.DataFrame
+) -> Dict[str, object]:
+    leaderboard = filter_leaderboard_metrics(metrics)
+    total_trades = metrics.total_trades_measured.sum()
+    return {
+        **dataclasses.asdict(parameters),
+        "scored_furus": len(metrics),
+        "total_trades_measured": int(total_trades),
+        "accuracy": (metrics.accuracy * metrics.total_trades_measured).sum() / total_trades
+        if total_trades
+        else None,
+        "mean_performance_score": metrics.performance_score.mean()
+        if len(metrics)
+        else None,
+        "leaderboard_furus": len(leaderboard),
+        "leaderboard_furu_ids": leaderboard.furu_id.tolist(),
+        "leaderboard_mean_performance_score": leaderboard.performance_score.mean()
+        if len(leaderboard)
+        else None,
+    }
+
+
+def init_backtest_worker(
+    mention_dates: MentionDates, price_arrays: PriceArrays, today: np.datetime64
+):
+    """Process-pool initializer: ships the cached arrays once per worker instead of per task"""
+    global _worker_data
+    _worker_data = (mention_dates, price_arrays, today)
+
+
+def backtest_position_rules_in_process(
+    parameters: PositionRuleParameters,
+) -> Dict[str, object]:
+    mention_dates, price_arrays, today = _worker_data
+    metrics = backtest_position_rules(parameters, mention_dates, price_arrays, today)
+    return summarize_backtest(parameters, metrics)
+
+
+def run_parameter_sweep(
+    dbsess: Session,
+    parameter_grid: List[PositionRuleParameters],
+    workers: int = None,
+    include_archived: bool = True,
+) -> pd.DataFrame:
+    """
+    Replays the stored mentions of active furus against cached prices for every parameter
+    set in worker processes, returning one summary row per set. Nothing is written to the DB.
+    """
+    mention_dates = load_mention_dates(dbsess, include_archived)
+    price_arrays = load_price_arrays(
+        dbsess, {symbol for _, symbol in mention_dates}, include_archived
+    )
+    today = np.datetime64(dt.date.today(), "D")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(parameter_grid)))
+    logger.info(
+        f"Backtesting {len(parameter_grid)} parameter sets in {workers} processes"
+    )
+
+    summaries = []
+    with cf.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_backtest_worker,
+        initargs=(mention_dates, price_arrays, today),
+    ) as exe:
+        jobs = {
+            exe.submit(backtest_position_rules_in_process, parameters): parameters
+            for parameters in parameter_grid
+        }
+        for job in cf.as_completed(jobs):
+            try:
+                summaries.append(job.result())
+            except Exception as ex:
+                logger.exception(f"Failed to backtest {jobs[job]}. Reason: {ex}")
+
+    if not summaries:
+        return pd.DataFrame()
+    return pd.DataFrame(summaries).sort_values(
+        by="leaderboard_mean_performance_score", ascending=False, na_position="last"
+    )
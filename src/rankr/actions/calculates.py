@@ -1,14 +1,19 @@
 import concurrent.futures as cf
 import datetime as dt
+import json
+import os
 import time
 from typing import Dict, List, Optional, Tuple
 
+import pandas as pd
 import tweepy
 import yfinance
+from sqlalchemy import text
 from sqlalchemy.orm import Session, scoped_session
 from structlog import get_logger
 from tweepy import API
 
+from rankr.actions.consensus import detect_consensus_entries
 from rankr.actions.creates import (
     close_furu_position,
     create_furu_from_handle,
@@ -17,12 +22,32 @@ from rankr.actions.creates import (
     save_and_return_tweets_for_analysis,
     create_raw_furu_positions_with_new_tweets,
 )
-from rankr.db import scoped_session_context_manager
-from rankr.db.models import Furu, FuruTicker, Ticker
+from rankr.db import create_db_session_from_cfg, scoped_session_context_manager
+from rankr.db.batches import BatchUnitOfWork
+from rankr.db.models import (
+    DataVersion,
+    Furu,
+    FuruStats,
+    FuruTicker,
+    FuruWindowStats,
+    Ticker,
+    TickerConsensus,
+)
+from rankr.db.snapshots import publish_snapshot
 
 
 logger = get_logger()
 
+FURU_METRIC_COLUMNS = [
+    "total_trades_measured",
+    "accuracy",
+    "average_profit",
+    "average_loss",
+    "average_holding_period_days",
+    "expected_return",
+    "performance_score",
+]
+
 
 def score_furu_on_closed_position(furu: Furu, furu_position: FuruTicker) -> Furu:
     position_return = furu_position.calculate_position_return()
@@ -103,6 +128,109 @@ def calculate_furu_performance(furu: Furu) -> Furu:
     return furu
 
 
+def derive_furu_metrics(
+    trades_won: int,
+    trades_lost: int,
+    sum_profit_returns: float,
+    sum_loss_returns: float,
+    sum_holding_days: int,
+) -> Dict[str, Optional[float]]:
+    """Furu scoring columns derived from the sufficient statistics of its closed positions"""
+    total_trades = trades_won + trades_lost
+    if not total_trades:
+        return {}
+    accuracy = trades_won / total_trades
+    average_profit = sum_profit_returns / trades_won if trades_won else None
+    average_loss = sum_loss_returns / trades_lost if trades_lost else None
+    furu_profit = average_profit if average_profit is not None else 0
+    furu_loss = average_loss if average_loss is not None else 0
+    return {
+        "total_trades_measured": total_trades,
+        "accuracy": accuracy,
+        "average_profit": average_profit,
+        "average_loss": average_loss,
+        "average_holding_period_days": sum_holding_days / total_trades,
+        "expected_return": (accuracy * furu_profit) + ((1 - accuracy) * furu_loss),
+        "performance_score": accuracy * furu_profit
+        + ((1 - accuracy) * (furu_loss - furu_profit)),
+    }
+
+
+def calculate_furu_metrics_from_closed_positions(
+    closed_positions: List[Tuple[dt.date, dt.date, float, float]]
+) -> Dict[str, Optional[float]]:
+    """Same scores as `calculate_furu_performance` from plain
+    (date_entered, date_closed, price_entered, price_closed) tuples"""
+    trades_won, trades_lost = 0, 0
+    sum_profit_returns, sum_loss_returns, sum_holding_days = 0.0, 0.0, 0
+    for date_entered, date_closed, price_entered, price_closed in closed_positions:
+        outcome = FuruTicker.get_position_outcome(
+            date_entered, date_closed, price_entered, price_closed
+        )
+        if outcome is None:
+            continue
+        position_return, position_days = outcome
+        if position_return > 0:
+            trades_won += 1
+            sum_profit_returns += position_return
+        else:
+            trades_lost += 1
+            sum_loss_returns += position_return
+        sum_holding_days += position_days
+
+    return derive_furu_metrics(
+        trades_won, trades_lost, sum_profit_returns, sum_loss_returns, sum_holding_days
+    )
+
+
+def get_closed_position_rows_by_furu_id(
+    dbsess: Session, furu_ids: List[int]
+) -> Dict[int, List[Tuple[dt.date, dt.date, float, float]]]:
+    """Priced closed positions of the given furus as plain tuples, without loading objects"""
+    rows = dbsess.execute(
+        text(
+            """
+            SELECT furu_id, date_entered, date_closed, price_entered, price_closed
+            FROM furu_ticker
+            WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))
+                AND date_closed IS NOT NULL
+                AND price_entered IS NOT NULL
+                AND price_closed IS NOT NULL
+            """
+        ),
+        {"furu_ids": json.dumps(furu_ids)},
+    )
+    rows_by_furu_id = {}
+    for furu_id, date_entered, date_closed, price_entered, price_closed in rows:
+        rows_by_furu_id.setdefault(furu_id, []).append(
+            (
+                dt.date.fromisoformat(str(date_entered)),
+                dt.date.fromisoformat(str(date_closed)),
+                price_entered,
+                price_closed,
+            )
+        )
+    return rows_by_furu_id
+
+
+def score_furu_ids_in_process(
+    furu_ids: List[int],
+) -> List[Tuple[int, Dict[str, Optional[float]]]]:
+    """Process-pool worker: opens its own session and returns (furu_id, metrics) pairs"""
+    dbsess = create_db_session_from_cfg()
+    try:
+        rows_by_furu_id = get_closed_position_rows_by_furu_id(dbsess, furu_ids)
+    finally:
+        dbsess.close()
+
+    scores = []
+    for furu_id, closed_positions in rows_by_furu_id.items():
+        metrics = calculate_furu_metrics_from_closed_positions(closed_positions)
+        if metrics:
+            scores.append((furu_id, metrics))
+    return scores
+
+
 def close_furu_unmentioned_positions(furu: Furu) -> Furu:
     silenced_open_positions = [
         p
@@ -425,26 +553,230 @@ def update_furu_tweets_positions_scores_multi_threaded(
     with scoped_session_context_manager(scoped_session_class) as session:
         # gather all positions that need price data and fetch and save it
         fill_prices_for_raw_furu_positions(session)
-        # score furus
-        update_furu_scores_multi_threaded(session)
+        # score furus whose positions changed
+        update_furu_scores_from_stats(session)
 
     return list_of_furu_ids
 
 
-def update_furu_scores(dbsess: Session):
-    furus = dbsess.query(Furu).filter(Furu.status == Furu.Status.ACTIVE).all()
-    logger.info(f"Updating scores for {len(furus)} furus closed positions")
-    for furu in furus:
-        calculate_furu_performance(furu)
-    if furus:
-        dbsess.commit()
+def get_active_furu_position_stats_frame(dbsess: Session) -> pd.DataFrame:
+    """One grouped pass over all priced closed positions of active furus"""
+    query = text(
+        """
+        SELECT
+            furu_id,
+            SUM(position_return > 0) AS trades_won,
+            SUM(position_return <= 0) AS trades_lost,
+            TOTAL(CASE WHEN position_return > 0 THEN position_return END)
+                AS sum_profit_returns,
+            TOTAL(CASE WHEN position_return <= 0 THEN position_return END)
+                AS sum_loss_returns,
+            SUM(holding_days) AS sum_holding_days
+        FROM (
+            SELECT
+                ft.furu_id,
+                ft.price_closed / ft.price_entered - 1 AS position_return,
+                CAST(julianday(ft.date_closed) - julianday(ft.date_entered) AS INTEGER)
+                    AS holding_days
+            FROM furu_ticker ft
+            JOIN furu f ON f.id = ft.furu_id
+            WHERE f.status = :active_status
+                AND ft.date_closed IS NOT NULL
+                AND ft.price_entered IS NOT NULL AND ft.price_entered != 0
+                AND ft.price_closed IS NOT NULL AND ft.price_closed != 0
+        )
+        GROUP BY furu_id
+        """
+    )
+    return pd.read_sql(
+        query, dbsess.connection(), params={"active_status": Furu.Status.ACTIVE.value}
+    )
 
 
-def update_furu_scores_multi_threaded(dbsess: Session):
-    furus = dbsess.query(Furu).filter(Furu.status == Furu.Status.ACTIVE).all()
-    logger.info(f"Updating scores for {len(furus)} furus closed positions")
-    with cf.ThreadPoolExecutor() as exe:
-        exe.map(calculate_furu_performance, furus)
+def derive_furu_metrics_frame(stats: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized `derive_furu_metrics` over a frame of per-furu sufficient statistics"""
+    won, lost = stats.trades_won, stats.trades_lost
+    total_trades = won + lost
+    accuracy = won / total_trades
+    average_profit = (stats.sum_profit_returns / won).where(won > 0)
+    average_loss = (stats.sum_loss_returns / lost).where(lost > 0)
+    furu_profit, furu_loss = average_profit.fillna(0), average_loss.fillna(0)
+    return pd.DataFrame(
+        {
+            "furu_id": stats.furu_id,
+            "total_trades_measured": total_trades,
+            "accuracy": accuracy,
+            "average_profit": average_profit,
+            "average_loss": average_loss,
+            "average_holding_period_days": stats.sum_holding_days / total_trades,
+            "expected_return": accuracy * furu_profit + (1 - accuracy) * furu_loss,
+            "performance_score": accuracy * furu_profit
+            + (1 - accuracy) * (furu_loss - furu_profit),
+        }
+    )[total_trades > 0]
+
+
+def write_active_furu_scores(dbsess: Session, metrics: pd.DataFrame) -> List[int]:
+    """
+    Stores the metrics of every active furu with one bulk UPDATE, resetting the active furus
+    missing from `metrics` to empty metrics, as they have no priced closed positions left
+    """
+    active_furu_ids = [
+        furu_id
+        for furu_id, in dbsess.query(Furu.id).filter(Furu.status == Furu.Status.ACTIVE)
+    ]
+    logger.info(
+        f"Updating scores for {len(metrics)} furus closed positions, "
+        f"resetting {len(active_furu_ids) - len(metrics)} furus without any"
+    )
+    if not active_furu_ids:
+        return []
+
+    metrics = (
+        metrics.set_index("furu_id")
+        .reindex(active_furu_ids)[FURU_METRIC_COLUMNS]
+        .rename_axis("furu_id")
+        .reset_index()
+    )
+    metrics = metrics.astype(object).where(metrics.notna(), None)
+    update_statement = text(
+        f"""
+        UPDATE furu SET {", ".join(f"{c} = :{c}" for c in FURU_METRIC_COLUMNS)}
+        WHERE id = :furu_id
+        """
+    )
+    dbsess.execute(update_statement, metrics.to_dict(orient="records"))
+    dbsess.execute(
+        text(
+            "UPDATE furu_stats SET is_stale = 0 "
+            "WHERE furu_id IN (SELECT id FROM furu WHERE status = :active_status)"
+        ),
+        {"active_status": Furu.Status.ACTIVE.value},
+    )
+    # bulk writes bypass the flush listeners
+    TickerConsensus.rebuild(dbsess.connection())
+    DataVersion.bump(dbsess.connection())
+    update_furu_window_scores(dbsess)
+    dbsess.commit()
+    publish_snapshot(dbsess, "scoring")
+
+    return active_furu_ids
+
+
+def update_furu_scores(dbsess: Session) -> List[int]:
+    """Rescores every active furu with one grouped query and one bulk UPDATE"""
+    metrics = derive_furu_metrics_frame(get_active_furu_position_stats_frame(dbsess))
+    return write_active_furu_scores(dbsess, metrics)
+
+
+def update_furu_scores_multi_process(dbsess: Session, workers: int = None) -> List[int]:
+    """
+    Rescores every active furu in worker processes, sharded by furu id, with one bulk
+    UPDATE. Workers read the committed database, and if any shard fails nothing is written,
+    as its furus would otherwise be reset to empty metrics.
+    """
+    furu_ids = [
+        furu_id
+        for furu_id, in dbsess.query(Furu.id)
+        .filter(Furu.status == Furu.Status.ACTIVE)
+        .order_by(Furu.id)
+    ]
+    if not furu_ids:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(furu_ids))
+    shards = [furu_ids[i::workers] for i in range(workers)]
+    logger.info(f"Scoring {len(furu_ids)} furus closed positions in {workers} processes")
+
+    scores = []
+    # end the read transaction so the parent holds no lock while workers read
+    dbsess.commit()
+    with cf.ProcessPoolExecutor(max_workers=workers) as exe:
+        jobs = {exe.submit(score_furu_ids_in_process, shard): shard for shard in shards}
+        for job in cf.as_completed(jobs):
+            try:
+                scores += job.result()
+            except Exception as ex:
+                logger.exception(
+                    f"Failed to score shard of {len(jobs[job])} furus. Reason: {ex}"
+                )
+                raise
+
+    metrics = pd.DataFrame(
+        [{"furu_id": furu_id, **metrics} for furu_id, metrics in scores],
+        columns=["furu_id"] + FURU_METRIC_COLUMNS,
+    )
+    return write_active_furu_scores(dbsess, metrics)
+
+
+def update_furu_scores_from_stats(dbsess: Session) -> List[int]:
+    """Rescores only the furus whose positions changed since their last scoring"""
+    stale_stats: List[FuruStats] = (
+        dbsess.query(FuruStats).filter(FuruStats.is_stale == 1).all()
+    )
+    logger.info(f"Updating scores from stats for {len(stale_stats)} changed furus")
+    empty_metrics = dict.fromkeys(FURU_METRIC_COLUMNS)
+    mappings = []
+    for stats in stale_stats:
+        metrics = derive_furu_metrics(
+            *(getattr(stats, column) for column in FuruStats.STAT_COLUMNS)
+        )
+        mappings.append({"id": stats.furu_id, **empty_metrics, **metrics})
+    furu_ids = [stats.furu_id for stats in stale_stats]
+    if furu_ids:
+        dbsess.bulk_update_mappings(Furu, mappings)
+        dbsess.query(FuruStats).filter(FuruStats.furu_id.in_(furu_ids)).update(
+            {FuruStats.is_stale: 0}, synchronize_session=False
+        )
+        TickerConsensus.rebuild(
+            dbsess.connection(),
+            TickerConsensus.get_open_ticker_ids(dbsess.connection(), furu_ids),
+        )
+        DataVersion.bump(dbsess.connection())
+    if update_furu_window_scores(dbsess) or furu_ids:
+        dbsess.commit()
+        publish_snapshot(dbsess, "scoring")
+
+    return furu_ids
+
+
+def update_furu_window_scores(dbsess: Session, as_of: dt.date = None) -> int:
+    """Advances the rolling windows to `as_of` and rescores the windows that changed"""
+    as_of = as_of or dt.date.today()
+    FuruWindowStats.advance(dbsess.connection(), as_of)
+    stats = pd.read_sql(
+        text(
+            f"""
+            SELECT furu_id, window_days, {", ".join(FuruStats.STAT_COLUMNS)}
+            FROM furu_window_stats
+            WHERE is_stale = 1
+            """
+        ),
+        dbsess.connection(),
+    )
+    logger.info(f"Updating {len(stats)} rolling window scores as of {as_of}")
+    if stats.empty:
+        return 0
+
+    metrics = derive_furu_metrics_frame(stats).reindex(stats.index)
+    metrics["furu_id"], metrics["window_days"] = stats.furu_id, stats.window_days
+    metrics = metrics[["furu_id", "window_days", "accuracy", "average_profit", "performance_score"]]
+    metrics = metrics.astype(object).where(metrics.notna(), None)
+    dbsess.execute(
+        text(
+            """
+            UPDATE furu_window_stats SET
+                accuracy = :accuracy,
+                average_profit = :average_profit,
+                performance_score = :performance_score,
+                is_stale = 0
+            WHERE furu_id = :furu_id AND window_days = :window_days
+            """
+        ),
+        metrics.to_dict(orient="records"),
+    )
+    DataVersion.bump(dbsess.connection())
+
+    return len(metrics)
 
 
 def fetch_furu_tweets_multi_threaded(
@@ -469,20 +801,17 @@ def fetch_furu_tweets_multi_threaded(
 
 
 def add_new_tweets_to_furus(
-    session: Session, new_furu_tweets_by_furu: dict[Furu, list | None]
+    session: Session,
+    new_furu_tweets_by_furu: dict[Furu, list | None],
+    batch_commit_size=100,
 ) -> list[Furu]:
-    counter = 0
-    for furu, new_tweets in new_furu_tweets_by_furu.items():
-        counter += 1
-        if new_tweets is None:
-            furu.register_data_fetch_fail()
-            continue
-        furu.add_new_tweets(new_tweets)
-        if counter % 100 == 0:
-            session.commit()
-
-    if new_furu_tweets_by_furu:
-        session.commit()
+    with BatchUnitOfWork(session, "new furu tweets", batch_commit_size) as uow:
+        for furu, new_tweets in new_furu_tweets_by_furu.items():
+            with uow.item(furu.id):
+                if new_tweets is None:
+                    furu.register_data_fetch_fail()
+                else:
+                    furu.add_new_tweets(new_tweets)
 
     return list(new_furu_tweets_by_furu.keys())
 
@@ -507,14 +836,17 @@ def update_tweets_and_raw_positions_multi_threaded_io(
         i, j = j, j + furu_batch_size
 
     update_furus_raw_positions(session, list_of_furus)
+    detect_consensus_entries(session)
+    publish_snapshot(session, "tweets and raw positions")
 
 
-def update_furus_raw_positions(session: Session, furus: list[Furu], batch_commit_size=100):
-    i = 0
-    for furu in furus:
-        i += 1
-        create_raw_furu_positions_with_new_tweets(furu)
-        if i % batch_commit_size == 0:
-            session.commit()
-    if i:
-        session.commit()
+def update_furus_raw_positions(
+    session: Session, furus: list[Furu], batch_commit_size=100
+) -> list[int]:
+    """Returns the ids of the furus that failed, for retry"""
+    with BatchUnitOfWork(session, "raw positions", batch_commit_size) as uow:
+        for furu in furus:
+            with uow.item(furu.id):
+                create_raw_furu_positions_with_new_tweets(furu)
+
+    return uow.failed_item_ids
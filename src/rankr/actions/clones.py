@@ -0,0 +1,204 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.db.models import DataVersion, FuruClone, TickerConsensus
+from rankr.db.snapshots import publish_snapshot
+
+
+logger = get_logger()
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32
+SIMILARITY_THRESHOLD = 0.6
+MIN_FURU_TOKENS = 5
+TOKEN_CHUNK_SIZE = 50_000
+SEED = 42
+
+# universal hashing modulo a Mersenne prime keeps every product within 64 bits
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def get_position_tokens_frame(session: Session) -> pd.DataFrame:
+    """Distinct (symbol, entry week) tokens per furu, from every position of every furu"""
+    query = text(
+        """
+        SELECT DISTINCT
+            ft.furu_id,
+            COALESCE(ft.ticker_symbol, t.symbol)
+                || ':' || strftime('%Y-%W', ft.date_entered) AS token
+        FROM furu_ticker ft
+        LEFT JOIN ticker t ON t.id = ft.ticker_id
+        WHERE ft.furu_id IS NOT NULL AND COALESCE(ft.ticker_symbol, t.symbol) IS NOT NULL
+        """
+    )
+    return pd.read_sql(query, session.bind)
+
+
+def get_minhash_signatures(
+    tokens: pd.DataFrame, num_permutations: int = NUM_PERMUTATIONS, seed: int = SEED
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signatures of each furu's token set, as (furu ids, furus-by-permutations matrix).
+
+    The fraction of equal signature values of two furus estimates their Jaccard similarity.
+    """
+    tokens = tokens.sort_values(by="furu_id", kind="stable")
+    furu_ids = np.unique(tokens.furu_id.to_numpy())
+    token_hashes = (
+        pd.util.hash_array(tokens.token.to_numpy(dtype=object)) % _MERSENNE_PRIME
+    )
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(_MERSENNE_PRIME), num_permutations, dtype=np.uint64)
+    b = rng.integers(0, int(_MERSENNE_PRIME), num_permutations, dtype=np.uint64)
+    signatures = np.full(
+        (len(furu_ids), num_permutations), _MERSENNE_PRIME, dtype=np.uint64
+    )
+    furu_rows = np.searchsorted(furu_ids, tokens.furu_id.to_numpy())
+    for start in range(0, len(token_hashes), TOKEN_CHUNK_SIZE):
+        chunk = slice(start, start + TOKEN_CHUNK_SIZE)
+        permuted = (token_hashes[chunk, None] * a + b) % _MERSENNE_PRIME
+        # rows are sorted by furu, so each segment of the chunk belongs to one furu
+        rows = furu_rows[chunk]
+        segment_starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+        segment_rows = rows[segment_starts]
+        signatures[segment_rows] = np.minimum(
+            signatures[segment_rows], np.minimum.reduceat(permuted, segment_starts, axis=0)
+        )
+    return furu_ids, signatures
+
+
+def get_candidate_pairs(signatures: np.ndarray, bands: int = LSH_BANDS) -> np.ndarray:
+    """
+    Row pairs sharing at least one identical band of their signatures.
+
+    Near-duplicates collide in some band with high probability while dissimilar furus
+    rarely do, so only furus sharing a bucket are ever compared.
+    """
+    rows_per_band = signatures.shape[1] // bands
+    pairs = []
+    for band in range(bands):
+        band_values = signatures[:, band * rows_per_band : (band + 1) * rows_per_band]
+        band_keys = pd.util.hash_pandas_object(
+            pd.DataFrame(band_values), index=False
+        ).to_numpy()
+        order = np.argsort(band_keys, kind="stable")
+        sorted_keys = band_keys[order]
+        bucket_starts = np.r_[0, np.flatnonzero(np.diff(sorted_keys)) + 1, len(order)]
+        for start, end in zip(bucket_starts[:-1], bucket_starts[1:]):
+            if end - start > 1:
+                bucket = order[start:end]
+                first, second = np.triu_indices(len(bucket), k=1)
+                pairs.append(np.column_stack([bucket[first], bucket[second]]))
+    if not pairs:
+        return np.empty((0, 2), dtype=int)
+    return np.unique(np.sort(np.concatenate(pairs), axis=1), axis=0)
+
+
+def get_clone_clusters(similar_pairs: List[Tuple[int, int, float]]) -> pd.DataFrame:
+    """Connected components of the similar pairs, identified by their lowest furu id"""
+    parents: Dict[int, int] = {}
+
+    def find(furu_id: int) -> int:
+        parents.setdefault(furu_id, furu_id)
+        while parents[furu_id] != furu_id:
+            parents[furu_id] = parents[parents[furu_id]]
+            furu_id = parents[furu_id]
+        return furu_id
+
+    max_similarity: Dict[int, float] = {}
+    for first, second, similarity in similar_pairs:
+        first_root, second_root = find(first), find(second)
+        if first_root != second_root:
+            parents[max(first_root, second_root)] = min(first_root, second_root)
+        for furu_id in (first, second):
+            max_similarity[furu_id] = max(max_similarity.get(furu_id, 0.0), similarity)
+
+    return pd.DataFrame(
+        [
+            {
+                "furu_id": furu_id,
+                "cluster_id": find(furu_id),
+                "max_similarity": similarity,
+            }
+            for furu_id, similarity in max_similarity.items()
+        ],
+        columns=["furu_id", "cluster_id", "max_similarity"],
+    )
+
+
+def find_furu_clones(
+    tokens: pd.DataFrame,
+    threshold: float = SIMILARITY_THRESHOLD,
+    num_permutations: int = NUM_PERMUTATIONS,
+    bands: int = LSH_BANDS,
+) -> pd.DataFrame:
+    """Clusters of furus whose estimated position-token Jaccard similarity reaches `threshold`"""
+    token_counts = tokens.groupby("furu_id").token.transform("size")
+    tokens = tokens[token_counts >= MIN_FURU_TOKENS]
+    if tokens.empty:
+        return get_clone_clusters([])
+    furu_ids, signatures = get_minhash_signatures(tokens, num_permutations)
+    candidates = get_candidate_pairs(signatures, bands)
+    similarities = (
+        signatures[candidates[:, 0]] == signatures[candidates[:, 1]]
+    ).mean(axis=1)
+    similar = candidates[similarities >= threshold]
+    logger.info(
+        f"Found {len(similar)} similar pairs among {len(candidates)} LSH candidates "
+        f"of {len(furu_ids)} furus"
+    )
+    return get_clone_clusters(
+        [
+            (int(furu_ids[first]), int(furu_ids[second]), float(similarity))
+            for (first, second), similarity in zip(
+                similar, similarities[similarities >= threshold]
+            )
+        ],
+    )
+
+
+def update_furu_clones(session: Session, threshold: float = SIMILARITY_THRESHOLD) -> int:
+    """Recomputes and stores the clusters of near-duplicate furus"""
+    clones = find_furu_clones(get_position_tokens_frame(session), threshold)
+    logger.info(
+        f"Storing {len(clones)} furus in {clones.cluster_id.nunique()} clone clusters"
+    )
+    session.query(FuruClone).delete(synchronize_session=False)
+    if not clones.empty:
+        session.execute(
+            FuruClone.__table__.insert(), clones.astype(object).to_dict(orient="records")
+        )
+    DataVersion.bump(session.connection())
+    session.commit()
+    publish_snapshot(session, "clone detection")
+
+    return len(clones)
+
+
+def get_independent_furu_counts(session: Session) -> pd.DataFrame:
+    """
+    Per symbol, the open and golden open position counts with each clone cluster counted
+    once, to de-duplicate the golden portfolio's furu and saturation counts.
+    """
+    query = text(
+        f"""
+        SELECT
+            t.symbol,
+            COUNT(DISTINCT COALESCE(c.cluster_id, ft.furu_id)) AS independent_furu_count,
+            COUNT(DISTINCT CASE WHEN {TickerConsensus.GOLDEN_FURU_CONDITION}
+                THEN COALESCE(c.cluster_id, ft.furu_id) END) AS independent_golden_count
+        FROM furu_ticker ft
+        JOIN ticker t ON t.id = ft.ticker_id
+        JOIN furu f ON f.id = ft.furu_id
+        LEFT JOIN furu_clone c ON c.furu_id = ft.furu_id
+        WHERE ft.date_closed IS NULL
+        GROUP BY t.symbol
+        """
+    )
+    return pd.read_sql(query, session.bind)
@@ -0,0 +1,209 @@
+import bisect
+import datetime as dt
+import json
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.db.models import ConsensusDetectorState, ConsensusEntry, TickerConsensus
+
+
+logger = get_logger()
+
+# a consensus is at least 3 golden furus entering a symbol within 3 days, as prototyped
+CONSENSUS_WINDOW_DAYS = 3
+CONSENSUS_MIN_FURUS = 3
+
+ConsensusWindow = Tuple[dt.date, dt.date, List[int]]
+
+
+def find_consensus_windows(
+    entries: List[Tuple[dt.date, int]],
+    new_entry_dates: List[dt.date],
+    last_window_end: Optional[dt.date] = None,
+    window_days: int = CONSENSUS_WINDOW_DAYS,
+    min_furus: int = CONSENSUS_MIN_FURUS,
+) -> List[ConsensusWindow]:
+    """
+    Windows of `window_days` days ending at an entry date in which at least `min_furus`
+    distinct furus entered a symbol, given its (date entered, furu id) entries sorted by date.
+
+    Only windows containing one of the new entries are considered, and a window is skipped
+    while it overlaps the last emitted one, so an ongoing consensus is reported once.
+    """
+    window = dt.timedelta(days=window_days - 1)
+    entry_dates = [date for date, _ in entries]
+    end_dates = sorted(
+        {
+            date
+            for new_date in new_entry_dates
+            for date in entry_dates[
+                bisect.bisect_left(entry_dates, new_date) : bisect.bisect_right(
+                    entry_dates, new_date + window
+                )
+            ]
+        }
+    )
+    windows = []
+    for end_date in end_dates:
+        start_date = end_date - window
+        if last_window_end is not None and start_date <= last_window_end:
+            continue
+        furu_ids = {
+            furu_id
+            for _, furu_id in entries[
+                bisect.bisect_left(entry_dates, start_date) : bisect.bisect_right(
+                    entry_dates, end_date
+                )
+            ]
+        }
+        if len(furu_ids) >= min_furus:
+            windows.append((start_date, end_date, sorted(furu_ids)))
+            last_window_end = end_date
+    return windows
+
+
+def get_golden_entries_frame(
+    session: Session,
+    min_position_id: int,
+    max_position_id: int,
+    symbols: List[str] = None,
+    date_range: Tuple[dt.date, dt.date] = None,
+) -> pd.DataFrame:
+    """Golden furus' positions by id range, optionally restricted to symbols and entry dates"""
+    filters = ""
+    params = {"min_position_id": min_position_id, "max_position_id": max_position_id}
+    if symbols is not None:
+        filters += (
+            " AND COALESCE(ft.ticker_symbol, t.symbol) "
+            "IN (SELECT value FROM json_each(:symbols))"
+        )
+        params["symbols"] = json.dumps(symbols)
+    if date_range is not None:
+        filters += " AND ft.date_entered BETWEEN :date_from AND :date_to"
+        params["date_from"], params["date_to"] = date_range
+    query = text(
+        f"""
+        SELECT
+            COALESCE(ft.ticker_symbol, t.symbol) AS symbol,
+            ft.date_entered,
+            ft.furu_id
+        FROM furu_ticker ft
+        JOIN furu f ON f.id = ft.furu_id
+        LEFT JOIN ticker t ON t.id = ft.ticker_id
+        WHERE ft.id > :min_position_id AND ft.id <= :max_position_id
+            AND {TickerConsensus.GOLDEN_FURU_CONDITION}
+            {filters}
+        ORDER BY symbol, ft.date_entered
+        """
+    )
+    entries = pd.read_sql(query, session.bind, params=params)
+    entries["date_entered"] = pd.to_datetime(entries.date_entered).dt.date
+    return entries[entries.symbol.notna()]
+
+
+def get_last_window_ends(session: Session, symbols: List[str]) -> Dict[str, dt.date]:
+    rows = session.execute(
+        text(
+            """
+            SELECT symbol, MAX(date_window_end) FROM consensus_entry
+            WHERE symbol IN (SELECT value FROM json_each(:symbols))
+            GROUP BY symbol
+            """
+        ),
+        {"symbols": json.dumps(symbols)},
+    )
+    return {symbol: dt.date.fromisoformat(str(date)) for symbol, date in rows}
+
+
+def detect_consensus_entries(
+    session: Session,
+    window_days: int = CONSENSUS_WINDOW_DAYS,
+    min_furus: int = CONSENSUS_MIN_FURUS,
+) -> List[ConsensusEntry]:
+    """
+    Consumes the positions opened since the last run and stores a consensus entry event
+    for every symbol they bring to `min_furus` golden furus entering within `window_days`.
+
+    Only the new positions and the golden entries of their symbols within the window of
+    their entry dates are read, so a run costs in proportion to the new positions.
+    """
+    state = session.get(ConsensusDetectorState, 1)
+    if state is None:
+        state = ConsensusDetectorState(id=1, last_position_id=0)
+        session.add(state)
+    max_position_id = (
+        session.execute(text("SELECT MAX(id) FROM furu_ticker")).scalar() or 0
+    )
+    new_entries = get_golden_entries_frame(
+        session, state.last_position_id, max_position_id
+    )
+    logger.info(
+        f"Detecting consensus entries over {len(new_entries)} new golden positions"
+    )
+
+    events = []
+    if not new_entries.empty:
+        window = dt.timedelta(days=window_days - 1)
+        symbols = sorted(new_entries.symbol.unique())
+        date_range = (
+            new_entries.date_entered.min() - window,
+            new_entries.date_entered.max() + window,
+        )
+        entries = get_golden_entries_frame(
+            session, 0, max_position_id, symbols, date_range
+        )
+        last_window_ends = get_last_window_ends(session, symbols)
+        new_entry_dates = new_entries.groupby("symbol").date_entered.apply(list)
+        for symbol, symbol_entries in entries.groupby("symbol"):
+            windows = find_consensus_windows(
+                list(zip(symbol_entries.date_entered, symbol_entries.furu_id)),
+                new_entry_dates.get(symbol, []),
+                last_window_ends.get(symbol),
+                window_days,
+                min_furus,
+            )
+            events += [
+                ConsensusEntry(
+                    symbol=symbol,
+                    date_window_start=start_date,
+                    date_window_end=end_date,
+                    furu_count=len(furu_ids),
+                    furu_ids=json.dumps([int(furu_id) for furu_id in furu_ids]),
+                    date_detected=dt.date.today(),
+                )
+                for start_date, end_date, furu_ids in windows
+            ]
+
+    for event in events:
+        logger.info(f"Detected {event}")
+    session.add_all(events)
+    state.last_position_id = max_position_id
+    session.commit()
+
+    return events
+
+
+def get_consensus_entries(session: Session, since: dt.date = None) -> pd.DataFrame:
+    """Stored consensus entry events, most recent first, with the handles of their furus"""
+    query = text(
+        """
+        SELECT
+            c.symbol,
+            c.date_window_start,
+            c.date_window_end,
+            c.furu_count,
+            GROUP_CONCAT(f.handle, ' ') AS handles,
+            c.date_detected
+        FROM consensus_entry c
+        JOIN json_each(c.furu_ids) j
+        JOIN furu f ON f.id = j.value
+        WHERE c.date_window_end >= :since
+        GROUP BY c.id
+        ORDER BY c.date_window_end DESC, c.furu_count DESC
+        """
+    )
+    return pd.read_sql(query, session.bind, params={"since": since or dt.date.min})
@@ -1,16 +1,20 @@
 import datetime as dt
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import yfinance
-from sqlalchemy.orm import Session, scoped_session
+from sqlalchemy.orm import Session, object_session, scoped_session
 from structlog import get_logger
 from tweepy import API
 
 from rankr.actions.finds import get_nearest_business_day_in_future
+from rankr.actions.positions import PositionChanges, PositionInterval, advance_positions
 from rankr.db import scoped_session_context_manager
+from rankr.db.batches import BatchUnitOfWork
+from rankr.db.snapshots import publish_snapshot
 from rankr.db.models import (
     Furu,
+    FuruPositionCursor,
     FuruTicker,
     FuruTweet,
     TickerHistoryMissingError,
@@ -308,9 +312,100 @@ def close_raw_furu_position_by_symbol(furu_position, closing_date):
     return furu_position
 
 
+def get_position_interval(furu_position: FuruTicker) -> PositionInterval:
+    return PositionInterval(
+        symbol=furu_position.alpha_ticker,
+        date_entered=furu_position.date_entered,
+        date_last_mentioned=furu_position.date_last_mentioned
+        or furu_position.date_entered,
+        date_closed=furu_position.date_closed,
+    )
+
+
+def add_furu_position_interval(furu: Furu, interval: PositionInterval) -> FuruTicker:
+    """Persists a position opened by the position engine without loading the furu's others"""
+    logger.info(f"Creating position in ${interval.symbol} for {furu}")
+    furu_position = FuruTicker(
+        furu=furu,
+        ticker_symbol=interval.symbol,
+        date_entered=interval.date_entered,
+        date_closed=interval.date_closed,
+        date_last_mentioned=interval.date_last_mentioned,
+    )
+    session = object_session(furu)
+    if session is not None:
+        session.add(furu_position)
+    return furu_position
+
+
+def apply_position_changes(
+    furu: Furu, open_position: Optional[FuruTicker], changes: PositionChanges
+) -> Optional[FuruTicker]:
+    """Writes the position engine's changes to the furu's positions, returning the open one"""
+    if changes.existing is not None:
+        open_position.date_last_mentioned = changes.existing.date_last_mentioned
+        if not changes.existing.is_open:
+            close_raw_furu_position_by_symbol(open_position, changes.existing.date_closed)
+    furu_positions = [add_furu_position_interval(furu, i) for i in changes.opened]
+    if changes.open_position is None:
+        return None
+    return furu_positions[-1] if furu_positions else open_position
+
+
+def get_or_create_furu_position_cursor(
+    furu: Furu, alpha_ticker: str
+) -> Tuple[FuruPositionCursor, bool]:
+    cursor = furu.position_cursors.get(alpha_ticker)
+    if cursor is not None:
+        return cursor, False
+    cursor = FuruPositionCursor(symbol=alpha_ticker)
+    furu.position_cursors[alpha_ticker] = cursor
+    return cursor, True
+
+
+def advance_furu_position_cursor(
+    furu: Furu, alpha_ticker: str, cash_ticker_tweet_dates: List[dt.date]
+) -> Furu:
+    """Advances the symbol's open/closed state machine over new mentions only"""
+    cursor, is_new_cursor = get_or_create_furu_position_cursor(furu, alpha_ticker)
+    if cursor.date_last_mentioned is not None:
+        cash_ticker_tweet_dates = [
+            d for d in cash_ticker_tweet_dates if d > cursor.date_last_mentioned
+        ]
+    if not cash_ticker_tweet_dates:
+        logger.debug(f"No new mentions of ${alpha_ticker} for {furu}")
+        return furu
+
+    if is_new_cursor:
+        # positions created before cursors existed are found by scanning once
+        furu_position = furu.get_furu_position_by_symbol_and_entry_date(
+            alpha_ticker, get_nearest_business_day_in_future(cash_ticker_tweet_dates[0])
+        )
+        if furu_position is not None and not furu_position.is_open:
+            furu_position = None
+    else:
+        furu_position = cursor.get_open_position()
+
+    changes = advance_positions(
+        alpha_ticker,
+        cash_ticker_tweet_dates,
+        get_position_interval(furu_position) if furu_position is not None else None,
+    )
+    cursor.advance(
+        apply_position_changes(furu, furu_position, changes), cash_ticker_tweet_dates[-1]
+    )
+
+    return furu
+
+
 def create_furu_positions_entries_exits_from_tweets(
-    furu: Furu, cash_ticker: str, tweets_for_ticker: list
+    furu: Furu, cash_ticker: str, tweets_for_ticker: list, use_cursor: bool = True
 ) -> Furu:
+    """
+    Creates raw positions in a symbol from tweets. With `use_cursor` only mentions after
+    the symbol's cursor are processed, otherwise all mentions are merged with the
+    existing positions (used when recreating positions from all stored tweets).
+    """
     logger.info(
         f"Creating raw positions in {cash_ticker} using {len(tweets_for_ticker)} tweets for {furu}"
     )
@@ -318,6 +413,9 @@ def create_furu_positions_entries_exits_from_tweets(
     cash_ticker_tweet_dates = sorted(
         [tweet.created_at.date() for tweet in tweets_for_ticker]
     )
+    if use_cursor:
+        return advance_furu_position_cursor(furu, alpha_ticker, cash_ticker_tweet_dates)
+
     furu_position = create_or_get_raw_furu_position_by_symbol(
         furu, alpha_ticker, cash_ticker_tweet_dates[0]
     )
@@ -344,6 +442,11 @@ def create_furu_positions_entries_exits_from_tweets(
         )
         close_raw_furu_position_by_symbol(furu_position, closing_date)
 
+    cursor, _ = get_or_create_furu_position_cursor(furu, alpha_ticker)
+    cursor.advance(
+        furu_position if furu_position.is_open else None, cash_ticker_tweet_dates[-1]
+    )
+
     return furu
 
 
@@ -487,6 +590,7 @@ def fill_prices_for_raw_furu_positions(session: Session) -> bool:
     )
 
     fill_position_prices_from_tickers(session, price_pending_positions_dict, ticker_objects_list)
+    publish_snapshot(session, "position prices")
 
     return True
 
@@ -508,12 +612,10 @@ def fill_position_prices_from_tickers(
         f"Filling price data for raw positions in {len(price_pending_positions_dict.keys())} tickers"
     )
 
-    i, j = 0, db_commit_batch_size
-    while parallel_data[i:]:
-        for ticker_obj, relevant_positions in parallel_data[i:j]:
-            add_ticker_and_prices_to_positions(ticker_obj, relevant_positions)
-        session.commit()
-        i, j = j, j + db_commit_batch_size
+    with BatchUnitOfWork(session, "position prices", db_commit_batch_size) as uow:
+        for ticker_obj, relevant_positions in parallel_data:
+            with uow.item(ticker_obj.symbol):
+                add_ticker_and_prices_to_positions(ticker_obj, relevant_positions)
 
 
 def get_or_create_tickers_from_positions_dict_with_prices_df(
@@ -524,19 +626,17 @@ def get_or_create_tickers_from_positions_dict_with_prices_df(
     )
     existing_db_tickers_dict = {t.symbol: t for t in session.query(Ticker).all()}
     ticker_objects_list = []
-    for i, symbol in enumerate(price_pending_positions_dict.keys()):
-        try:
-            ticker_objects_list.append(
-                create_ticker_if_new_from_symbol_and_df(
-                    session, symbol, prices_by_symbol_df[symbol], existing_db_tickers_dict
+    with BatchUnitOfWork(session, "tickers from prices", commit_batch_size) as uow:
+        for symbol in price_pending_positions_dict.keys():
+            with uow.item(symbol):
+                ticker_objects_list.append(
+                    create_ticker_if_new_from_symbol_and_df(
+                        session,
+                        symbol,
+                        prices_by_symbol_df[symbol],
+                        existing_db_tickers_dict,
+                    )
                 )
-            )
-        except Exception as ex:
-            logger.exception(f"Failed to create ticker if new from symbol and df. Reason: {ex}")
-        if i > 0 and i % commit_batch_size == 0:
-            session.commit()
-    if price_pending_positions_dict:
-        session.commit()
 
     return ticker_objects_list
 
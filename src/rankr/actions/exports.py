@@ -0,0 +1,508 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import Date, Float, Integer, Table, text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.actions.archives import (
+    ARCHIVE_PATH,
+    TWEETS_ARCHIVE,
+    get_partition_path,
+    list_partition_months,
+    read_tweets_partition,
+)
+from rankr.db import DB_PATH
+from rankr.db.models import Furu, FuruTicker, FuruTweet, TickerHistory
+
+
+logger = get_logger()
+
+EXPORT_PATH = DB_PATH.parent.joinpath("exports")
+EXPORT_STATE_FILE = "_export_state.json"
+EXPORT_CHUNK_ROWS = 50_000
+TWEET_CHUNKS_PER_FETCH = 50
+
+MENTION_EXPORT = "mention"
+UNPARTITIONED = "all"
+ROW_HASH_FUNCTION = "rankr_row_hash"
+# handles, symbols and statuses are shorter, so every character of them is fingerprinted
+FINGERPRINT_TEXT_CHARACTERS = 16
+
+
+def import_pyarrow():
+    """pyarrow is only needed for exports, so it is imported when one runs"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as ex:
+        raise ImportError(
+            "Parquet exports need pyarrow, install it with: pip install pyarrow"
+        ) from ex
+    return pyarrow, pyarrow.parquet
+
+
+def get_arrow_schema(table: Table):
+    pa, _ = import_pyarrow()
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, Date):
+            arrow_type = pa.date32()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def get_mention_schema():
+    pa, _ = import_pyarrow()
+    return pa.schema(
+        [
+            pa.field("tweet_id", pa.int64()),
+            pa.field("furu_id", pa.int64()),
+            pa.field("date", pa.date32()),
+            pa.field("symbol", pa.string()),
+        ]
+    )
+
+
+def to_record_batch(frame: pd.DataFrame, schema):
+    pa, _ = import_pyarrow()
+    arrays = []
+    for field in schema:
+        values = frame[field.name]
+        if pa.types.is_date32(field.type):
+            values = pd.to_datetime(values).dt.date
+        elif pa.types.is_string(field.type):
+            values = values.astype(object).where(values.notna(), None)
+        arrays.append(pa.Array.from_pandas(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def get_partition_directory(dataset_path: pathlib.Path, month: str) -> pathlib.Path:
+    if month == UNPARTITIONED:
+        return dataset_path
+    return dataset_path.joinpath(f"month={month}")
+
+
+class ParquetPartitionWriter:
+    """
+    Writes record batches to one Parquet file per partition, each file appearing complete.
+
+    Files are written under a name readers ignore and renamed into place when closed.
+    If the export fails, the files written so far are deleted instead.
+
+    --
+
+    with ParquetPartitionWriter(dataset_path, schema, "part-0.parquet") as writer:
+
+        writer.write(month, frame)
+
+    --
+    """
+
+    def __init__(self, dataset_path: pathlib.Path, schema, file_name: str):
+        self.dataset_path = dataset_path
+        self.schema = schema
+        self.file_name = file_name
+        self.rows = 0
+        self._writers = {}
+
+    def __str__(self):
+        return (
+            f"ParquetPartitionWriter [path: {self.dataset_path}] "
+            f"[partitions: {len(self._writers)}] [rows: {self.rows}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    def write(self, month: str, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        if month not in self._writers:
+            _, pq = import_pyarrow()
+            path = get_partition_directory(self.dataset_path, month).joinpath(
+                self.file_name
+            )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = path.with_name(f".{path.name}.tmp")
+            self._writers[month] = (
+                path,
+                temporary_path,
+                pq.ParquetWriter(str(temporary_path), self.schema),
+            )
+        self._writers[month][2].write_batch(to_record_batch(frame, self.schema))
+        self.rows += len(frame)
+
+    def __enter__(self) -> "ParquetPartitionWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+    def close(self):
+        for path, temporary_path, writer in self._writers.values():
+            writer.close()
+            os.replace(temporary_path, path)
+        self._writers = {}
+
+    def discard(self):
+        for _, temporary_path, writer in self._writers.values():
+            writer.close()
+            temporary_path.unlink(missing_ok=True)
+        self._writers = {}
+
+
+def read_export_state(export_path: pathlib.Path) -> dict:
+    path = export_path.joinpath(EXPORT_STATE_FILE)
+    if not path.exists():
+        return {}
+    with open(path) as state_file:
+        return json.load(state_file)
+
+
+def write_export_state(export_path: pathlib.Path, state: dict):
+    export_path.mkdir(parents=True, exist_ok=True)
+    path = export_path.joinpath(EXPORT_STATE_FILE)
+    temporary_path = path.with_name(path.name + ".tmp")
+    with open(temporary_path, "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(temporary_path, path)
+
+
+def get_month_expression(partition_column: Optional[str]) -> str:
+    if partition_column is None:
+        return f"'{UNPARTITIONED}'"
+    return f"strftime('%Y-%m', {partition_column})"
+
+
+def get_row_hash(*values) -> int:
+    """32 bits of a hash of a row's values, so sums over any partition fit in an integer"""
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=4).digest()
+    return int.from_bytes(digest, "big")
+
+
+def get_checksum_expression(table: Table) -> str:
+    """
+    Per partition aggregates changing whenever any of its rows is inserted, updated or
+    deleted, summing a hash of every row's values.
+    """
+    columns = ", ".join(column.name for column in table.columns)
+    return f"COUNT(*), SUM({ROW_HASH_FUNCTION}({columns}))"
+
+
+def get_fingerprint_expression(table: Table) -> str:
+    """
+    Per partition aggregates of the highest id and of every column's values, computed by
+    SQLite alone, so finding the partitions that may have changed costs no Python call
+    per row. Text values add up their characters weighted by position.
+    """
+    aggregates = ["COUNT(*)", "MAX(id)", "TOTAL(id)"]
+    for column in table.columns:
+        if column.name == "id":
+            continue
+        if isinstance(column.type, Date):
+            aggregates.append(f"TOTAL(julianday({column.name}))")
+        elif isinstance(column.type, (Integer, Float)):
+            aggregates.append(f"TOTAL({column.name})")
+        else:
+            characters = " + ".join(
+                f"{i} * COALESCE(unicode(substr({column.name}, {i}, 1)), 0)"
+                for i in range(1, FINGERPRINT_TEXT_CHARACTERS + 1)
+            )
+            aggregates.append(f"TOTAL(length({column.name}) + {characters})")
+    return ", ".join(aggregates)
+
+
+def get_partition_fingerprints(
+    session: Session, table: Table, partition_column: Optional[str]
+) -> Dict[str, list]:
+    month = get_month_expression(partition_column)
+    rows = session.execute(
+        text(
+            f"SELECT {month} AS month, {get_fingerprint_expression(table)} "
+            f"FROM {table.name} GROUP BY month"
+        )
+    )
+    return {str(row[0]): list(row[1:]) for row in rows}
+
+
+def get_partition_checksums(
+    session: Session, table: Table, partition_column: Optional[str], months: List[str]
+) -> Dict[str, list]:
+    """Row hash checksums of the given partitions only"""
+    if not months:
+        return {}
+    month = get_month_expression(partition_column)
+    session.connection().connection.create_function(
+        ROW_HASH_FUNCTION, -1, get_row_hash, deterministic=True
+    )
+    rows = session.execute(
+        text(
+            f"SELECT {month} AS month, {get_checksum_expression(table)} "
+            f"FROM {table.name} "
+            f"WHERE {month} IN (SELECT value FROM json_each(:months)) "
+            f"GROUP BY month"
+        ),
+        {"months": json.dumps(months)},
+    )
+    return {str(row[0]): list(row[1:]) for row in rows}
+
+
+def export_replaced_table(
+    session: Session,
+    table: Table,
+    partition_column: Optional[str],
+    export_path: pathlib.Path,
+    state: dict,
+) -> int:
+    """
+    Exports a table whose rows get updated, rewriting only the partitions whose
+    checksums changed since the last export and dropping the partitions left empty.
+
+    Checksums are stored per partition and only recomputed for the partitions whose
+    fingerprint changed. Emptied partitions are removed once every write succeeded.
+    """
+    dataset_path = export_path.joinpath(table.name)
+    previous_fingerprints = state.get("fingerprints", {})
+    previous_checksums = state.get("checksums", {})
+    fingerprints = get_partition_fingerprints(session, table, partition_column)
+    hashed_months = sorted(
+        month
+        for month, fingerprint in fingerprints.items()
+        if previous_fingerprints.get(month) != fingerprint or month not in previous_checksums
+    )
+    checksums = get_partition_checksums(session, table, partition_column, hashed_months)
+    changed_months = sorted(
+        month
+        for month, checksum in checksums.items()
+        if previous_checksums.get(month) != checksum
+    )
+    checksums.update(
+        (month, checksum)
+        for month, checksum in previous_checksums.items()
+        if month in fingerprints and month not in checksums
+    )
+
+    month = get_month_expression(partition_column)
+    writer = ParquetPartitionWriter(
+        dataset_path, get_arrow_schema(table), "part-0.parquet"
+    )
+    with writer:
+        for changed_month in changed_months:
+            query = text(
+                f"SELECT * FROM {table.name} WHERE {month} = :month ORDER BY id"
+            )
+            for frame in pd.read_sql(
+                query,
+                session.bind,
+                params={"month": changed_month},
+                chunksize=EXPORT_CHUNK_ROWS,
+            ):
+                writer.write(changed_month, frame)
+    for removed_month in set(previous_checksums) - set(fingerprints):
+        shutil.rmtree(get_partition_directory(dataset_path, removed_month), ignore_errors=True)
+    logger.info(
+        f"Exported {writer.rows} {table.name} rows in {len(changed_months)} of "
+        f"{len(fingerprints)} partitions, {len(hashed_months)} rehashed"
+    )
+
+    state["fingerprints"] = fingerprints
+    state["checksums"] = checksums
+    return writer.rows
+
+
+def export_appended_table(
+    session: Session,
+    table: Table,
+    partition_column: str,
+    export_path: pathlib.Path,
+    state: dict,
+) -> int:
+    """Exports an insert-only table, appending files of the rows added since last export"""
+    last_id = state.get("last_id", 0)
+    max_id = session.execute(text(f"SELECT MAX(id) FROM {table.name}")).scalar() or 0
+    writer = ParquetPartitionWriter(
+        export_path.joinpath(table.name),
+        get_arrow_schema(table),
+        f"part-{last_id + 1:010d}.parquet",
+    )
+    query = text(
+        f"""
+        SELECT *, {get_month_expression(partition_column)} AS export_month
+        FROM {table.name}
+        WHERE id > :last_id AND id <= :max_id
+        ORDER BY id
+        """
+    )
+    with writer:
+        for frame in pd.read_sql(
+            query,
+            session.bind,
+            params={"last_id": last_id, "max_id": max_id},
+            chunksize=EXPORT_CHUNK_ROWS,
+        ):
+            for month, month_frame in frame.groupby("export_month"):
+                writer.write(month, month_frame)
+    logger.info(f"Exported {writer.rows} {table.name} rows added after id {last_id}")
+
+    state["last_id"] = max(last_id, max_id)
+    return writer.rows
+
+
+def get_tweet_mentions(furu_id: int, tweets: list) -> List[Tuple[int, int, dt.date, str]]:
+    """(tweet id, furu id, date, symbol) of every cashtag in the tweets"""
+    return [
+        (tweet.id, furu_id, tweet.created_at.date(), symbol)
+        for tweet in tweets
+        for symbol in sorted(
+            {
+                word[1:].upper()
+                for word in tweet.text.split()
+                if word.startswith("$") and word[1:].isalpha()
+            }
+        )
+    ]
+
+
+def iter_tweet_chunks(
+    session: Session, last_id: int, max_id: int, archive_path: pathlib.Path
+) -> Iterator[Tuple[int, list]]:
+    """(furu id, tweets) of the stored tweet chunks with ids in (last_id, max_id]"""
+    min_stored_id = session.execute(text("SELECT MIN(id) FROM furu_tweet")).scalar()
+    # chunks archived since the last export are only found in the archive
+    if min_stored_id is None or last_id + 1 < min_stored_id:
+        for month in list_partition_months(TWEETS_ARCHIVE, archive_path):
+            records = read_tweets_partition(
+                get_partition_path(TWEETS_ARCHIVE, month, archive_path)
+            )
+            for record in records:
+                if last_id < record["id"] <= max_id:
+                    yield record["furu_id"], record["tweets"]
+
+    yield from (
+        session.query(FuruTweet.furu_id, FuruTweet.tweets)
+        .filter(FuruTweet.id > last_id, FuruTweet.id <= max_id)
+        .order_by(FuruTweet.id)
+        .yield_per(TWEET_CHUNKS_PER_FETCH)
+    )
+
+
+def get_max_tweet_chunk_id(session: Session, archive_path: pathlib.Path) -> int:
+    max_stored_id = session.execute(text("SELECT MAX(id) FROM furu_tweet")).scalar()
+    if max_stored_id is not None:
+        return max_stored_id
+    # archived chunks are older than the stored ones, so only read when none is stored
+    return max(
+        (
+            record["id"]
+            for month in list_partition_months(TWEETS_ARCHIVE, archive_path)
+            for record in read_tweets_partition(
+                get_partition_path(TWEETS_ARCHIVE, month, archive_path)
+            )
+        ),
+        default=0,
+    )
+
+
+def export_mentions(
+    session: Session,
+    export_path: pathlib.Path,
+    state: dict,
+    archive_path: pathlib.Path = ARCHIVE_PATH,
+) -> int:
+    """Exports the cashtag mentions of the tweet chunks stored since the last export"""
+    last_id = state.get("last_id", 0)
+    max_id = get_max_tweet_chunk_id(session, archive_path)
+    columns = ["tweet_id", "furu_id", "date", "symbol"]
+    writer = ParquetPartitionWriter(
+        export_path.joinpath(MENTION_EXPORT),
+        get_mention_schema(),
+        f"part-{last_id + 1:010d}.parquet",
+    )
+    mentions_by_month: Dict[str, list] = {}
+
+    def flush(month: str):
+        writer.write(month, pd.DataFrame(mentions_by_month.pop(month), columns=columns))
+
+    with writer:
+        for furu_id, tweets in iter_tweet_chunks(session, last_id, max_id, archive_path):
+            for mention in get_tweet_mentions(furu_id, tweets):
+                month = mention[2].strftime("%Y-%m")
+                mentions_by_month.setdefault(month, []).append(mention)
+                if len(mentions_by_month[month]) >= EXPORT_CHUNK_ROWS:
+                    flush(month)
+        for month in list(mentions_by_month):
+            flush(month)
+    logger.info(
+        f"Exported {writer.rows} mentions of tweet chunks added after id {last_id}"
+    )
+
+    state["last_id"] = max(last_id, max_id)
+    return writer.rows
+
+
+def export_tables(
+    session: Session,
+    export_path: pathlib.Path = EXPORT_PATH,
+    full: bool = False,
+    archive_path: pathlib.Path = ARCHIVE_PATH,
+) -> Dict[str, int]:
+    """
+    Exports furus, positions, ticker history and mentions as month-partitioned Parquet
+    datasets (furus unpartitioned), writing only what changed since the last export.
+
+    --
+
+    pyarrow.dataset.dataset(EXPORT_PATH / "furu_ticker", partitioning="hive").to_table()
+
+    --
+    """
+    import_pyarrow()
+    if full and export_path.exists():
+        shutil.rmtree(export_path)
+    state = read_export_state(export_path)
+    exported = {
+        Furu.__tablename__: export_replaced_table(
+            session,
+            Furu.__table__,
+            None,
+            export_path,
+            state.setdefault(Furu.__tablename__, {}),
+        ),
+        FuruTicker.__tablename__: export_replaced_table(
+            session,
+            FuruTicker.__table__,
+            "date_entered",
+            export_path,
+            state.setdefault(FuruTicker.__tablename__, {}),
+        ),
+        TickerHistory.__tablename__: export_appended_table(
+            session,
+            TickerHistory.__table__,
+            "date",
+            export_path,
+            state.setdefault(TickerHistory.__tablename__, {}),
+        ),
+        MENTION_EXPORT: export_mentions(
+            session, export_path, state.setdefault(MENTION_EXPORT, {}), archive_path
+        ),
+    }
+    write_export_state(export_path, state)
+
+    return exported
@@ -0,0 +1,159 @@
+import datetime as dt
+import weakref
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.actions.calculates import derive_furu_metrics_frame
+from rankr.db.caches import get_data_version
+from rankr.db.models import Furu, FuruStats
+
+
+logger = get_logger()
+
+LEADERBOARD_COLUMNS = [
+    "handle",
+    "accuracy",
+    "performance_score",
+    "total_trades_measured",
+    "average_profit",
+    "average_loss",
+    "average_holding_period_days",
+]
+
+
+def filter_leaderboard_metrics(metrics: pd.DataFrame) -> pd.DataFrame:
+    """Furu metrics passing the leaderboard thresholds, best performance score first"""
+    return metrics[
+        (metrics.accuracy > Furu.LEADERBOARD_MIN_ACCURACY)
+        & (metrics.performance_score > Furu.LEADERBOARD_MIN_PERFORMANCE_SCORE)
+        & (metrics.total_trades_measured > Furu.LEADERBOARD_MIN_TRADES)
+        & (metrics.average_holding_period_days > Furu.LEADERBOARD_MIN_HOLDING_DAYS)
+    ].sort_values(by="performance_score", ascending=False)
+
+
+def get_closed_positions_frame(dbsess: Session) -> pd.DataFrame:
+    """Every priced closed position of every furu, whatever its current status"""
+    query = text(
+        """
+        SELECT
+            furu_id,
+            date_closed,
+            price_closed / price_entered - 1 AS position_return,
+            CAST(julianday(date_closed) - julianday(date_entered) AS INTEGER)
+                AS holding_days
+        FROM furu_ticker
+        WHERE furu_id IS NOT NULL
+            AND date_closed IS NOT NULL
+            AND price_entered IS NOT NULL AND price_entered != 0
+            AND price_closed IS NOT NULL AND price_closed != 0
+        """
+    )
+    return pd.read_sql(query, dbsess.bind, parse_dates=["date_closed"])
+
+
+class PointInTimeScores:
+    """
+    Per-furu cumulative sums of the scoring statistics ordered by position close date.
+
+    The statistics of a furu as of any date are the cumulative row of its last position
+    closed on or before that date, found with a binary search instead of a rescore.
+    The scores of a database are kept until its data version changes.
+
+    --
+
+    scores = PointInTimeScores.from_db(dbsess)
+
+    metrics = scores.get_metrics_as_of(dt.date(2022, 1, 31))
+
+    --
+    """
+
+    def __init__(self, positions: pd.DataFrame):
+        positions = positions.sort_values(by=["furu_id", "date_closed"], kind="stable")
+        is_win = positions.position_return > 0
+        statistics = np.column_stack(
+            [
+                is_win.to_numpy(dtype=float),
+                (~is_win).to_numpy(dtype=float),
+                positions.position_return.where(is_win, 0.0).to_numpy(dtype=float),
+                positions.position_return.where(~is_win, 0.0).to_numpy(dtype=float),
+                positions.holding_days.to_numpy(dtype=float),
+            ]
+        )
+        furu_ids = positions.furu_id.to_numpy()
+        close_dates = positions.date_closed.values.astype("datetime64[D]")
+        self.close_dates: Dict[int, np.ndarray] = {}
+        self.cumulative_statistics: Dict[int, np.ndarray] = {}
+        boundaries = np.flatnonzero(np.diff(furu_ids)) + 1
+        starts = np.r_[0, boundaries].astype(int) if len(furu_ids) else []
+        for start, end in zip(starts, np.r_[boundaries, len(furu_ids)].astype(int)):
+            furu_id = int(furu_ids[start])
+            self.close_dates[furu_id] = close_dates[start:end]
+            self.cumulative_statistics[furu_id] = np.cumsum(statistics[start:end], axis=0)
+
+    def __str__(self):
+        return f"PointInTimeScores [furus: {len(self.close_dates)}]"
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def from_db(cls, dbsess: Session) -> "PointInTimeScores":
+        engine = dbsess.get_bind()
+        version = get_data_version(dbsess)
+        cached = POINT_IN_TIME_SCORES_BY_ENGINE.get(engine)
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+
+        positions = get_closed_positions_frame(dbsess)
+        logger.info(f"Building point-in-time scores from {len(positions)} closed positions")
+        scores = cls(positions)
+        if version is not None:
+            POINT_IN_TIME_SCORES_BY_ENGINE[engine] = (version, scores)
+        return scores
+
+    def get_stats_as_of(self, as_of: dt.date) -> pd.DataFrame:
+        """Per-furu sufficient statistics of the positions closed on or before `as_of`"""
+        as_of = np.datetime64(as_of, "D")
+        furu_ids: List[int] = []
+        rows = []
+        for furu_id, close_dates in self.close_dates.items():
+            closed_count = np.searchsorted(close_dates, as_of, side="right")
+            if closed_count:
+                furu_ids.append(furu_id)
+                rows.append(self.cumulative_statistics[furu_id][closed_count - 1])
+        stats = pd.DataFrame(
+            np.array(rows).reshape(-1, len(FuruStats.STAT_COLUMNS)),
+            columns=list(FuruStats.STAT_COLUMNS),
+        )
+        stats[["trades_won", "trades_lost", "sum_holding_days"]] = stats[
+            ["trades_won", "trades_lost", "sum_holding_days"]
+        ].round().astype(int)
+        stats.insert(0, "furu_id", np.array(furu_ids, dtype=int))
+        return stats
+
+    def get_metrics_as_of(self, as_of: dt.date) -> pd.DataFrame:
+        return derive_furu_metrics_frame(self.get_stats_as_of(as_of))
+
+
+# latest scores of each database with the data version they were built at
+POINT_IN_TIME_SCORES_BY_ENGINE: Dict[Engine, Tuple[int, PointInTimeScores]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_leaderboard_as_of(
+    dbsess: Session, as_of: dt.date, scores: PointInTimeScores = None
+) -> pd.DataFrame:
+    """The leaderboard as it would have been ranked with the positions closed by `as_of`"""
+    if scores is None:
+        scores = PointInTimeScores.from_db(dbsess)
+    leaderboard = filter_leaderboard_metrics(scores.get_metrics_as_of(as_of))
+    handles = pd.read_sql(text("SELECT id AS furu_id, handle FROM furu"), dbsess.bind)
+    return leaderboard.merge(handles, on="furu_id")[["furu_id"] + LEADERBOARD_COLUMNS]
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.db.models import DataVersion, FuruPositionMark, TickerConsensus
+from rankr.db.snapshots import publish_snapshot
+
+
+logger = get_logger()
+
+MARK_LOOKBACK_PERIOD = "5d"
+
+
+def get_open_priced_positions_frame(session: Session) -> pd.DataFrame:
+    query = text(
+        """
+        SELECT
+            ft.id AS position_id,
+            ft.furu_id,
+            COALESCE(ft.ticker_symbol, t.symbol) AS symbol,
+            ft.price_entered
+        FROM furu_ticker ft
+        LEFT JOIN ticker t ON t.id = ft.ticker_id
+        WHERE ft.date_closed IS NULL
+            AND ft.furu_id IS NOT NULL
+            AND ft.price_entered IS NOT NULL AND ft.price_entered != 0
+        """
+    )
+    return pd.read_sql(query, session.bind)
+
+
+def fetch_close_price_matrix(symbols: List[str]) -> pd.DataFrame:
+    """Date-by-symbol matrix of the recent daily closes of the given symbols"""
+    logger.info(f"Fetching latest closes for {len(symbols)} symbols with open positions")
+    prices = yfinance.download(symbols, period=MARK_LOOKBACK_PERIOD, group_by="column")
+    closes = prices["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+    return closes
+
+
+def get_latest_closes(price_matrix: pd.DataFrame) -> pd.DataFrame:
+    """Last available close and its date per symbol column of a date-by-symbol matrix"""
+    price_matrix = price_matrix.sort_index()
+    values = price_matrix.to_numpy(dtype=float)
+    has_price = ~np.isnan(values)
+    # row of the last non-null close per column, -1 when the column has no close at all
+    last_rows = np.where(
+        has_price.any(axis=0),
+        len(values) - 1 - np.argmax(has_price[::-1], axis=0),
+        -1,
+    )
+    columns = np.arange(values.shape[1])
+    valid = last_rows >= 0
+    return pd.DataFrame(
+        {
+            "symbol": price_matrix.columns[valid],
+            "price_marked": values[last_rows[valid], columns[valid]],
+            "date_marked": pd.to_datetime(price_matrix.index[last_rows[valid]]).date,
+        }
+    )
+
+
+def mark_open_positions_to_market(
+    session: Session, price_matrix: Optional[pd.DataFrame] = None
+) -> int:
+    """
+    Stores the unrealized return of every open priced position at its symbol's latest close.
+
+    Closes are fetched only for the symbols with open positions (unless a date-by-symbol
+    `price_matrix` is given) and all returns are computed in one vectorized pass.
+    """
+    positions = get_open_priced_positions_frame(session)
+    if positions.empty:
+        logger.info("No open priced positions to mark to market")
+        session.query(FuruPositionMark).delete(synchronize_session=False)
+        TickerConsensus.rebuild(session.connection())
+        DataVersion.bump(session.connection())
+        session.commit()
+        return 0
+    if price_matrix is None:
+        price_matrix = fetch_close_price_matrix(sorted(positions.symbol.unique()))
+
+    marks = positions.merge(get_latest_closes(price_matrix), on="symbol")
+    marks = marks[marks.price_marked != 0]
+    marks["unrealized_return"] = marks.price_marked / marks.price_entered - 1
+    logger.info(
+        f"Marked {len(marks)} of {len(positions)} open positions to market "
+        f"in {marks.symbol.nunique()} symbols"
+    )
+
+    session.query(FuruPositionMark).delete(synchronize_session=False)
+    if not marks.empty:
+        session.execute(
+            FuruPositionMark.__table__.insert(),
+            marks.drop(columns=["price_entered"]).astype(object).to_dict(orient="records"),
+        )
+    # marks feed the last price and unrealized return of the consensus
+    TickerConsensus.rebuild(session.connection())
+    DataVersion.bump(session.connection())
+    session.commit()
+    publish_snapshot(session, "mark to market")
+
+    return len(marks)
@@ -0,0 +1,106 @@
+import dataclasses
+import datetime as dt
+from typing import List, Optional
+
+from rankr.actions.finds import get_nearest_business_day_in_future
+from rankr.db.models import Furu
+
+
+@dataclasses.dataclass(frozen=True)
+class PositionInterval:
+    """A raw position as plain data: held in a symbol from entry until close (None if open)"""
+
+    symbol: str
+    date_entered: dt.date
+    date_last_mentioned: dt.date
+    date_closed: Optional[dt.date] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.date_closed is None
+
+
+@dataclasses.dataclass(frozen=True)
+class PositionChanges:
+    """
+    Outcome of advancing a symbol's positions over new mentions.
+
+    `existing` is the new state of the open position that was passed in (None if there
+    was none), `opened` the positions opened by the mentions, oldest first.
+    """
+
+    existing: Optional[PositionInterval]
+    opened: List[PositionInterval]
+
+    @property
+    def closed(self) -> List[PositionInterval]:
+        intervals = ([self.existing] if self.existing else []) + self.opened
+        return [interval for interval in intervals if not interval.is_open]
+
+    @property
+    def open_position(self) -> Optional[PositionInterval]:
+        intervals = ([self.existing] if self.existing else []) + self.opened
+        if intervals and intervals[-1].is_open:
+            return intervals[-1]
+        return None
+
+
+def advance_positions(
+    symbol: str,
+    mention_dates: List[dt.date],
+    open_position: Optional[PositionInterval] = None,
+    today: dt.date = None,
+    days_silence_for_position_exit: int = Furu.DAYS_SILENCE_FOR_POSITION_EXIT,
+    days_taken_to_exit_position: int = Furu.DAYS_TAKEN_TO_EXIT_POSITION,
+) -> PositionChanges:
+    """
+    Runs the mention state machine of a symbol over sorted mention dates.
+
+    A position opens on the first business day from a mention, stays open while the
+    symbol keeps being mentioned, and closes `days_taken_to_exit_position` after its last
+    mention once the symbol goes unmentioned for more than `days_silence_for_position_exit`
+    days, either between two mentions or until `today`.
+    """
+    today = today or dt.date.today()
+    exit_delta = dt.timedelta(days=days_taken_to_exit_position)
+    existing = open_position
+    opened: List[PositionInterval] = []
+    position = open_position
+
+    def update(interval: PositionInterval, **changes) -> PositionInterval:
+        nonlocal existing
+        interval = dataclasses.replace(interval, **changes)
+        if opened:
+            opened[-1] = interval
+        else:
+            existing = interval
+        return interval
+
+    for mention_date in mention_dates:
+        if (
+            position is not None
+            and position.is_open
+            and (mention_date - position.date_last_mentioned).days
+            > days_silence_for_position_exit
+        ):
+            position = update(
+                position, date_closed=position.date_last_mentioned + exit_delta
+            )
+        if position is None or not position.is_open:
+            position = PositionInterval(
+                symbol=symbol,
+                date_entered=get_nearest_business_day_in_future(mention_date),
+                date_last_mentioned=mention_date,
+            )
+            opened.append(position)
+        elif mention_date > position.date_last_mentioned:
+            position = update(position, date_last_mentioned=mention_date)
+
+    if (
+        position is not None
+        and position.is_open
+        and (today - position.date_last_mentioned).days > days_silence_for_position_exit
+    ):
+        update(position, date_closed=position.date_last_mentioned + exit_delta)
+
+    return PositionChanges(existing=existing, opened=opened)
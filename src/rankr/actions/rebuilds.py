@@ -0,0 +1,289 @@
+import concurrent.futures as cf
+import datetime as dt
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.actions.archives import load_archived_tweets_by_furu_id
+from rankr.actions.backtests import get_mention_dates_by_symbol
+from rankr.actions.positions import advance_positions
+from rankr.db import create_db_session_from_cfg
+from rankr.db.models import (
+    ConsensusDetectorState,
+    DataVersion,
+    Furu,
+    FuruDailyStats,
+    FuruPositionCursor,
+    FuruStats,
+    FuruTicker,
+    FuruTweet,
+    TickerConsensus,
+)
+
+
+logger = get_logger()
+
+TWEET_CHUNKS_PER_FETCH = 50
+
+
+def get_raw_position_rows(
+    furu_id: int, symbol: str, mention_dates: List[dt.date], today: dt.date
+) -> List[dict]:
+    """FuruTicker rows of the positions the position engine opens from all of a symbol's mentions"""
+    changes = advance_positions(symbol, mention_dates, today=today)
+    return [
+        {
+            "furu_id": furu_id,
+            "ticker_symbol": interval.symbol,
+            "date_entered": interval.date_entered,
+            "date_closed": interval.date_closed,
+            "date_last_mentioned": interval.date_last_mentioned,
+        }
+        for interval in changes.opened
+    ]
+
+
+def get_furu_position_rows(furu_id: int, tweets: list, today: dt.date) -> List[dict]:
+    """Raw position rows of all the symbols a furu mentioned in the given tweets"""
+    rows = []
+    for symbol, mention_dates in get_mention_dates_by_symbol(tweets).items():
+        rows += get_raw_position_rows(furu_id, symbol, mention_dates, today)
+    return rows
+
+
+def get_shard_position_rows(
+    dbsess: Session, furu_ids: List[int], include_archived: bool = True
+) -> List[dict]:
+    """
+    Streams the stored tweets of a shard of furus and computes their raw positions in memory.
+
+    Chunks are read in furu order and each furu is computed as soon as its last chunk is
+    read, so only one furu's stored tweets are held at a time. Archived tweets are read per
+    shard, as each monthly partition holds all furus, and released as their furu is computed.
+    """
+    today = dt.date.today()
+    archived_tweets_by_furu_id: Dict[int, list] = (
+        load_archived_tweets_by_furu_id(furu_ids) if include_archived else {}
+    )
+    tweet_chunks = (
+        dbsess.query(FuruTweet.furu_id, FuruTweet.tweets)
+        .filter(FuruTweet.furu_id.in_(furu_ids))
+        .order_by(FuruTweet.furu_id, FuruTweet.id)
+        .yield_per(TWEET_CHUNKS_PER_FETCH)
+    )
+
+    rows = []
+    for furu_id, furu_chunks in itertools.groupby(tweet_chunks, key=lambda chunk: chunk[0]):
+        tweets = archived_tweets_by_furu_id.pop(furu_id, [])
+        for _, chunk_tweets in furu_chunks:
+            tweets.extend(chunk_tweets or [])
+        rows += get_furu_position_rows(furu_id, tweets, today)
+    # furus whose tweets are all archived
+    for furu_id in list(archived_tweets_by_furu_id):
+        tweets = archived_tweets_by_furu_id.pop(furu_id)
+        rows += get_furu_position_rows(furu_id, tweets, today)
+    return rows
+
+
+def rebuild_shard_in_process(
+    shard_furu_ids: List[int], include_archived: bool = True
+) -> Tuple[List[int], List[dict]]:
+    """Process-pool worker: opens its own session and returns the shard's position rows"""
+    dbsess = create_db_session_from_cfg()
+    try:
+        return shard_furu_ids, get_shard_position_rows(
+            dbsess, shard_furu_ids, include_archived
+        )
+    finally:
+        dbsess.close()
+
+
+def get_kept_position_rows(dbsess: Session, furu_ids: List[int], rows: List[dict]) -> List[dict]:
+    """
+    Complete insert rows for the raw rows, where a rebuilt position matching a stored one on
+    furu, symbol and entry date keeps its id, ticker and entry price, and its closing price
+    if it closes on the same date, so rebuilt positions do not need to be priced again
+    """
+    stored_positions = {
+        (position.furu_id, position.ticker_symbol, position.date_entered): position
+        for position in dbsess.query(
+            FuruTicker.id,
+            FuruTicker.furu_id,
+            FuruTicker.ticker_symbol,
+            FuruTicker.date_entered,
+            FuruTicker.date_closed,
+            FuruTicker.ticker_id,
+            FuruTicker.price_entered,
+            FuruTicker.price_closed,
+        ).filter(FuruTicker.furu_id.in_(furu_ids))
+    }
+    position_rows = []
+    for row in rows:
+        position_row = {
+            "id": None,
+            "ticker_id": None,
+            "date_closed": None,
+            "date_last_mentioned": None,
+            "price_entered": None,
+            "price_closed": None,
+            **row,
+        }
+        stored = stored_positions.get(
+            (row["furu_id"], row["ticker_symbol"], row["date_entered"])
+        )
+        if stored is not None:
+            position_row["id"] = stored.id
+            position_row["ticker_id"] = stored.ticker_id
+            position_row["price_entered"] = stored.price_entered
+            if stored.date_closed is not None and stored.date_closed == row.get("date_closed"):
+                position_row["price_closed"] = stored.price_closed
+        position_row["realized_return"] = FuruTicker.get_realized_return(
+            position_row["date_closed"],
+            position_row["price_entered"],
+            position_row["price_closed"],
+        )
+        position_rows.append(position_row)
+    return position_rows
+
+
+def replace_furu_positions(dbsess: Session, furu_ids: List[int], rows: List[dict]):
+    """
+    Replaces the positions of the given furus with raw rows in one bulk write.
+
+    Positions that survive the rebuild keep their ids and prices, and their marks while they
+    stay open. The consensus detector skips the rebuilt positions, which are history.
+    """
+    connection = dbsess.connection()
+    ticker_ids = set(TickerConsensus.get_open_ticker_ids(connection, furu_ids))
+    position_rows = get_kept_position_rows(dbsess, furu_ids, rows)
+    kept_open_position_ids = [
+        row["id"]
+        for row in position_rows
+        if row["id"] is not None and row["date_closed"] is None
+    ]
+    dbsess.execute(
+        text(
+            """
+            DELETE FROM furu_position_mark
+            WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))
+                AND position_id NOT IN (SELECT value FROM json_each(:position_ids))
+            """
+        ),
+        {"furu_ids": json.dumps(furu_ids), "position_ids": json.dumps(kept_open_position_ids)},
+    )
+    for table in ["furu_position_cursor", "furu_ticker"]:
+        dbsess.execute(
+            text(
+                f"DELETE FROM {table} "
+                f"WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))"
+            ),
+            {"furu_ids": json.dumps(furu_ids)},
+        )
+    if position_rows:
+        dbsess.execute(FuruTicker.__table__.insert(), position_rows)
+    ConsensusDetectorState.advance(connection)
+    # bulk writes bypass the flush listeners, so rebuild the derived tables
+    ticker_ids.update(TickerConsensus.get_open_ticker_ids(connection, furu_ids))
+    FuruStats.rebuild(connection, furu_ids)
+    FuruDailyStats.rebuild(connection, furu_ids)
+    FuruPositionCursor.rebuild(connection, furu_ids)
+    TickerConsensus.rebuild(connection, sorted(ticker_ids))
+    DataVersion.bump(connection)
+    dbsess.commit()
+
+
+def replace_shard_positions(
+    dbsess: Session, shard_results: List[Tuple[List[int], List[dict]]]
+) -> Tuple[int, List[List[int]]]:
+    """
+    Writes the computed positions of each shard, returning the number of positions written
+    and the furu ids of the shards that failed to be written, which are left untouched.
+    """
+    total_positions = 0
+    failed_shards = []
+    for i, (shard_furu_ids, rows) in enumerate(shard_results, start=1):
+        try:
+            replace_furu_positions(dbsess, shard_furu_ids, rows)
+            total_positions += len(rows)
+            logger.info(
+                f"Wrote shard {i}/{len(shard_results)}: {len(shard_furu_ids)} furus, "
+                f"{len(rows)} positions"
+            )
+        except Exception as ex:
+            dbsess.rollback()
+            failed_shards.append(shard_furu_ids)
+            logger.exception(
+                f"Failed to write shard {i}/{len(shard_results)} of "
+                f"{len(shard_furu_ids)} furus. Reason: {ex}"
+            )
+    return total_positions, failed_shards
+
+
+def rebuild_furu_positions_multi_process(
+    dbsess: Session,
+    workers: int = None,
+    include_archived: bool = True,
+    shard_size: int = 200,
+) -> Tuple[int, List[List[int]]]:
+    """
+    Rebuilds the raw positions of all active furus from their stored tweets, computing
+    shards of furu ids in worker processes.
+
+    Shards are only written once every worker finished reading, so the single writer never
+    contends with the workers' reads. Returns the number of positions written and the furu
+    ids of the shards that failed to be computed or written, whose positions are unchanged.
+    """
+    furu_ids = [
+        furu_id
+        for furu_id, in dbsess.query(Furu.id)
+        .filter(Furu.status == Furu.Status.ACTIVE)
+        .order_by(Furu.id)
+    ]
+    if not furu_ids:
+        return 0, []
+    shards = [furu_ids[i : i + shard_size] for i in range(0, len(furu_ids), shard_size)]
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    logger.info(
+        f"Rebuilding positions of {len(furu_ids)} furus in {len(shards)} shards "
+        f"with {workers} processes"
+    )
+
+    start = time.monotonic()
+    shard_results = []
+    failed_shards = []
+    # end the read transaction so the parent holds no lock while workers read
+    dbsess.commit()
+    with cf.ProcessPoolExecutor(max_workers=workers) as exe:
+        jobs = {
+            exe.submit(rebuild_shard_in_process, shard, include_archived): shard
+            for shard in shards
+        }
+        for i, job in enumerate(cf.as_completed(jobs), start=1):
+            try:
+                shard_results.append(job.result())
+                logger.info(
+                    f"Computed shard {i}/{len(shards)}: {len(jobs[job])} furus "
+                    f"({time.monotonic() - start:.1f}s elapsed)"
+                )
+            except Exception as ex:
+                failed_shards.append(jobs[job])
+                logger.exception(
+                    f"Failed to compute shard {i}/{len(shards)} of {len(jobs[job])} furus. "
+                    f"Reason: {ex}"
+                )
+
+    total_positions, failed_writes = replace_shard_positions(dbsess, shard_results)
+    failed_shards += failed_writes
+    if failed_shards:
+        logger.error(
+            f"Positions of {sum(len(shard) for shard in failed_shards)} furus in "
+            f"{len(failed_shards)} shards were not rebuilt"
+        )
+
+    return total_positions, failed_shards
@@ -0,0 +1,193 @@
+import datetime as dt
+import warnings
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.actions.backtests import PriceArrays, load_price_arrays
+from rankr.db.models import DataVersion, FuruRisk
+from rankr.db.snapshots import publish_snapshot
+
+
+logger = get_logger()
+
+TRADING_DAYS_PER_YEAR = 252
+MIN_TRADING_DAYS = 2
+POSITION_CHUNK_SIZE = 2000
+
+RISK_COLUMNS = [
+    "trading_days",
+    "total_return",
+    "annualized_volatility",
+    "sharpe_ratio",
+    "sortino_ratio",
+    "max_drawdown",
+    "max_days_under_water",
+    "share_days_under_water",
+]
+
+
+def get_priced_positions_frame(session: Session) -> pd.DataFrame:
+    query = text(
+        """
+        SELECT
+            ft.furu_id,
+            COALESCE(ft.ticker_symbol, t.symbol) AS symbol,
+            ft.date_entered,
+            ft.date_closed
+        FROM furu_ticker ft
+        LEFT JOIN ticker t ON t.id = ft.ticker_id
+        WHERE ft.furu_id IS NOT NULL
+            AND ft.price_entered IS NOT NULL
+            AND (ft.date_closed IS NULL OR ft.price_closed IS NOT NULL)
+        """
+    )
+    return pd.read_sql(query, session.bind, parse_dates=["date_entered", "date_closed"])
+
+
+def get_daily_return_matrix(price_arrays: PriceArrays) -> pd.DataFrame:
+    """Date-by-symbol matrix of daily close-to-close returns over all trading dates"""
+    closes = pd.DataFrame(
+        {
+            symbol: pd.Series(prices["close"], index=prices["date"])
+            for symbol, prices in price_arrays.items()
+        }
+    ).sort_index()
+    return closes.ffill().pct_change().fillna(0.0)
+
+
+def get_equity_curve_returns(
+    positions: pd.DataFrame, daily_returns: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Furu-by-date matrix of the daily returns of an equal-weight book of each furu's
+    concurrently held positions, NaN outside the furu's first to last holding day.
+
+    A position earns the return of every trading day after its entry up to its close,
+    positions are accumulated per furu in chunks to bound memory.
+    """
+    positions = positions[positions.symbol.isin(daily_returns.columns)]
+    positions = positions.sort_values(by="furu_id", kind="stable")
+    furu_ids = positions.furu_id.unique()
+    dates = daily_returns.index.values.astype("datetime64[D]")
+    returns = daily_returns.to_numpy(dtype=float)
+    symbol_columns = daily_returns.columns.get_indexer(positions.symbol)
+    furu_rows = np.searchsorted(furu_ids, positions.furu_id.to_numpy())
+    entry_days = np.searchsorted(
+        dates, positions.date_entered.values.astype("datetime64[D]"), side="right"
+    )
+    exit_dates = positions.date_closed.values.astype("datetime64[D]")
+    exit_days = np.where(
+        np.isnat(exit_dates),
+        len(dates),
+        np.searchsorted(dates, exit_dates, side="right"),
+    )
+
+    day_index = np.arange(len(dates))
+    return_sums = np.zeros((len(furu_ids), len(dates)))
+    held_counts = np.zeros((len(furu_ids), len(dates)))
+    for start in range(0, len(positions), POSITION_CHUNK_SIZE):
+        chunk = slice(start, start + POSITION_CHUNK_SIZE)
+        held = (day_index >= entry_days[chunk, None]) & (day_index < exit_days[chunk, None])
+        held_returns = np.where(held, returns[:, symbol_columns[chunk]].T, 0.0)
+        # rows are sorted by furu, so every segment of the chunk belongs to one furu
+        rows = furu_rows[chunk]
+        segment_starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+        segment_rows = rows[segment_starts]
+        return_sums[segment_rows] += np.add.reduceat(held_returns, segment_starts, axis=0)
+        held_counts[segment_rows] += np.add.reduceat(
+            held.astype(float), segment_starts, axis=0
+        )
+
+    daily = np.divide(
+        return_sums, held_counts, out=np.zeros_like(return_sums), where=held_counts > 0
+    )
+    # days before the first and after the last held position are not part of the curve
+    is_holding = held_counts > 0
+    is_active = np.maximum.accumulate(is_holding, axis=1) & np.maximum.accumulate(
+        is_holding[:, ::-1], axis=1
+    )[:, ::-1]
+    daily[~is_active] = np.nan
+    return pd.DataFrame(daily, index=furu_ids, columns=daily_returns.index)
+
+
+def calculate_risk_metrics(daily_returns: np.ndarray) -> Dict[str, np.ndarray]:
+    """Risk metrics per row of a furu-by-date return matrix with NaN for inactive days"""
+    is_active = ~np.isnan(daily_returns)
+    trading_days = is_active.sum(axis=1)
+    returns = np.nan_to_num(daily_returns)
+    equity = np.cumprod(1 + returns, axis=1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        # rows without enough active days are all-NaN, their metrics are dropped below
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(daily_returns, axis=1)
+        volatility = np.nanstd(daily_returns, axis=1, ddof=1)
+        downside_deviation = np.sqrt(
+            np.nanmean(np.minimum(daily_returns, 0.0) ** 2, axis=1)
+        )
+        sharpe_ratio = np.where(
+            volatility > 0, mean / volatility * np.sqrt(TRADING_DAYS_PER_YEAR), np.nan
+        )
+        sortino_ratio = np.where(
+            downside_deviation > 0,
+            mean / downside_deviation * np.sqrt(TRADING_DAYS_PER_YEAR),
+            np.nan,
+        )
+
+    under_water = (drawdown < 0) & is_active
+    under_water_days = np.cumsum(under_water, axis=1)
+    # length of the current under-water streak: days under water since the last recovery
+    streaks = under_water_days - np.maximum.accumulate(
+        np.where(under_water, 0, under_water_days), axis=1
+    )
+    has_history = trading_days >= MIN_TRADING_DAYS
+    return {
+        "trading_days": trading_days,
+        "total_return": np.where(has_history, equity[:, -1] - 1, np.nan),
+        "annualized_volatility": np.where(
+            has_history, volatility * np.sqrt(TRADING_DAYS_PER_YEAR), np.nan
+        ),
+        "sharpe_ratio": np.where(has_history, sharpe_ratio, np.nan),
+        "sortino_ratio": np.where(has_history, sortino_ratio, np.nan),
+        "max_drawdown": np.where(has_history, drawdown.min(axis=1), np.nan),
+        "max_days_under_water": np.where(has_history, streaks.max(axis=1), np.nan),
+        "share_days_under_water": np.where(
+            has_history, under_water.sum(axis=1) / np.maximum(trading_days, 1), np.nan
+        ),
+    }
+
+
+def get_furu_risk_frame(
+    positions: pd.DataFrame, price_arrays: PriceArrays
+) -> pd.DataFrame:
+    if positions.empty or not price_arrays:
+        return pd.DataFrame(columns=["furu_id"] + RISK_COLUMNS)
+    curves = get_equity_curve_returns(positions, get_daily_return_matrix(price_arrays))
+    metrics = pd.DataFrame(calculate_risk_metrics(curves.to_numpy()))
+    metrics.insert(0, "furu_id", curves.index)
+    return metrics[metrics.trading_days > 0]
+
+
+def update_furu_risks(session: Session, include_archived: bool = True) -> int:
+    """Rebuilds every furu's equity curve from positions and cached closes and stores its risk"""
+    positions = get_priced_positions_frame(session)
+    price_arrays = load_price_arrays(session, positions.symbol.unique(), include_archived)
+    risks = get_furu_risk_frame(positions, price_arrays)
+    logger.info(f"Computed risk metrics for {len(risks)} furus")
+
+    risks["date_computed"] = dt.date.today()
+    risks = risks.astype(object).where(risks.notna(), None)
+    session.query(FuruRisk).delete(synchronize_session=False)
+    if not risks.empty:
+        session.execute(FuruRisk.__table__.insert(), risks.to_dict(orient="records"))
+    DataVersion.bump(session.connection())
+    session.commit()
+    publish_snapshot(session, "risk metrics")
+
+    return len(risks)
@@ -1,8 +1,10 @@
 import pathlib
 from contextlib import contextmanager
+from typing import List
 
 import structlog
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, scoped_session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
@@ -14,12 +16,119 @@ DB_PATH = pathlib.Path(__file__).parent.parent.parent.parent.joinpath("db", "fur
 logger = structlog.get_logger()
 
 
-def create_db_session_from_cfg(echo: bool = False) -> Session:
+def add_missing_columns(engine: Engine, tables: list) -> List[str]:
+    """Adds the columns added to the models to existing tables, as nullable columns"""
+    inspector = inspect(engine)
+    added_columns = []
+    with engine.begin() as connection:
+        for table in tables:
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                    added_columns.append(f"{table.name}.{column.name}")
+    return added_columns
+
+
+def upgrade_db_schema(engine: Engine) -> list:
+    """Creates the tables and columns added to the models since the database file was created"""
+    from rankr.db.models import (
+        Base,
+        FuruDailyStats,
+        FuruPositionCursor,
+        FuruStats,
+        FuruTicker,
+        TickerConsensus,
+    )
+
+    # tables derived from existing rows are backfilled when first created
+    derived_table_models = [FuruStats, FuruPositionCursor, FuruDailyStats, TickerConsensus]
+    # and so are derived columns
+    derived_column_rebuilds = {
+        "furu_ticker.realized_return": FuruTicker.rebuild_realized_returns,
+    }
+
+    existing_tables = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(engine)
+    created_tables = [t for t in Base.metadata.tables if t not in existing_tables]
+    added_columns = add_missing_columns(
+        engine, [t for t in Base.metadata.sorted_tables if t.name in existing_tables]
+    )
+    # indexes added to existing tables are not created by create_all
+    for table in Base.metadata.sorted_tables:
+        if table.name in existing_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+    if added_columns:
+        logger.info(f"Added columns: {added_columns}")
+        with engine.begin() as connection:
+            for column in added_columns:
+                if column in derived_column_rebuilds:
+                    derived_column_rebuilds[column](connection)
+    if created_tables and existing_tables:
+        logger.info(f"Created tables: {created_tables}")
+        with engine.begin() as connection:
+            for model in derived_table_models:
+                if model.__tablename__ in created_tables:
+                    model.rebuild(connection)
+
+    return created_tables
+
+
+def enable_sqlite_savepoints(engine: Engine) -> Engine:
+    """
+    pysqlite opens transactions lazily and breaks SAVEPOINT semantics, so hand
+    transaction control over to SQLAlchemy. Read more:
+    https://docs.sqlalchemy.org/en/14/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+    """
+
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+def enable_sqlite_write_ahead_log(engine: Engine) -> Engine:
+    """
+    With SQLAlchemy in control of transactions (see enable_sqlite_savepoints) every ORM
+    session holds its transaction open until commit or rollback, which in SQLite's default
+    rollback journal mode blocks writers for as long as any reader's SHARED lock lives.
+    In write-ahead log mode readers never block the writer nor the writer readers, so only
+    concurrent writers wait on each other, for up to the connection timeout. Read more:
+    https://www.sqlite.org/wal.html
+    """
+
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        # in-memory databases stay in memory journal mode
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    return engine
+
+
+def create_db_engine(echo: bool = False, **kwargs) -> Engine:
     engine = create_engine(
         url=f"sqlite:///{DB_PATH}",
         connect_args={"check_same_thread": False},
         echo=echo,
+        **kwargs,
     )
+    enable_sqlite_savepoints(engine)
+    enable_sqlite_write_ahead_log(engine)
+    upgrade_db_schema(engine)
+    return engine
+
+
+def create_db_session_from_cfg(echo: bool = False) -> Session:
+    engine = create_db_engine(echo=echo)
     session_maker = sessionmaker(bind=engine)
     return session_maker()
 
@@ -45,19 +154,15 @@ def create_db_scoped_session(echo: bool = False) -> scoped_session:
     Read more:
     https://coderedirect.com/questions/246376/sqlalchemy-proper-session-handling-in-multi-thread-applications
     """
-    engine = create_engine(
-        url=f"sqlite:///{DB_PATH}",
-        connect_args={"check_same_thread": False},
-        echo=echo,
-        poolclass=QueuePool,
-    )
+    engine = create_db_engine(echo=echo, poolclass=QueuePool)
     session_maker = sessionmaker(bind=engine)
     return scoped_session(session_maker)
 
 
 @contextmanager
-def scoped_session_context_manager(scoped_session_class: scoped_session = create_db_scoped_session()) -> Session:
+def scoped_session_context_manager(scoped_session_class: scoped_session = None) -> Session:
     """Provide a transactional scope around a series of operations."""
+    scoped_session_class = scoped_session_class or create_db_scoped_session()
     session: Session = scoped_session_class()
     try:
         yield session
@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+from typing import Hashable, List, Optional
+
+import structlog
+from sqlalchemy.orm import Session
+
+
+logger = structlog.get_logger()
+
+
+class BatchUnitOfWork:
+    """
+    Commits the work of a pipeline stage in batches, isolating every item in a SAVEPOINT.
+
+    A failing item only rolls back its own changes and is recorded for retry, the batch
+    is committed once `batch_size` items were processed or `max_batch_seconds` elapsed.
+
+    --
+
+    with BatchUnitOfWork(session, "raw positions", batch_size=100) as uow:
+
+        for furu in furus:
+
+            with uow.item(furu.id):
+
+                create_raw_furu_positions_with_new_tweets(furu)
+
+    retry_ids = uow.failed_item_ids
+
+    --
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        stage: str,
+        batch_size: int = 100,
+        max_batch_seconds: Optional[float] = None,
+    ):
+        self.session = session
+        self.stage = stage
+        self.batch_size = batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self.items_processed = 0
+        self.items_in_batch = 0
+        self.failed_item_ids: List[Hashable] = []
+        self.commit_latencies: List[float] = []
+        self._batch_started_at = time.monotonic()
+
+    def __str__(self):
+        return (
+            f"BatchUnitOfWork {self.stage} "
+            f"[items: {self.items_processed}, failed: {len(self.failed_item_ids)}, "
+            f"commits: {len(self.commit_latencies)}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self) -> "BatchUnitOfWork":
+        self._batch_started_at = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            logger.error(
+                f"Rolling back {self.items_in_batch} uncommitted items of {self}. Reason: {exc_val}"
+            )
+            self.session.rollback()
+            return False
+        if self.items_in_batch:
+            self.commit()
+        self.log_report()
+        return False
+
+    @contextmanager
+    def item(self, item_id: Hashable):
+        savepoint = self.session.begin_nested()
+        try:
+            yield
+            savepoint.commit()
+        except Exception as ex:
+            savepoint.rollback()
+            self.failed_item_ids.append(item_id)
+            logger.exception(f"Failed item {item_id} in {self.stage}. Reason: {ex}")
+        self.items_processed += 1
+        self.items_in_batch += 1
+        if self.is_batch_due:
+            self.commit()
+
+    @property
+    def is_batch_due(self) -> bool:
+        if self.items_in_batch >= self.batch_size:
+            return True
+        return (
+            self.max_batch_seconds is not None
+            and time.monotonic() - self._batch_started_at >= self.max_batch_seconds
+        )
+
+    def commit(self):
+        start = time.monotonic()
+        self.session.commit()
+        self.commit_latencies.append(time.monotonic() - start)
+        logger.debug(
+            f"Committed {self.items_in_batch} items of {self.stage} "
+            f"in {self.commit_latencies[-1]:.3f}s"
+        )
+        self.items_in_batch = 0
+        self._batch_started_at = time.monotonic()
+
+    @property
+    def report(self) -> dict:
+        return {
+            "stage": self.stage,
+            "items_processed": self.items_processed,
+            "items_failed": len(self.failed_item_ids),
+            "commits": len(self.commit_latencies),
+            "mean_commit_seconds": sum(self.commit_latencies) / len(self.commit_latencies)
+            if self.commit_latencies
+            else None,
+            "max_commit_seconds": max(self.commit_latencies, default=None),
+        }
+
+    def log_report(self):
+        report = self.report
+        logger.info(
+            f"Finished {self.stage}: {report['items_processed']} items, "
+            f"{report['items_failed']} failed, {report['commits']} commits "
+            f"(mean: {report['mean_commit_seconds'] or 0:.3f}s, "
+            f"max: {report['max_commit_seconds'] or 0:.3f}s)"
+        )
+        if self.failed_item_ids:
+            logger.warning(f"Failed items in {self.stage} to retry: {self.failed_item_ids}")
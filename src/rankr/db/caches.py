@@ -0,0 +1,143 @@
+import collections
+import hashlib
+import os
+import pathlib
+import pickle
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+import pandas as pd
+import structlog
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from rankr.db import DB_PATH
+from rankr.db.models import DataVersion
+
+
+REPORT_CACHE_PATH = DB_PATH.parent.joinpath("cache", "reports")
+
+
+logger = structlog.get_logger()
+
+
+def get_data_version(session: Session) -> Optional[int]:
+    """
+    Data version of the session's database, None if it predates version tracking. It is
+    read on a connection of its own, as a session whose transaction began before the latest
+    commit would otherwise keep serving the version of its stale view.
+    """
+    try:
+        with session.get_bind().connect() as connection:
+            return DataVersion.get_version(connection)
+    except OperationalError:
+        return None
+
+
+class ReportCache:
+    """
+    Report results keyed by report name, arguments and database, valid for one data version.
+
+    Results are kept in a small in-memory LRU and pickled to disk so they survive restarts.
+    Any commit bumping the database's data version makes every cached result stale.
+    Instances can be shared between threads.
+
+    --
+
+    golden_portfolio = report_cache.get_report(session, "golden_portfolio", get_golden_portfolio)
+
+    --
+    """
+
+    def __init__(
+        self, cache_path: Optional[pathlib.Path] = REPORT_CACHE_PATH, max_entries: int = 16
+    ):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._entries: "collections.OrderedDict[str, Tuple[int, Any]]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"ReportCache [entries: {len(self._entries)}] [path: {self.cache_path}]"
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def get_key(session: Session, name: str, args: tuple, kwargs: dict) -> str:
+        database = str(session.get_bind().url)
+        key = repr((database, args, sorted(kwargs.items())))
+        return f"{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+
+    def get_report(
+        self, session: Session, name: str, compute: Callable[..., Any], *args, **kwargs
+    ) -> Any:
+        """Returns the cached `compute(session, *args, **kwargs)` for the current data version"""
+        version = get_data_version(session)
+        if version is None:
+            return compute(session, *args, **kwargs)
+        key = self.get_key(session, name, args, kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        entry = entry or self._read(key)
+        if entry is not None and entry[0] == version:
+            logger.debug(f"Serving cached {name} report at data version {version}")
+            self._remember(key, entry)
+            return self._copy(entry[1])
+
+        logger.info(f"Computing {name} report at data version {version}")
+        result = compute(session, *args, **kwargs)
+        self._remember(key, (version, result))
+        self._write(key, (version, result))
+        return self._copy(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_path is not None and self.cache_path.exists():
+            for path in self.cache_path.glob("*.pkl"):
+                path.unlink()
+
+    @staticmethod
+    def _copy(result: Any) -> Any:
+        # callers may modify the frames they get back
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def _remember(self, key: str, entry: Tuple[int, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read(self, key: str) -> Optional[Tuple[int, Any]]:
+        if self.cache_path is None:
+            return None
+        path = self.cache_path.joinpath(f"{key}.pkl")
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except Exception as ex:
+            logger.warning(f"Ignoring unreadable report cache file {path}. Reason: {ex}")
+            return None
+
+    def _write(self, key: str, entry: Tuple[int, Any]):
+        if self.cache_path is None:
+            return
+        try:
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            path = self.cache_path.joinpath(f"{key}.pkl")
+            temporary_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(temporary_path, "wb") as cache_file:
+                pickle.dump(entry, cache_file)
+            os.replace(temporary_path, path)
+        except Exception as ex:
+            logger.warning(f"Failed to write report cache file for {key}. Reason: {ex}")
+
+
+report_cache = ReportCache()
@@ -0,0 +1,108 @@
+import bisect
+import datetime as dt
+from typing import Dict, List, Optional, Set
+
+
+class PositionIntervalIndex:
+    """
+    Per-furu index of positions grouped by symbol and sorted by entry date, answering which
+    positions hold a symbol at a given date (stabbing queries) without scanning every position.
+
+    Positions are re-keyed lazily: added, re-dated or re-symboled positions are queued and
+    only the groups they land in are re-sorted on the next query.
+    """
+
+    def __init__(self, positions: list, source: Optional[list] = None):
+        self.source = source
+        self._groups: Dict[str, list] = {}
+        self._entry_dates: Dict[str, List[dt.date]] = {}
+        self._max_exit_dates: Dict[str, List[dt.date]] = {}
+        self._symbol_by_position: Dict[int, str] = {}
+        self._unkeyed: Dict[int, object] = {}
+        self._dirty: Set[str] = set()
+        for position in positions:
+            self.add(position)
+
+    def __str__(self):
+        return (
+            f"PositionIntervalIndex [symbols: {len(self._groups)}] "
+            f"[positions: {len(self._symbol_by_position) + len(self._unkeyed)}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    def add(self, position):
+        position._position_index = self
+        self._unkeyed[id(position)] = position
+
+    def remove(self, position):
+        self._unkey(position)
+        self._unkeyed.pop(id(position), None)
+        if position.__dict__.get("_position_index") is self:
+            del position._position_index
+
+    def touch(self, position):
+        """Queues a position whose symbol or dates are about to change for re-keying"""
+        self._unkey(position)
+        self._unkeyed[id(position)] = position
+
+    def _unkey(self, position):
+        symbol = self._symbol_by_position.pop(id(position), None)
+        if symbol is not None:
+            group = self._groups[symbol]
+            group.remove(position)
+            self._dirty.add(symbol)
+
+    def _key_pending_positions(self):
+        for position_id, position in list(self._unkeyed.items()):
+            symbol = position.ticker_symbol or (
+                position.ticker.symbol if position.ticker is not None else None
+            )
+            if symbol is None:
+                # still being constructed, keyed once its symbol is set
+                continue
+            del self._unkeyed[position_id]
+            self._symbol_by_position[position_id] = symbol
+            self._groups.setdefault(symbol, []).append(position)
+            self._dirty.add(symbol)
+
+    def _sort_group(self, symbol: str):
+        group = self._groups.get(symbol, [])
+        group.sort(key=lambda p: p.date_entered or dt.date.min)
+        self._entry_dates[symbol] = [p.date_entered or dt.date.min for p in group]
+        max_exit_dates = []
+        max_exit_date = dt.date.min
+        for position in group:
+            max_exit_date = max(max_exit_date, position.date_closed or dt.date.max)
+            max_exit_dates.append(max_exit_date)
+        self._max_exit_dates[symbol] = max_exit_dates
+        self._dirty.discard(symbol)
+
+    def get_positions(self, symbol: str) -> list:
+        """Positions in a symbol sorted by entry date"""
+        self._key_pending_positions()
+        if symbol in self._dirty:
+            self._sort_group(symbol)
+        return list(self._groups.get(symbol, []))
+
+    def get_positions_at(self, symbol: str, date: dt.date) -> list:
+        """Positions in a symbol entered on or before `date` and still open or closed on or after it"""
+        self._key_pending_positions()
+        if symbol in self._dirty:
+            self._sort_group(symbol)
+        group = self._groups.get(symbol)
+        if not group:
+            return []
+        entry_dates = self._entry_dates[symbol]
+        max_exit_dates = self._max_exit_dates[symbol]
+        positions_at_date = []
+        i = bisect.bisect_right(entry_dates, date) - 1
+        # running max of exit dates only decreases going back, so stop once it ends before date
+        while i >= 0 and max_exit_dates[i] >= date:
+            position = group[i]
+            if position.date_closed is None or date <= position.date_closed:
+                positions_at_date.append(position)
+            i -= 1
+        positions_at_date.reverse()
+        return positions_at_date
@@ -1,6 +1,8 @@
 import datetime as dt
 import enum
-from typing import List, Optional
+import itertools
+import json
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 from sqlalchemy import (
@@ -9,14 +11,20 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     PickleType,
     Text,
+    event,
+    inspect,
     text,
 )
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, column_property, relationship, declarative_base
+from sqlalchemy.orm.collections import attribute_mapped_collection
 from structlog import get_logger
 
+from rankr.db.indexes import PositionIntervalIndex
 from rankr.db.mixins import MixIn
 
 
@@ -49,6 +57,12 @@ class Furu(Base, MixIn):
     DAYS_TAKEN_TO_EXIT_POSITION = 3
     DAYS_SILENCE_FOR_POSITION_EXIT = 45
 
+    # leaderboard eligibility, which also makes a furu golden
+    LEADERBOARD_MIN_ACCURACY = 0.55
+    LEADERBOARD_MIN_PERFORMANCE_SCORE = 0.3
+    LEADERBOARD_MIN_TRADES = 30
+    LEADERBOARD_MIN_HOLDING_DAYS = 12
+
     id = Column(Integer, primary_key=True)
     handle = Column(Text, nullable=False)
     accuracy = Column(Float, server_default=text("null"))
@@ -66,6 +80,14 @@ class Furu(Base, MixIn):
     last_fetch_failure_dates: List["FuruFetchFailure"] = relationship(
         "FuruFetchFailure", backref="furu"
     )
+    stats: Optional["FuruStats"] = relationship(
+        "FuruStats", uselist=False, viewonly=True
+    )
+    position_cursors: Dict[str, "FuruPositionCursor"] = relationship(
+        "FuruPositionCursor",
+        collection_class=attribute_mapped_collection("symbol"),
+        cascade="all, delete-orphan",
+    )
 
     def __init__(
         self,
@@ -100,22 +122,35 @@ class Furu(Base, MixIn):
     def __repr__(self):
         return str(self)
 
+    @classmethod
+    def get_leaderboard_condition(cls, alias: str = "f") -> str:
+        """SQL condition of the furu table aliased `alias` passing the leaderboard thresholds"""
+        return (
+            f"{alias}.accuracy > {cls.LEADERBOARD_MIN_ACCURACY} "
+            f"AND {alias}.performance_score > {cls.LEADERBOARD_MIN_PERFORMANCE_SCORE} "
+            f"AND {alias}.total_trades_measured > {cls.LEADERBOARD_MIN_TRADES} "
+            f"AND {alias}.average_holding_period_days > {cls.LEADERBOARD_MIN_HOLDING_DAYS}"
+        )
+
+    @property
+    def position_index(self) -> PositionIntervalIndex:
+        """Interval index over the loaded positions, rebuilt whenever they are reloaded"""
+        positions = self.positions
+        index = self.__dict__.get("_position_index")
+        if index is None or index.source is not positions:
+            index = PositionIntervalIndex(positions, source=positions)
+            self._position_index = index
+        return index
+
     def get_furu_position_by_ticker_and_entry_date(
         self, ticker_obj, entry_date: dt.date
     ) -> Optional["FuruTicker"]:
         assert isinstance(
             ticker_obj, Ticker
         ), f"Only accepts Ticker objects as parameter"
-        positions_at_earlier_start = []
-        for pos in [
-            pos for pos in self.positions if pos.alpha_ticker == ticker_obj.symbol
-        ]:
-            if pos.date_closed is not None:
-                if pos.date_entered <= entry_date <= pos.date_closed:
-                    positions_at_earlier_start.append(pos)
-            else:
-                if pos.date_entered <= entry_date:
-                    positions_at_earlier_start.append(pos)
+        positions_at_earlier_start = self.position_index.get_positions_at(
+            ticker_obj.symbol, entry_date
+        )
 
         if positions_at_earlier_start:
             if len(positions_at_earlier_start) > 1:
@@ -138,16 +173,9 @@ class Furu(Base, MixIn):
     def get_furu_position_by_symbol_and_entry_date(
         self, ticker_acronym: str, entry_date: dt.date
     ) -> Optional["FuruTicker"]:
-        positions_at_earlier_start = []
-        for pos in [
-            pos for pos in self.positions if pos.alpha_ticker == ticker_acronym
-        ]:
-            if pos.date_closed is not None:
-                if pos.date_entered <= entry_date <= pos.date_closed:
-                    positions_at_earlier_start.append(pos)
-            else:
-                if pos.date_entered <= entry_date:
-                    positions_at_earlier_start.append(pos)
+        positions_at_earlier_start = self.position_index.get_positions_at(
+            ticker_acronym, entry_date
+        )
 
         if positions_at_earlier_start:
             if len(positions_at_earlier_start) > 1:
@@ -454,17 +482,41 @@ class FuruTicker(Base, MixIn):
     __tablename__ = "furu_ticker"
 
     id = Column(Integer, primary_key=True)
-    furu_id = Column(Integer, ForeignKey("furu.id"), nullable=False)
-    ticker_id = Column(Integer, ForeignKey("ticker.id"), nullable=True)
+    # columns feeding furu_stats keep their previous value loaded when set
+    furu_id = column_property(
+        Column(Integer, ForeignKey("furu.id"), nullable=False), active_history=True
+    )
+    ticker_id = Column(Integer, ForeignKey("ticker.id"), nullable=True, index=True)
     ticker_symbol = Column(Text, nullable=True)
-    date_entered = Column(Date, server_default=text("null"), nullable=False)
-    date_closed = Column(Date, server_default=text("null"))
+    date_entered = column_property(
+        Column(Date, server_default=text("null"), nullable=False, index=True),
+        active_history=True,
+    )
+    date_closed = column_property(
+        Column(Date, server_default=text("null")), active_history=True
+    )
     date_last_mentioned = Column(Date, server_default=text("null"))
-    price_entered = Column(Float, server_default=text("null"))
-    price_closed = Column(Float, server_default=text("null"))
+    price_entered = column_property(
+        Column(Float, server_default=text("null")), active_history=True
+    )
+    price_closed = column_property(
+        Column(Float, server_default=text("null")), active_history=True
+    )
+    # stored when the position is priced so best and worst trades are read off the indexes
+    realized_return = Column(Float, server_default=text("null"))
 
     ticker = relationship("Ticker", back_populates="positions")
 
+    __table_args__ = (
+        Index("ix_furu_ticker_realized_return", "realized_return"),
+        Index("ix_furu_ticker_furu_id_realized_return", "furu_id", "realized_return"),
+    )
+
+    REALIZED_RETURN_SQL = """
+        CASE WHEN date_closed IS NOT NULL AND price_entered > 0 AND price_closed > 0
+            THEN price_closed / price_entered - 1 END
+    """
+
     def __init__(
         self,
         furu: Furu = None,
@@ -550,23 +602,47 @@ class FuruTicker(Base, MixIn):
         ), "Position close date and closing price required to calculate scores."
         return (self.price_closed / self.price_entered) - 1
 
+    @staticmethod
+    def get_realized_return(
+        date_closed: Optional[dt.date],
+        price_entered: Optional[float],
+        price_closed: Optional[float],
+    ) -> Optional[float]:
+        """Return of a closed position, None while it is open or missing prices"""
+        if date_closed is None or price_entered is None or price_closed is None:
+            return None
+        if price_entered <= 0 or price_closed <= 0:
+            return None
+        return price_closed / price_entered - 1
+
+    @classmethod
+    def rebuild_realized_returns(cls, connection):
+        connection.execute(
+            text(f"UPDATE furu_ticker SET realized_return = {cls.REALIZED_RETURN_SQL}")
+        )
+
+    @staticmethod
+    def get_position_outcome(
+        date_entered: dt.date,
+        date_closed: Optional[dt.date],
+        price_entered: Optional[float],
+        price_closed: Optional[float],
+    ) -> Optional[Tuple[float, int]]:
+        """Return and holding days of a priced, closed position given as plain values"""
+        if date_closed is None or price_entered is None or price_closed is None:
+            return None
+        if price_entered == 0 or price_closed == 0:
+            return None
+        return (price_closed / price_entered) - 1, (date_closed - date_entered).days
+
     def close_position(self, history: ["TickerHistory"]):
         logger.info(f"Closing position {self}")
-        other_furu_positions_in_ticker = [
-            pos
-            for pos in self.furu.positions
-            if pos.ticker_id == self.ticker_id and pos.id != self.id
-        ]
         positions_closing_after_entry_date = [
             pos
-            for pos in other_furu_positions_in_ticker
-            if pos.date_closed is not None
-            and pos.date_entered <= history.date <= pos.date_closed
-        ]
-        positions_closing_after_entry_date += [
-            pos
-            for pos in other_furu_positions_in_ticker
-            if pos.date_closed is None and pos.date_entered <= history.date
+            for pos in self.furu.position_index.get_positions_at(
+                self.alpha_ticker, history.date
+            )
+            if pos.ticker_id == self.ticker_id and pos.id != self.id
         ]
 
         if positions_closing_after_entry_date:
@@ -595,21 +671,12 @@ class FuruTicker(Base, MixIn):
 
     def close_raw_position(self, closing_date: dt.date):
         logger.debug(f"Closing raw position {self}")
-        other_furu_positions_in_ticker = [
-            pos
-            for pos in self.furu.positions
-            if pos.alpha_ticker == self.alpha_ticker and pos.id != self.id
-        ]
         positions_closing_after_entry_date = [
             pos
-            for pos in other_furu_positions_in_ticker
-            if pos.date_closed is not None
-            and pos.date_entered <= closing_date <= pos.date_closed
-        ]
-        positions_closing_after_entry_date += [
-            pos
-            for pos in other_furu_positions_in_ticker
-            if pos.date_closed is None and pos.date_entered <= closing_date
+            for pos in self.furu.position_index.get_positions_at(
+                self.alpha_ticker, closing_date
+            )
+            if pos.id != self.id
         ]
 
         if positions_closing_after_entry_date:
@@ -759,6 +826,931 @@ class FuruFetchFailure(Base, MixIn):
             self.platform = platform
 
 
+class FuruStats(Base, MixIn):
+    """Sufficient statistics of a furu's priced closed positions, kept in sync on every flush"""
+
+    __tablename__ = "furu_stats"
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    trades_won = Column(Integer, nullable=False, server_default=text("0"))
+    trades_lost = Column(Integer, nullable=False, server_default=text("0"))
+    sum_profit_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_loss_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_holding_days = Column(Integer, nullable=False, server_default=text("0"))
+    is_stale = Column(Integer, nullable=False, server_default=text("1"))
+
+    STAT_COLUMNS = (
+        "trades_won",
+        "trades_lost",
+        "sum_profit_returns",
+        "sum_loss_returns",
+        "sum_holding_days",
+    )
+
+    def __str__(self):
+        return (
+            f"FuruStats {self.furu_id} "
+            f"[won: {self.trades_won}, lost: {self.trades_lost}, stale: {bool(self.is_stale)}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    @staticmethod
+    def get_position_contribution(
+        date_entered, date_closed, price_entered, price_closed
+    ) -> Optional[Tuple[int, int, float, float, int]]:
+        outcome = FuruTicker.get_position_outcome(
+            date_entered, date_closed, price_entered, price_closed
+        )
+        if outcome is None:
+            return None
+        position_return, position_days = outcome
+        if position_return > 0:
+            return 1, 0, position_return, 0.0, position_days
+        return 0, 1, 0.0, position_return, position_days
+
+    @classmethod
+    def apply_deltas(cls, connection, deltas: dict):
+        """Adds per-furu deltas of the stat columns and flags the furus for rescoring"""
+        rows = [
+            {"furu_id": furu_id, "is_stale": 1, **dict(zip(cls.STAT_COLUMNS, delta))}
+            for furu_id, delta in deltas.items()
+        ]
+        if not rows:
+            return
+        statement = sqlite_insert(cls.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["furu_id"],
+            set_={
+                **{
+                    column: cls.__table__.c[column] + statement.excluded[column]
+                    for column in cls.STAT_COLUMNS
+                },
+                "is_stale": 1,
+            },
+        )
+        connection.execute(statement, rows)
+
+    @classmethod
+    def rebuild(cls, connection, furu_ids: List[int] = None):
+        """Recomputes the statistics from the closed positions, e.g. after bulk writes"""
+        logger.info(
+            f"Rebuilding furu stats for {len(furu_ids) if furu_ids is not None else 'all'} furus"
+        )
+        furu_filter = ""
+        params = {}
+        if furu_ids is not None:
+            furu_filter = "AND furu_id IN (SELECT value FROM json_each(:furu_ids))"
+            params["furu_ids"] = json.dumps(list(furu_ids))
+            connection.execute(
+                text(
+                    "DELETE FROM furu_stats WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))"
+                ),
+                params,
+            )
+        else:
+            connection.execute(text("DELETE FROM furu_stats"))
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO furu_stats (
+                    furu_id, trades_won, trades_lost, sum_profit_returns,
+                    sum_loss_returns, sum_holding_days, is_stale
+                )
+                SELECT
+                    furu_id,
+                    SUM(position_return > 0),
+                    SUM(position_return <= 0),
+                    TOTAL(CASE WHEN position_return > 0 THEN position_return END),
+                    TOTAL(CASE WHEN position_return <= 0 THEN position_return END),
+                    SUM(holding_days),
+                    1
+                FROM (
+                    SELECT
+                        furu_id,
+                        price_closed / price_entered - 1 AS position_return,
+                        CAST(julianday(date_closed) - julianday(date_entered) AS INTEGER)
+                            AS holding_days
+                    FROM furu_ticker
+                    WHERE date_closed IS NOT NULL
+                        AND price_entered IS NOT NULL AND price_entered != 0
+                        AND price_closed IS NOT NULL AND price_closed != 0
+                        {furu_filter}
+                )
+                GROUP BY furu_id
+                """
+            ),
+            params,
+        )
+
+
+class FuruDailyStats(Base, MixIn):
+    """Sufficient statistics of a furu's priced positions closed on one day"""
+
+    __tablename__ = "furu_daily_stats"
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    date_closed = Column(Date, primary_key=True)
+    trades_won = Column(Integer, nullable=False, server_default=text("0"))
+    trades_lost = Column(Integer, nullable=False, server_default=text("0"))
+    sum_profit_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_loss_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_holding_days = Column(Integer, nullable=False, server_default=text("0"))
+
+    def __str__(self):
+        return (
+            f"FuruDailyStats {self.furu_id} [{self.date_closed}] "
+            f"[won: {self.trades_won}, lost: {self.trades_lost}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def apply_deltas(cls, connection, deltas: dict):
+        """Adds deltas of the stat columns keyed by (furu_id, date_closed)"""
+        rows = [
+            {
+                "furu_id": furu_id,
+                "date_closed": date_closed,
+                **dict(zip(FuruStats.STAT_COLUMNS, delta)),
+            }
+            for (furu_id, date_closed), delta in deltas.items()
+        ]
+        if not rows:
+            return
+        statement = sqlite_insert(cls.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["furu_id", "date_closed"],
+            set_={
+                column: cls.__table__.c[column] + statement.excluded[column]
+                for column in FuruStats.STAT_COLUMNS
+            },
+        )
+        connection.execute(statement, rows)
+
+    @classmethod
+    def rebuild(cls, connection, furu_ids: List[int] = None):
+        """Recomputes the daily buckets from the closed positions, e.g. after bulk writes"""
+        logger.info(
+            f"Rebuilding furu daily stats for {len(furu_ids) if furu_ids is not None else 'all'} furus"
+        )
+        furu_filter = ""
+        params = {}
+        if furu_ids is not None:
+            furu_filter = "AND furu_id IN (SELECT value FROM json_each(:furu_ids))"
+            params["furu_ids"] = json.dumps(list(furu_ids))
+            connection.execute(
+                text(
+                    "DELETE FROM furu_daily_stats "
+                    "WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))"
+                ),
+                params,
+            )
+        else:
+            connection.execute(text("DELETE FROM furu_daily_stats"))
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO furu_daily_stats (
+                    furu_id, date_closed, trades_won, trades_lost, sum_profit_returns,
+                    sum_loss_returns, sum_holding_days
+                )
+                SELECT
+                    furu_id,
+                    date_closed,
+                    SUM(position_return > 0),
+                    SUM(position_return <= 0),
+                    TOTAL(CASE WHEN position_return > 0 THEN position_return END),
+                    TOTAL(CASE WHEN position_return <= 0 THEN position_return END),
+                    SUM(holding_days)
+                FROM (
+                    SELECT
+                        furu_id,
+                        date_closed,
+                        price_closed / price_entered - 1 AS position_return,
+                        CAST(julianday(date_closed) - julianday(date_entered) AS INTEGER)
+                            AS holding_days
+                    FROM furu_ticker
+                    WHERE furu_id IS NOT NULL
+                        AND date_closed IS NOT NULL
+                        AND price_entered IS NOT NULL AND price_entered != 0
+                        AND price_closed IS NOT NULL AND price_closed != 0
+                        {furu_filter}
+                )
+                GROUP BY furu_id, date_closed
+                """
+            ),
+            params,
+        )
+        # windows are re-created from the buckets on their next advance
+        FuruWindowStats.clear(connection, furu_ids)
+
+
+class FuruWindowStats(Base, MixIn):
+    """
+    Sufficient statistics and scores of a furu's positions closed in the trailing
+    `window_days` up to `as_of_date`.
+
+    Closes inside the window are added on flush, advancing the window adds the daily
+    buckets entering it and subtracts the ones leaving it.
+    """
+
+    __tablename__ = "furu_window_stats"
+
+    WINDOWS_DAYS = (30, 90, 365)
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    window_days = Column(Integer, primary_key=True)
+    as_of_date = Column(Date, nullable=False)
+    trades_won = Column(Integer, nullable=False, server_default=text("0"))
+    trades_lost = Column(Integer, nullable=False, server_default=text("0"))
+    sum_profit_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_loss_returns = Column(Float, nullable=False, server_default=text("0"))
+    sum_holding_days = Column(Integer, nullable=False, server_default=text("0"))
+    accuracy = Column(Float, server_default=text("null"))
+    average_profit = Column(Float, server_default=text("null"))
+    performance_score = Column(Float, server_default=text("null"))
+    is_stale = Column(Integer, nullable=False, server_default=text("1"))
+
+    def __str__(self):
+        return (
+            f"FuruWindowStats {self.furu_id} [{self.window_days}d to {self.as_of_date}] "
+            f"[won: {self.trades_won}, lost: {self.trades_lost}, stale: {bool(self.is_stale)}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def apply_deltas(cls, connection, deltas: dict):
+        """Adds (furu_id, date_closed) deltas to the windows currently covering that date"""
+        rows = [
+            {
+                "furu_id": furu_id,
+                "date_closed": date_closed.isoformat(),
+                **dict(zip(FuruStats.STAT_COLUMNS, delta)),
+            }
+            for (furu_id, date_closed), delta in deltas.items()
+        ]
+        if not rows:
+            return
+        connection.execute(
+            text(
+                f"""
+                UPDATE furu_window_stats SET
+                    {", ".join(f"{c} = {c} + :{c}" for c in FuruStats.STAT_COLUMNS)},
+                    is_stale = 1
+                WHERE furu_id = :furu_id
+                    AND :date_closed <= as_of_date
+                    AND :date_closed > date(as_of_date, '-' || window_days || ' days')
+                """
+            ),
+            rows,
+        )
+
+    @classmethod
+    def advance(cls, connection, as_of: dt.date):
+        """Moves every window to end at `as_of` and creates the missing ones from the buckets"""
+        params = {"as_of": as_of.isoformat()}
+        entering = (
+            "d.furu_id = w.furu_id AND d.date_closed > w.as_of_date "
+            "AND d.date_closed <= :as_of"
+        )
+        leaving = (
+            "d.furu_id = w.furu_id "
+            "AND d.date_closed > date(w.as_of_date, '-' || w.window_days || ' days') "
+            "AND d.date_closed <= date(:as_of, '-' || w.window_days || ' days')"
+        )
+        connection.execute(
+            text(
+                f"""
+                UPDATE furu_window_stats AS w SET is_stale = 1
+                WHERE w.as_of_date < :as_of AND (
+                    EXISTS (SELECT 1 FROM furu_daily_stats d WHERE {entering})
+                    OR EXISTS (SELECT 1 FROM furu_daily_stats d WHERE {leaving})
+                )
+                """
+            ),
+            params,
+        )
+        connection.execute(
+            text(
+                f"""
+                UPDATE furu_window_stats AS w SET
+                    {", ".join(
+                        f"{c} = {c} "
+                        f"+ (SELECT TOTAL(d.{c}) FROM furu_daily_stats d WHERE {entering}) "
+                        f"- (SELECT TOTAL(d.{c}) FROM furu_daily_stats d WHERE {leaving})"
+                        for c in FuruStats.STAT_COLUMNS
+                    )},
+                    as_of_date = :as_of
+                WHERE w.as_of_date < :as_of
+                """
+            ),
+            params,
+        )
+        for window_days in cls.WINDOWS_DAYS:
+            connection.execute(
+                text(
+                    f"""
+                    INSERT INTO furu_window_stats (
+                        furu_id, window_days, as_of_date, trades_won, trades_lost,
+                        sum_profit_returns, sum_loss_returns, sum_holding_days, is_stale
+                    )
+                    SELECT
+                        d.furu_id, :window_days, :as_of,
+                        {", ".join(f"TOTAL(d.{c})" for c in FuruStats.STAT_COLUMNS)}, 1
+                    FROM furu_daily_stats d
+                    WHERE d.date_closed <= :as_of
+                        AND d.date_closed > date(:as_of, '-' || :window_days || ' days')
+                        AND NOT EXISTS (
+                            SELECT 1 FROM furu_window_stats w
+                            WHERE w.furu_id = d.furu_id AND w.window_days = :window_days
+                        )
+                    GROUP BY d.furu_id
+                    """
+                ),
+                {**params, "window_days": window_days},
+            )
+
+    @classmethod
+    def clear(cls, connection, furu_ids: List[int] = None):
+        if furu_ids is not None:
+            connection.execute(
+                text(
+                    "DELETE FROM furu_window_stats "
+                    "WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))"
+                ),
+                {"furu_ids": json.dumps(list(furu_ids))},
+            )
+        else:
+            connection.execute(text("DELETE FROM furu_window_stats"))
+
+
+class FuruPositionCursor(Base, MixIn):
+    """Where a furu's mention state machine left off in a symbol"""
+
+    __tablename__ = "furu_position_cursor"
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    symbol = Column(Text, primary_key=True)
+    open_position_id = Column(Integer, ForeignKey("furu_ticker.id"), nullable=True)
+    date_last_mentioned = Column(Date, server_default=text("null"))
+
+    open_position: Optional[FuruTicker] = relationship("FuruTicker")
+
+    def __init__(self, symbol: str, open_position: FuruTicker = None):
+        self.symbol = symbol
+        self.open_position = open_position
+
+    def __str__(self):
+        return (
+            f"FuruPositionCursor {self.furu_id} ${self.symbol} "
+            f"[open: {self.open_position_id}] [last mentioned: {self.date_last_mentioned}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    def get_open_position(self) -> Optional[FuruTicker]:
+        position = self.open_position
+        if position is None or not position.is_open or position.furu_id != self.furu_id:
+            return None
+        return position
+
+    def advance(self, open_position: Optional[FuruTicker], date_last_mentioned: dt.date):
+        self.open_position = open_position
+        if self.date_last_mentioned is None or date_last_mentioned > self.date_last_mentioned:
+            self.date_last_mentioned = date_last_mentioned
+
+    @classmethod
+    def rebuild(cls, connection, furu_ids: List[int] = None):
+        """Recomputes the cursors from the stored positions, e.g. after bulk writes"""
+        logger.info(
+            f"Rebuilding position cursors for {len(furu_ids) if furu_ids is not None else 'all'} furus"
+        )
+        furu_filter = ""
+        params = {}
+        if furu_ids is not None:
+            furu_filter = "WHERE ft.furu_id IN (SELECT value FROM json_each(:furu_ids))"
+            params["furu_ids"] = json.dumps(list(furu_ids))
+            connection.execute(
+                text(
+                    "DELETE FROM furu_position_cursor "
+                    "WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))"
+                ),
+                params,
+            )
+        else:
+            connection.execute(text("DELETE FROM furu_position_cursor"))
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO furu_position_cursor (
+                    furu_id, symbol, open_position_id, date_last_mentioned
+                )
+                SELECT
+                    ft.furu_id,
+                    COALESCE(ft.ticker_symbol, t.symbol) AS position_symbol,
+                    MAX(CASE WHEN ft.date_closed IS NULL THEN ft.id END),
+                    MAX(COALESCE(ft.date_last_mentioned, ft.date_entered))
+                FROM furu_ticker ft
+                LEFT JOIN ticker t ON t.id = ft.ticker_id
+                {furu_filter}
+                GROUP BY ft.furu_id, position_symbol
+                HAVING position_symbol IS NOT NULL
+                """
+            ),
+            params,
+        )
+
+
+class FuruPositionMark(Base, MixIn):
+    """Latest mark-to-market of an open position, replaced on every marking run"""
+
+    __tablename__ = "furu_position_mark"
+
+    position_id = Column(Integer, ForeignKey("furu_ticker.id"), primary_key=True)
+    furu_id = Column(Integer, ForeignKey("furu.id"), index=True)
+    symbol = Column(Text, nullable=False)
+    date_marked = Column(Date, nullable=False)
+    price_marked = Column(Float, nullable=False)
+    unrealized_return = Column(Float, nullable=False)
+
+    def __str__(self):
+        return (
+            f"FuruPositionMark {self.position_id} ${self.symbol} "
+            f"[marked: {self.date_marked} at ${self.price_marked}] "
+            f"[unrealized: {self.unrealized_return}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class FuruRisk(Base, MixIn):
+    """Risk metrics of a furu's daily equal-weight equity curve, replaced on every run"""
+
+    __tablename__ = "furu_risk"
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    date_computed = Column(Date, nullable=False)
+    trading_days = Column(Integer, nullable=False)
+    total_return = Column(Float, server_default=text("null"))
+    annualized_volatility = Column(Float, server_default=text("null"))
+    sharpe_ratio = Column(Float, server_default=text("null"))
+    sortino_ratio = Column(Float, server_default=text("null"))
+    max_drawdown = Column(Float, server_default=text("null"))
+    max_days_under_water = Column(Integer, server_default=text("null"))
+    share_days_under_water = Column(Float, server_default=text("null"))
+
+    def __str__(self):
+        return (
+            f"FuruRisk {self.furu_id} [sharpe: {self.sharpe_ratio}] "
+            f"[max drawdown: {self.max_drawdown}] [days under water: {self.max_days_under_water}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class TickerConsensus(Base, MixIn):
+    """
+    Per-symbol aggregates of the open positions behind the golden portfolio.
+
+    Golden positions are the open positions of furus passing the leaderboard thresholds
+    (kept in line with `rankr.actions.leaderboards`). Rows are refreshed for the symbols
+    touched by every flush, and must be refreshed by callers after bulk writes.
+    """
+
+    __tablename__ = "ticker_consensus"
+
+    symbol = Column(Text, primary_key=True)
+    open_furu_count = Column(Integer, nullable=False, server_default=text("0"))
+    golden_furu_count = Column(
+        Integer, nullable=False, server_default=text("0"), index=True
+    )
+    golden_mentioned_count = Column(Integer, nullable=False, server_default=text("0"))
+    handles = Column(Text, server_default=text("null"))
+    earliest_entry = Column(Date, server_default=text("null"))
+    latest_entry = Column(Date, server_default=text("null"))
+    least_price_paid = Column(Float, server_default=text("null"))
+    max_price_paid = Column(Float, server_default=text("null"))
+    accuracy = Column(Float, server_default=text("null"))
+    average_profit = Column(Float, server_default=text("null"))
+    holding_period = Column(Float, server_default=text("null"))
+    last_price = Column(Float, server_default=text("null"))
+    unrealized_return = Column(Float, server_default=text("null"))
+
+    GOLDEN_FURU_CONDITION = Furu.get_leaderboard_condition("f")
+    GOLDEN_FURU_COLUMNS = (
+        "accuracy",
+        "performance_score",
+        "total_trades_measured",
+        "average_holding_period_days",
+        "average_profit",
+    )
+
+    def __str__(self):
+        return (
+            f"TickerConsensus ${self.symbol} [open: {self.open_furu_count}] "
+            f"[golden: {self.golden_furu_count}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def get_open_ticker_ids(cls, connection, furu_ids: List[int]) -> List[int]:
+        """Tickers of the furus' open positions, whose aggregates depend on the furus"""
+        return [
+            ticker_id
+            for ticker_id, in connection.execute(
+                text(
+                    """
+                    SELECT DISTINCT ticker_id FROM furu_ticker
+                    WHERE furu_id IN (SELECT value FROM json_each(:furu_ids))
+                        AND date_closed IS NULL AND ticker_id IS NOT NULL
+                    """
+                ),
+                {"furu_ids": json.dumps(list(furu_ids))},
+            )
+        ]
+
+    @classmethod
+    def get_max_golden_furu_count(cls, connection) -> int:
+        """Most golden furus holding any one symbol, read from the index"""
+        return (
+            connection.execute(
+                text("SELECT MAX(golden_furu_count) FROM ticker_consensus")
+            ).scalar()
+            or 0
+        )
+
+    @classmethod
+    def rebuild(cls, connection, ticker_ids: List[int] = None):
+        """Recomputes the aggregates of the given tickers' symbols, or of all symbols"""
+        symbol_filter = ""
+        params = {}
+        if ticker_ids is not None:
+            if not ticker_ids:
+                return
+            symbol_filter = (
+                "AND t.symbol IN (SELECT symbol FROM ticker "
+                "WHERE id IN (SELECT value FROM json_each(:ticker_ids)))"
+            )
+            params["ticker_ids"] = json.dumps(list(ticker_ids))
+            connection.execute(
+                text(
+                    "DELETE FROM ticker_consensus WHERE symbol IN (SELECT symbol FROM ticker "
+                    "WHERE id IN (SELECT value FROM json_each(:ticker_ids)))"
+                ),
+                params,
+            )
+        else:
+            logger.info("Rebuilding ticker consensus for all symbols")
+            connection.execute(text("DELETE FROM ticker_consensus"))
+        connection.execute(
+            text(
+                f"""
+                INSERT INTO ticker_consensus (
+                    symbol, open_furu_count, golden_furu_count, golden_mentioned_count,
+                    handles, earliest_entry, latest_entry, least_price_paid, max_price_paid,
+                    accuracy, average_profit, holding_period, last_price, unrealized_return
+                )
+                SELECT
+                    symbol,
+                    COUNT(furu_id),
+                    SUM(is_golden),
+                    COUNT(CASE WHEN is_golden THEN date_last_mentioned END),
+                    GROUP_CONCAT(CASE WHEN is_golden THEN handle END, ' '),
+                    MIN(CASE WHEN is_golden THEN date_entered END),
+                    MAX(CASE WHEN is_golden THEN date_entered END),
+                    MIN(CASE WHEN is_golden THEN price_entered END),
+                    MAX(CASE WHEN is_golden THEN price_entered END),
+                    AVG(CASE WHEN is_golden THEN accuracy END),
+                    AVG(CASE WHEN is_golden THEN average_profit END),
+                    AVG(CASE WHEN is_golden THEN average_holding_period_days END),
+                    MAX(CASE WHEN is_golden THEN price_marked END),
+                    AVG(CASE WHEN is_golden THEN unrealized_return END)
+                FROM (
+                    SELECT
+                        t.symbol,
+                        ft.furu_id,
+                        ft.date_entered,
+                        ft.date_last_mentioned,
+                        ft.price_entered,
+                        f.handle,
+                        f.accuracy,
+                        f.average_profit,
+                        f.average_holding_period_days,
+                        m.price_marked,
+                        m.unrealized_return,
+                        COALESCE({cls.GOLDEN_FURU_CONDITION}, 0) AS is_golden
+                    FROM furu_ticker ft
+                    JOIN ticker t ON t.id = ft.ticker_id
+                    LEFT JOIN furu f ON f.id = ft.furu_id
+                    LEFT JOIN furu_position_mark m ON m.position_id = ft.id
+                    WHERE ft.date_closed IS NULL {symbol_filter}
+                )
+                GROUP BY symbol
+                """
+            ),
+            params,
+        )
+
+
+class ConsensusEntry(Base, MixIn):
+    """Several golden furus entering the same symbol within a few days of each other"""
+
+    __tablename__ = "consensus_entry"
+
+    id = Column(Integer, primary_key=True)
+    symbol = Column(Text, nullable=False, index=True)
+    date_window_start = Column(Date, nullable=False)
+    date_window_end = Column(Date, nullable=False)
+    furu_count = Column(Integer, nullable=False)
+    furu_ids = Column(Text, nullable=False)
+    date_detected = Column(Date, nullable=False)
+
+    def __str__(self):
+        return (
+            f"ConsensusEntry ${self.symbol} [furus: {self.furu_count}] "
+            f"[from: {self.date_window_start}] [to: {self.date_window_end}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class ConsensusDetectorState(Base, MixIn):
+    """Single-row watermark of the last position the consensus detector consumed"""
+
+    __tablename__ = "consensus_detector_state"
+
+    id = Column(Integer, primary_key=True)
+    last_position_id = Column(Integer, nullable=False, server_default=text("0"))
+
+    def __str__(self):
+        return f"ConsensusDetectorState [last position: {self.last_position_id}]"
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def rewind(cls, connection):
+        """
+        Moves the watermark back to the highest stored position id after positions were
+        deleted, as SQLite hands the ids above it out again to the next inserted positions
+        """
+        connection.execute(
+            text(
+                """
+                UPDATE consensus_detector_state
+                SET last_position_id = (SELECT COALESCE(MAX(id), 0) FROM furu_ticker)
+                WHERE last_position_id > (SELECT COALESCE(MAX(id), 0) FROM furu_ticker)
+                """
+            )
+        )
+
+    @classmethod
+    def advance(cls, connection):
+        """
+        Moves the watermark to the highest stored position id, so the detector skips the
+        positions of a rebuild instead of replaying their historical consensus entries
+        """
+        connection.execute(
+            text(
+                """
+                INSERT INTO consensus_detector_state (id, last_position_id)
+                VALUES (1, (SELECT COALESCE(MAX(id), 0) FROM furu_ticker))
+                ON CONFLICT (id) DO UPDATE SET last_position_id = excluded.last_position_id
+                """
+            )
+        )
+
+
+class FuruClone(Base, MixIn):
+    """Membership of a furu in a cluster of near-duplicate furus, replaced on every run"""
+
+    __tablename__ = "furu_clone"
+
+    furu_id = Column(Integer, ForeignKey("furu.id"), primary_key=True)
+    cluster_id = Column(Integer, nullable=False, index=True)
+    max_similarity = Column(Float, nullable=False)
+
+    def __str__(self):
+        return (
+            f"FuruClone {self.furu_id} [cluster: {self.cluster_id}] "
+            f"[max similarity: {self.max_similarity}]"
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class DataVersion(Base, MixIn):
+    """Single-row counter bumped by every transaction changing the data analytics reports read"""
+
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, server_default=text("0"))
+
+    VERSIONED_MODELS = (Furu, FuruTicker, Ticker)
+
+    def __str__(self):
+        return f"DataVersion [version: {self.version}]"
+
+    def __repr__(self):
+        return str(self)
+
+    @classmethod
+    def bump(cls, connection):
+        """Increments the version within the caller's transaction, e.g. after bulk writes"""
+        statement = sqlite_insert(cls.__table__).values(id=1, version=1)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[cls.id], set_={"version": cls.__table__.c.version + 1}
+            )
+        )
+
+    @classmethod
+    def get_version(cls, connection) -> int:
+        version = connection.execute(
+            text("SELECT version FROM data_version WHERE id = 1")
+        ).scalar()
+        return version or 0
+
+
+def _get_committed_value(state, key: str):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _get_position_contribution(state, committed: bool):
+    values = [
+        _get_committed_value(state, key) if committed else state.attrs[key].value
+        for key in ("furu_id", "date_entered", "date_closed", "price_entered", "price_closed")
+    ]
+    furu_id, *position_values = values
+    if furu_id is None:
+        return None, None, None
+    return furu_id, position_values[1], FuruStats.get_position_contribution(*position_values)
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_furu_stats(session: Session, flush_context):
+    """
+    Applies the net effect of flushed position inserts, updates and deletes to furu_stats
+    and to the daily and windowed statistics keyed by close date
+    """
+    deltas = {}
+    daily_deltas = {}
+
+    def add_contribution(furu_id, date_closed, contribution, sign):
+        if furu_id is None or contribution is None:
+            return
+        delta = deltas.setdefault(furu_id, [0, 0, 0.0, 0.0, 0])
+        daily_delta = daily_deltas.setdefault((furu_id, date_closed), [0, 0, 0.0, 0.0, 0])
+        for i, value in enumerate(contribution):
+            delta[i] += sign * value
+            daily_delta[i] += sign * value
+
+    for obj in session.new:
+        if isinstance(obj, FuruTicker):
+            add_contribution(*_get_position_contribution(inspect(obj), False), 1)
+    for obj in session.dirty:
+        if isinstance(obj, FuruTicker) and session.is_modified(obj):
+            state = inspect(obj)
+            add_contribution(*_get_position_contribution(state, True), -1)
+            add_contribution(*_get_position_contribution(state, False), 1)
+    for obj in session.deleted:
+        if isinstance(obj, FuruTicker):
+            add_contribution(*_get_position_contribution(inspect(obj), True), -1)
+
+    deltas = {k: v for k, v in deltas.items() if any(v)}
+    if deltas:
+        FuruStats.apply_deltas(session.connection(), deltas)
+    daily_deltas = {k: v for k, v in daily_deltas.items() if any(v)}
+    if daily_deltas:
+        FuruDailyStats.apply_deltas(session.connection(), daily_deltas)
+        FuruWindowStats.apply_deltas(session.connection(), daily_deltas)
+
+
+@event.listens_for(Session, "after_flush")
+def bump_data_version(session: Session, flush_context):
+    """Bumps the data version once per flush writing furus, positions or tickers"""
+    changed = itertools.chain(
+        session.new,
+        session.deleted,
+        (obj for obj in session.dirty if session.is_modified(obj)),
+    )
+    if any(isinstance(obj, DataVersion.VERSIONED_MODELS) for obj in changed):
+        DataVersion.bump(session.connection())
+
+
+@event.listens_for(Session, "after_flush")
+def rewind_consensus_detector(session: Session, flush_context):
+    """Keeps the consensus watermark below the position ids freed by flushed deletes"""
+    if any(isinstance(obj, FuruTicker) for obj in session.deleted):
+        ConsensusDetectorState.rewind(session.connection())
+
+
+@event.listens_for(Session, "after_flush")
+def collect_consensus_changes(session: Session, flush_context):
+    """Collects the symbols whose open positions changed and the furus whose golden columns did"""
+    ticker_ids = session.info.setdefault("consensus_ticker_ids", set())
+    furu_ids = session.info.setdefault("consensus_furu_ids", set())
+    for obj in session.new:
+        if isinstance(obj, FuruTicker):
+            ticker_ids.add(obj.ticker_id)
+    for obj in session.deleted:
+        if isinstance(obj, FuruTicker):
+            ticker_ids.add(_get_committed_value(inspect(obj), "ticker_id"))
+    for obj in session.dirty:
+        if isinstance(obj, FuruTicker) and session.is_modified(obj):
+            ticker_ids.add(obj.ticker_id)
+            ticker_ids.add(_get_committed_value(inspect(obj), "ticker_id"))
+        elif isinstance(obj, Furu):
+            state = inspect(obj)
+            if any(
+                state.attrs[key].history.has_changes()
+                for key in TickerConsensus.GOLDEN_FURU_COLUMNS
+            ):
+                furu_ids.add(obj.id)
+
+
+@event.listens_for(Session, "before_commit")
+def maintain_ticker_consensus(session: Session):
+    """
+    Refreshes the consensus of the symbols collected over the transaction's flushes once, when
+    the outermost transaction commits, instead of on every flush and savepoint
+    """
+    if session.in_nested_transaction():
+        return
+    # the commit's own flush runs after this hook
+    session.flush()
+    ticker_ids = session.info.pop("consensus_ticker_ids", set())
+    furu_ids = session.info.pop("consensus_furu_ids", set())
+    if furu_ids:
+        ticker_ids.update(TickerConsensus.get_open_ticker_ids(session.connection(), furu_ids))
+    ticker_ids.discard(None)
+    if ticker_ids:
+        TickerConsensus.rebuild(session.connection(), sorted(ticker_ids))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def discard_consensus_changes(session: Session, transaction):
+    """Forgets the collected symbols once the outermost transaction ends, also on rollback"""
+    if transaction.parent is None:
+        session.info.pop("consensus_ticker_ids", None)
+        session.info.pop("consensus_furu_ids", None)
+
+
+@event.listens_for(FuruTicker, "before_insert")
+@event.listens_for(FuruTicker, "before_update")
+def store_realized_return(mapper, connection, target: FuruTicker):
+    target.realized_return = FuruTicker.get_realized_return(
+        target.date_closed, target.price_entered, target.price_closed
+    )
+
+
+@event.listens_for(Furu.positions, "append")
+def index_appended_position(target: Furu, value: FuruTicker, initiator):
+    index = target.__dict__.get("_position_index")
+    if index is not None:
+        index.add(value)
+
+
+@event.listens_for(Furu.positions, "remove")
+def unindex_removed_position(target: Furu, value: FuruTicker, initiator):
+    index = target.__dict__.get("_position_index")
+    if index is not None:
+        index.remove(value)
+
+
+def reindex_changed_position(target: FuruTicker, value, oldvalue, initiator):
+    index = target.__dict__.get("_position_index")
+    if index is not None:
+        index.touch(target)
+
+
+for indexed_attribute in [
+    FuruTicker.ticker_symbol,
+    FuruTicker.ticker,
+    FuruTicker.date_entered,
+    FuruTicker.date_closed,
+]:
+    event.listen(indexed_attribute, "set", reindex_changed_position)
+
+
 class TickerHistoryDataError(Exception):
     pass
 
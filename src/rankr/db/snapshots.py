@@ -0,0 +1,163 @@
+import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+import structlog
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from rankr.db import DB_PATH, create_db_session_from_cfg
+
+
+SNAPSHOT_PATH = DB_PATH.parent.joinpath("snapshots", "fururankr_snapshot.db")
+
+
+logger = structlog.get_logger()
+
+
+def get_session_db_path(session: Session) -> Optional[pathlib.Path]:
+    database = session.get_bind().url.database
+    if not database or database == ":memory:":
+        return None
+    return pathlib.Path(database)
+
+
+def publish_snapshot(
+    session: Session, stage: str, snapshot_path: pathlib.Path = SNAPSHOT_PATH
+) -> Optional[pathlib.Path]:
+    """
+    Publishes a consistent read-only copy of the committed database for the analytics readers.
+
+    The copy is taken with SQLite's online backup API into a temporary file which then
+    atomically replaces the latest snapshot, so readers never see a half-written file.
+    Each publisher copies into its own temporary file, so concurrent runs cannot mix.
+    """
+    db_path = get_session_db_path(session)
+    if db_path is None or not db_path.exists():
+        logger.warning(f"Skipping snapshot after {stage} as session has no database file")
+        return None
+
+    start = time.monotonic()
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_name = tempfile.mkstemp(
+        prefix=snapshot_path.name + ".", suffix=".tmp", dir=snapshot_path.parent
+    )
+    os.close(file_descriptor)
+    temporary_path = pathlib.Path(temporary_name)
+    try:
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(temporary_path)
+        try:
+            source.backup(target)
+            # the copy inherits the write-ahead log mode, whose -wal and -shm side files
+            # would outlive the snapshot they belong to once it is replaced
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+        os.replace(temporary_path, snapshot_path)
+    except BaseException:
+        temporary_path.unlink(missing_ok=True)
+        raise
+    logger.info(
+        f"Published snapshot after {stage} in {time.monotonic() - start:.2f}s to {snapshot_path}"
+    )
+
+    return snapshot_path
+
+
+def create_snapshot_session_from_cfg(
+    echo: bool = False, snapshot_path: pathlib.Path = SNAPSHOT_PATH
+) -> Session:
+    """Read-only session on the latest snapshot, or on the live database if none was published"""
+    if not snapshot_path.exists():
+        logger.warning(f"No snapshot found at {snapshot_path}. Reading the live database.")
+        return create_db_session_from_cfg(echo=echo)
+    engine = create_engine(
+        url=f"sqlite:///file:{snapshot_path}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        echo=echo,
+    )
+    session_maker = sessionmaker(bind=engine)
+    return session_maker()
+
+
+class SnapshotSessionPool:
+    """
+    Read-only sessions from a connection pool on the latest snapshot (or the live database
+    when none was published), for long-running readers serving many requests.
+
+    Publishing replaces the snapshot file while pooled connections keep the replaced one
+    open, so the pool is recycled whenever the file changes.
+
+    --
+
+    pool = SnapshotSessionPool()
+
+    with pool.session() as session:
+        ...
+
+    --
+    """
+
+    def __init__(
+        self,
+        snapshot_path: pathlib.Path = SNAPSHOT_PATH,
+        database_path: pathlib.Path = DB_PATH,
+        pool_size: int = 5,
+        echo: bool = False,
+    ):
+        self.snapshot_path = snapshot_path
+        self.database_path = database_path
+        self.pool_size = pool_size
+        self.echo = echo
+        self._engine: Optional[Engine] = None
+        self._file_stamp: Optional[Tuple[pathlib.Path, int, int]] = None
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        return f"SnapshotSessionPool [file: {self._file_stamp}] [pool size: {self.pool_size}]"
+
+    def __repr__(self):
+        return str(self)
+
+    def get_engine(self) -> Engine:
+        path = self.snapshot_path if self.snapshot_path.exists() else self.database_path
+        file_stat = path.stat()
+        file_stamp = (path, file_stat.st_ino, file_stat.st_mtime_ns)
+        with self._lock:
+            if file_stamp != self._file_stamp:
+                if self._engine is not None:
+                    # checked out connections finish on the old file and are then discarded
+                    self._engine.dispose()
+                logger.info(f"Opening read-only connection pool on {path}")
+                self._engine = create_engine(
+                    url=f"sqlite:///file:{path}?mode=ro&uri=true",
+                    connect_args={"check_same_thread": False},
+                    poolclass=QueuePool,
+                    pool_size=self.pool_size,
+                    echo=self.echo,
+                )
+                self._file_stamp = file_stamp
+            return self._engine
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        session = Session(bind=self.get_engine())
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine, self._file_stamp = None, None
@@ -0,0 +1,255 @@
+import datetime as dt
+import hashlib
+import json
+import re
+import sys
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+from structlog import get_logger
+
+from rankr.db.caches import ReportCache, get_data_version, report_cache
+from rankr.db.models import Furu
+from rankr.db.snapshots import SnapshotSessionPool
+
+
+logger = get_logger()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8050
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class NotFoundError(Exception):
+    pass
+
+
+def get_leaderboard_report(
+    cache: ReportCache, session: Session, path_args: tuple, params: Dict[str, str]
+) -> pd.DataFrame:
+    from rankr.scripts.analytics.print_leaderboard import (
+        LEADERBOARD_SORT_COLUMNS,
+        get_leaderboard,
+    )
+
+    sort_by = params.get("sort_by", "performance_score")
+    if sort_by not in LEADERBOARD_SORT_COLUMNS:
+        raise ValueError(f"sort_by must be one of {', '.join(LEADERBOARD_SORT_COLUMNS)}")
+    return cache.get_report(session, "leaderboard", get_leaderboard, sort_by)
+
+
+def get_golden_portfolio_report(
+    cache: ReportCache, session: Session, path_args: tuple, params: Dict[str, str]
+) -> pd.DataFrame:
+    from rankr.scripts.analytics.print_golden_portfolio import get_golden_portfolio
+
+    deduplicate_clones = params.get("deduplicate_clones", "false").lower() == "true"
+    return cache.get_report(
+        session,
+        "golden_portfolio",
+        get_golden_portfolio,
+        deduplicate_clones=deduplicate_clones,
+        today=dt.date.today(),
+    )
+
+
+def get_best_trades_report(
+    cache: ReportCache, session: Session, path_args: tuple, params: Dict[str, str]
+) -> pd.DataFrame:
+    from rankr.scripts.analytics.print_best_trades import get_best_trades_df
+
+    filters = {"worst": params.get("worst", "false").lower() == "true"}
+    if "furu" in params:
+        furu = session.query(Furu).filter(Furu.handle == params["furu"]).one_or_none()
+        if furu is None:
+            raise NotFoundError(f"No furu with handle {params['furu']}")
+        filters["furu_id"] = furu.id
+    for key in ["closed_from", "closed_to"]:
+        if key in params:
+            filters[key] = dt.date.fromisoformat(params[key])
+    return cache.get_report(session, "best_trades_frame", get_best_trades_df, **filters)
+
+
+def get_furu_portfolio(session: Session, handle: str, today: dt.date) -> pd.DataFrame:
+    from rankr.scripts.analytics.print_furu_portfolio import get_open_trades_by_furus
+
+    furu = session.query(Furu).filter(Furu.handle == handle).one_or_none()
+    if furu is None:
+        raise NotFoundError(f"No furu with handle {handle}")
+    return get_open_trades_by_furus(session, [furu.id], today)
+
+
+def get_furu_portfolio_report(
+    cache: ReportCache, session: Session, path_args: tuple, params: Dict[str, str]
+) -> pd.DataFrame:
+    return cache.get_report(
+        session, "furu_portfolio", get_furu_portfolio, path_args[0], dt.date.today()
+    )
+
+
+def get_ticker_scores_report(
+    cache: ReportCache, session: Session, path_args: tuple, params: Dict[str, str]
+) -> pd.DataFrame:
+    from rankr.scripts.analytics.print_ticker_scores import get_ticker_scores_table
+
+    symbols = sorted(
+        {s.strip().upper() for s in params.get("symbols", "").split(",") if s.strip()}
+    )
+    if not symbols:
+        raise ValueError("symbols must list at least one ticker, e.g. symbols=AAPL,NFLX")
+    return cache.get_report(
+        session, "ticker_scores", get_ticker_scores_table, symbols, dt.date.today()
+    )
+
+
+Report = Callable[[ReportCache, Session, tuple, Dict[str, str]], pd.DataFrame]
+
+# (path pattern, report, whether the report depends on today's date)
+ROUTES: List[Tuple["re.Pattern", Report, bool]] = [
+    (re.compile(r"/leaderboard"), get_leaderboard_report, False),
+    (re.compile(r"/golden-portfolio"), get_golden_portfolio_report, True),
+    (re.compile(r"/best-trades"), get_best_trades_report, False),
+    (re.compile(r"/furus/([^/]+)/portfolio"), get_furu_portfolio_report, True),
+    (re.compile(r"/ticker-scores"), get_ticker_scores_report, True),
+]
+
+
+def get_page(
+    frame: pd.DataFrame, params: Dict[str, str]
+) -> Tuple[pd.DataFrame, int, int]:
+    page = int(params.get("page", 1))
+    page_size = int(params.get("page_size", DEFAULT_PAGE_SIZE))
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page must be positive and page_size between 1 and {MAX_PAGE_SIZE}")
+    start = (page - 1) * page_size
+    return frame.iloc[start : start + page_size], page, page_size
+
+
+def get_etag(
+    data_version: Optional[int],
+    path: str,
+    params: Dict[str, str],
+    today: Optional[dt.date] = None,
+) -> Optional[str]:
+    """
+    Entity tag of a response, valid until the data version changes, and for reports
+    depending on the date, passed as `today`, until the day changes
+    """
+    if data_version is None:
+        return None
+    request = repr((path, sorted(params.items()), today))
+    return f'"{data_version}-{hashlib.sha1(request.encode()).hexdigest()[:16]}"'
+
+
+class ReadAPIServer(ThreadingHTTPServer):
+    """
+    JSON read API over the analytics reports, for dashboards to poll.
+
+    Every request reads through a pooled read-only session on the latest snapshot, reports
+    are served from the report cache and responses carry an ETag tied to the data version,
+    so polling an unchanged database costs a single version lookup.
+
+    --
+
+    GET /leaderboard?sort_by=sharpe_ratio&page=2&page_size=20
+    GET /golden-portfolio?deduplicate_clones=true
+    GET /best-trades?worst=true&furu=<handle>&closed_from=2021-01-01&closed_to=2021-06-30
+    GET /furus/<handle>/portfolio
+    GET /ticker-scores?symbols=AAPL,NFLX
+
+    --
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+        session_pool: SnapshotSessionPool = None,
+        cache: ReportCache = report_cache,
+    ):
+        super().__init__(address, ReadAPIRequestHandler)
+        self.session_pool = session_pool or SnapshotSessionPool()
+        self.cache = cache
+
+    def server_close(self):
+        super().server_close()
+        self.session_pool.dispose()
+
+
+class ReadAPIRequestHandler(BaseHTTPRequestHandler):
+    server: ReadAPIServer
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path.rstrip("/")
+        params = dict(urllib.parse.parse_qsl(url.query))
+        for pattern, report, dated in ROUTES:
+            match = pattern.fullmatch(path)
+            if match is not None:
+                break
+        else:
+            return self.send_json(HTTPStatus.NOT_FOUND, {"error": f"No endpoint {path}"})
+
+        path_args = tuple(urllib.parse.unquote(arg) for arg in match.groups())
+        try:
+            with self.server.session_pool.session() as session:
+                data_version = get_data_version(session)
+                etag = get_etag(data_version, path, params, dt.date.today() if dated else None)
+                if etag is not None and etag in self.get_if_none_match():
+                    return self.send_json(HTTPStatus.NOT_MODIFIED, None, etag)
+                frame = report(self.server.cache, session, path_args, params)
+            page_frame, page, page_size = get_page(frame, params)
+        except NotFoundError as ex:
+            return self.send_json(HTTPStatus.NOT_FOUND, {"error": str(ex)})
+        except ValueError as ex:
+            return self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(ex)})
+        except Exception as ex:
+            logger.exception(f"Failed to serve {self.path}")
+            return self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(ex)})
+
+        body = {
+            "data_version": data_version,
+            "page": page,
+            "page_size": page_size,
+            "total": len(frame),
+            "items": json.loads(page_frame.to_json(orient="records", date_format="iso")),
+        }
+        self.send_json(HTTPStatus.OK, body, etag)
+
+    def get_if_none_match(self) -> List[str]:
+        header = self.headers.get("If-None-Match", "")
+        return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+    def send_json(self, status: HTTPStatus, body: Optional[dict], etag: str = None):
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    server = ReadAPIServer((DEFAULT_HOST, port))
+    logger.info(f"Serving the read API on http://{DEFAULT_HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,5 +1,6 @@
 from rankr.actions import instantiate_api_session_from_cfg
 from rankr.db import create_db_session_from_cfg
+from rankr.db.snapshots import SnapshotSessionPool
 from rankr.interfaces.cli.connections import SessionConnections
 from rankr.interfaces.cli.helper_classes import FunctionFactory
 
@@ -19,6 +20,7 @@ class CLIClient:
         "    32. Print Leaderboard\n"
         "    33. Print Best Trades\n"
         "    34. Print Scores for tickers\n"
+        "    35. Print Consensus Entries\n"
         "  Exit\n"
         "    0. Exit\n"
         "\n"
@@ -29,6 +31,7 @@ class CLIClient:
         self.conns = SessionConnections(
             session=create_db_session_from_cfg(),
             tweepy=instantiate_api_session_from_cfg(),
+            snapshot_pool=SnapshotSessionPool(),
         )
 
     def get_user_input(self) -> int:
@@ -50,6 +53,7 @@ class CLIClient:
             func(self.conns)
         print("\n")
         self.conns.session.close()
+        self.conns.snapshot_pool.dispose()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,27 @@
 import dataclasses
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
 from sqlalchemy.orm import Session
 from tweepy import API
 
+from rankr.db.snapshots import SnapshotSessionPool
+
 
 @dataclasses.dataclass
 class SessionConnections:
     session: Session
     tweepy: API
+    snapshot_pool: Optional[SnapshotSessionPool] = None
+
+    @contextmanager
+    def report_session(self) -> Iterator[Session]:
+        """
+        Session analytics read from: a fresh one on the latest snapshot when a pool is set,
+        so reports see snapshots published after the connections were opened
+        """
+        if self.snapshot_pool is None:
+            yield self.session
+            return
+        with self.snapshot_pool.session() as session:
+            yield session
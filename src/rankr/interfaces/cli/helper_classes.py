@@ -1,6 +1,8 @@
+import datetime as dt
 from typing import Callable, Optional
 
-from rankr.actions import calculates, finds, creates
+from rankr.actions import calculates, clones, finds, creates, marks, risks
+from rankr.db.caches import report_cache
 from rankr.interfaces.cli.connections import SessionConnections
 
 
@@ -48,7 +50,10 @@ class CLIActions:
         )
         if v.upper() == "Y":
             creates.fill_prices_for_raw_furu_positions(conns.session)
-            calculates.update_furu_scores(conns.session)
+            calculates.update_furu_scores_from_stats(conns.session)
+            marks.mark_open_positions_to_market(conns.session)
+            risks.update_furu_risks(conns.session)
+            clones.update_furu_clones(conns.session)
         else:
             print("Skipped.")
 
@@ -56,7 +61,10 @@ class CLIActions:
     def print_golden_portfolio(conns: SessionConnections):
         from rankr.scripts.analytics.print_golden_portfolio import get_golden_portfolio
 
-        golden_folio = get_golden_portfolio(conns.session)
+        with conns.report_session() as session:
+            golden_folio = report_cache.get_report(
+                session, "golden_portfolio", get_golden_portfolio, today=dt.date.today()
+            )
         print(
             golden_folio.head(30).to_string(
                 columns=["position", "symbol", "golden_rank"], index=False
@@ -65,9 +73,20 @@ class CLIActions:
 
     @staticmethod
     def print_leaderboard(conns: SessionConnections):
-        from rankr.scripts.analytics.print_leaderboard import get_leaderboard
+        from rankr.scripts.analytics.print_leaderboard import (
+            LEADERBOARD_SORT_COLUMNS,
+            get_leaderboard,
+        )
 
-        df = get_leaderboard(conns.session)
+        sort_by = input(
+            f"Sort by one of {', '.join(LEADERBOARD_SORT_COLUMNS)} (default performance_score)\n"
+        ).strip()
+        if sort_by not in LEADERBOARD_SORT_COLUMNS:
+            if sort_by:
+                print(f"Cannot sort by {sort_by}, sorting by performance_score.\n")
+            sort_by = "performance_score"
+        with conns.report_session() as session:
+            df = report_cache.get_report(session, "leaderboard", get_leaderboard, sort_by)
         print(
             df[
                 [
@@ -78,6 +97,8 @@ class CLIActions:
                     "average_profit",
                     "average_loss",
                     "average_holding_period_days",
+                    "sharpe_ratio",
+                    "max_drawdown",
                 ]
             ].to_string(index=False)
         )
@@ -88,12 +109,47 @@ class CLIActions:
             get_best_trades_print_string,
         )
 
-        string = get_best_trades_print_string(conns.session)
+        with conns.report_session() as session:
+            string = report_cache.get_report(
+                session, "best_trades", get_best_trades_print_string
+            )
         print(string)
 
     @staticmethod
     def print_scores_for_tickers(conns: SessionConnections):
-        raise NotImplementedError("TODO")  # TODO
+        from rankr.scripts.analytics.print_ticker_scores import get_ticker_scores_table
+
+        symbols_str = input(
+            "Please type tickers separated by comma (e.g. AAPL,NFLX,TWTR)\n"
+        )
+        symbols = [s.strip().upper() for s in symbols_str.split(",") if s.strip()]
+        with conns.report_session() as session:
+            frame = report_cache.get_report(
+                session,
+                "ticker_scores",
+                get_ticker_scores_table,
+                sorted(symbols),
+                dt.date.today(),
+            )
+        print(
+            frame.to_string(
+                index=False, columns=["symbol", "last_mention_score", "golden_rank"]
+            )
+        )
+
+    @staticmethod
+    def print_consensus_entries(conns: SessionConnections):
+        from rankr.actions.consensus import get_consensus_entries
+
+        days = input("Show consensus entries of the last how many days? (default 30)\n")
+        if not days.strip().isdigit():
+            if days.strip():
+                print(f"{days.strip()} is not a number of days, showing the last 30 days.\n")
+            days = "30"
+        since = dt.date.today() - dt.timedelta(days=int(days))
+        with conns.report_session() as session:
+            frame = get_consensus_entries(session, since)
+        print(frame.to_string(index=False))
 
 
 class FunctionFactory:
@@ -106,6 +162,7 @@ class FunctionFactory:
         32: CLIActions.print_leaderboard,
         33: CLIActions.print_best_trades,
         34: CLIActions.print_scores_for_tickers,
+        35: CLIActions.print_consensus_entries,
     }
 
     @classmethod
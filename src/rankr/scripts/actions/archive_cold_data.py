@@ -0,0 +1,15 @@
+from rankr.actions.archives import ARCHIVE_HORIZON_DAYS, archive_cold_data
+from rankr.db import create_db_session_from_cfg
+
+if __name__ == "__main__":
+    dbsess = create_db_session_from_cfg(echo=False)
+    v = input(
+        f"Will move tweets and ticker history older than {ARCHIVE_HORIZON_DAYS} days "
+        f"to the archive. Are you sure? (Y/N)\n"
+    )
+    if v.upper() == "Y":
+        archived = archive_cold_data(dbsess)
+        print(f"Archived: {archived}")
+    else:
+        print("Skipped.")
+    dbsess.close()
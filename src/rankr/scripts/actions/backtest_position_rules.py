@@ -0,0 +1,13 @@
+from rankr.actions.backtests import get_parameter_grid, run_parameter_sweep
+from rankr.db.snapshots import create_snapshot_session_from_cfg
+
+if __name__ == "__main__":
+    dbsess = create_snapshot_session_from_cfg(echo=False)
+    parameter_grid = get_parameter_grid(
+        days_silence_for_position_exit=[15, 30, 45, 60, 90],
+        days_taken_to_exit_position=[1, 3, 5],
+        price_points=["mid", "open", "close"],
+    )
+    summaries = run_parameter_sweep(dbsess, parameter_grid)
+    dbsess.close()
+    print(summaries.drop(columns=["leaderboard_furu_ids"]).to_string(index=False))
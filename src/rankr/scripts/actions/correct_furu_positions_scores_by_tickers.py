@@ -4,6 +4,10 @@ import yfinance as yf
 from sqlalchemy.orm import Session
 from structlog import get_logger
 
+from rankr.actions.archives import (
+    get_ticker_history_with_archive,
+    load_archived_ticker_history,
+)
 from rankr.actions.calculates import calculate_furu_performance
 from rankr.actions.creates import (
     create_default_ticker_history,
@@ -38,17 +42,18 @@ def recalculate_furu_positions_from_symbols(dbsess, symbols_list):
         furu_positions = get_all_furu_positions_by_symbol(dbsess, symbol)
         # TODO -- send this to function
         logger.info(f"Fetched {len(furu_positions)} furu positions")
+        archived_histories = load_archived_ticker_history(symbol)
         for position in furu_positions:
             try:
-                entry_history = position.ticker.get_history_at_date(
-                    position.date_entered
+                entry_history = get_ticker_history_with_archive(
+                    position.ticker, archived_histories, position.date_entered
                 ) or get_ticker_object_history_at_after_date(
                     position.ticker, position.date_entered
                 )
                 position.price_entered = entry_history.get_mid_price_point()
                 if position.date_closed is not None:
-                    exit_history = position.ticker.get_history_at_date(
-                        position.date_closed
+                    exit_history = get_ticker_history_with_archive(
+                        position.ticker, archived_histories, position.date_closed
                     ) or get_ticker_object_history_at_after_date(
                         position.ticker, position.date_entered
                     )
@@ -0,0 +1,15 @@
+import sys
+
+from rankr.actions.exports import EXPORT_PATH, export_tables
+from rankr.db import create_db_session_from_cfg
+
+if __name__ == "__main__":
+    dbsess = create_db_session_from_cfg(echo=False)
+    full = "--full" in sys.argv[1:]
+    print(
+        f"Exporting {'all' if full else 'changed'} furus, positions, ticker history "
+        f"and mentions to {EXPORT_PATH}"
+    )
+    exported = export_tables(dbsess, full=full)
+    print(f"Exported rows: {exported}")
+    dbsess.close()
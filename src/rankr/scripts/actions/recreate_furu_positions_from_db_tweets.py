@@ -1,46 +1,73 @@
-import concurrent.futures as cf
+import sys
 
 from sqlalchemy.orm import Session
 from structlog import get_logger
 
-from rankr.actions.calculates import calculate_furu_performance
+from rankr.actions.archives import load_archived_tweets_by_furu_id
+from rankr.actions.calculates import update_furu_scores, update_furu_scores_multi_process
 from rankr.actions.creates import (
     create_furu_positions_entries_exits_from_tweets,
     fill_prices_for_raw_furu_positions,
     set_exit_dates_for_furu_unmentioned_positions,
 )
+from rankr.actions.rebuilds import rebuild_furu_positions_multi_process
 from rankr.db import create_db_session_from_cfg
+from rankr.db.batches import BatchUnitOfWork
 from rankr.db.models import Furu
 
 logger = get_logger()
 
 
 def recreate_furu_positions_and_scores_from_db(
-    dbsess: Session, recreate_furu_positions=True
+    dbsess: Session,
+    recreate_furu_positions=True,
+    include_archived=True,
+    sharded=False,
+    workers: int = None,
 ):
-    furus = dbsess.query(Furu).filter(Furu.status == Furu.Status.ACTIVE).all()
-    if recreate_furu_positions:
+    """
+    Recreates raw positions from all stored tweets, fills their prices and rescores furus.
+    With `sharded` positions are replaced from scratch and furus are scored, both computed
+    in `workers` processes.
+    """
+    if recreate_furu_positions and sharded:
+        _, failed_shards = rebuild_furu_positions_multi_process(
+            dbsess, workers, include_archived
+        )
+        if failed_shards:
+            logger.warning(
+                f"Furu ids left with their previous positions: "
+                f"{[furu_id for shard in failed_shards for furu_id in shard]}"
+            )
+    elif recreate_furu_positions:
+        furus = dbsess.query(Furu).filter(Furu.status == Furu.Status.ACTIVE).all()
         logger.info(
             f"Recreating furu positions and scores from DB for {len(furus)} furus"
         )
+        archived_tweets_by_furu_id = (
+            load_archived_tweets_by_furu_id([furu.id for furu in furus])
+            if include_archived
+            else {}
+        )
         # create raw positions from db tweets
-        _db_commit_batch_size = 50
-        i, j = 0, _db_commit_batch_size
-        while furus[i:]:
-            with cf.ThreadPoolExecutor() as exe:
-                exe.map(recreate_furu_raw_positions, furus[i:j])
-            dbsess.commit()
-            i, j = j, j + _db_commit_batch_size
+        with BatchUnitOfWork(dbsess, "recreate raw positions", 50) as uow:
+            for furu in furus:
+                with uow.item(furu.id):
+                    recreate_furu_raw_positions(
+                        furu, archived_tweets_by_furu_id.get(furu.id, [])
+                    )
     # gather all positions that need price data and fetch and save it
     fill_prices_for_raw_furu_positions(dbsess)
     # score furus
-    with cf.ThreadPoolExecutor() as exe:
-        exe.map(calculate_furu_performance, furus)
+    if sharded:
+        update_furu_scores_multi_process(dbsess, workers)
+    else:
+        update_furu_scores(dbsess)
 
 
-def recreate_furu_raw_positions(furu: Furu):
+def recreate_furu_raw_positions(furu: Furu, archived_tweets: list = None):
     logger.info(f"Raw updating positions with new FT tweets for {furu}")
-    tweets = furu.get_all_furu_tweets()
+    tweets = (archived_tweets or []) + furu.get_all_furu_tweets()
     furu_cash_tickers = {
         word.upper()
         for tweet in tweets
@@ -57,7 +84,7 @@ def recreate_furu_raw_positions(furu: Furu):
         if cash_ticker_tweets:
             try:
                 create_furu_positions_entries_exits_from_tweets(
-                    furu, cash_ticker, cash_ticker_tweets
+                    furu, cash_ticker, cash_ticker_tweets, use_cursor=False
                 )
             except Exception as ex:
                 logger.exception(
@@ -69,4 +96,4 @@ def recreate_furu_raw_positions(furu: Furu):
 
 if __name__ == "__main__":
     dbsess = create_db_session_from_cfg(False)
-    recreate_furu_positions_and_scores_from_db(dbsess)
+    recreate_furu_positions_and_scores_from_db(dbsess, sharded="--sharded" in sys.argv)
@@ -1,17 +1,46 @@
+import datetime as dt
+
 import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from rankr.db import create_db_session_from_cfg
+from rankr.db.snapshots import create_snapshot_session_from_cfg
+
+
+BEST_TRADES_LIMIT = 100
+
 
+def get_best_trades_df(
+    session: Session,
+    limit: int = BEST_TRADES_LIMIT,
+    furu_id: int = None,
+    closed_from: dt.date = None,
+    closed_to: dt.date = None,
+    worst: bool = False,
+) -> pd.DataFrame:
+    """
+    Best (or worst) closed trades, of all furus or one furu, optionally closed in a period.
 
-def get_best_trades_df(session: Session) -> pd.DataFrame:
+    Positions are read in the order of the indexed realized return, on (furu_id,
+    realized_return) for one furu, so a report reads about `limit` positions.
+    """
+    filters = ""
+    params = {"limit": limit}
+    if furu_id is not None:
+        filters += " AND furu_ticker.furu_id = :furu_id"
+        params["furu_id"] = furu_id
+    if closed_from is not None:
+        filters += " AND furu_ticker.date_closed >= :closed_from"
+        params["closed_from"] = closed_from
+    if closed_to is not None:
+        filters += " AND furu_ticker.date_closed <= :closed_to"
+        params["closed_to"] = closed_to
     query = text(
-        """
-        SELECT * FROM (SELECT
+        f"""
+        SELECT
             furu.handle,
             ticker.symbol as ticker_symbol,
-            furu_ticker.price_closed / furu_ticker.price_entered as investment_return,
+            furu_ticker.realized_return + 1 as investment_return,
             furu_ticker.price_entered,
             furu_ticker.price_closed,
             furu_ticker.date_entered,
@@ -19,12 +48,17 @@ def get_best_trades_df(session: Session) -> pd.DataFrame:
         FROM
             furu_ticker
             JOIN furu ON furu_ticker.furu_id = furu.id
-            JOIN ticker on furu_ticker.ticker_id = ticker.id)
-        ORDER BY investment_return DESC 
-        LIMIT 100
+            JOIN ticker on furu_ticker.ticker_id = ticker.id
+        WHERE furu_ticker.realized_return IS NOT NULL {filters}
+        ORDER BY furu_ticker.realized_return {"ASC" if worst else "DESC"}
+        LIMIT :limit
     """
     )
-    return pd.read_sql(query, session.bind)
+    return pd.read_sql(query, session.bind, params=params)
+
+
+def get_worst_trades_df(session: Session, **kwargs) -> pd.DataFrame:
+    return get_best_trades_df(session, worst=True, **kwargs)
 
 
 def get_best_trades_print_string(session: Session) -> str:
@@ -36,5 +70,5 @@ def get_best_trades_print_string(session: Session) -> str:
 
 
 if __name__ == "__main__":
-    dbsess = create_db_session_from_cfg()
+    dbsess = create_snapshot_session_from_cfg()
     print(get_best_trades_print_string(dbsess))
@@ -1,11 +1,12 @@
 import datetime as dt
-from typing import List
+import json
+from typing import List, Optional
 
 import pandas as pd
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from rankr.db import create_db_session_from_cfg
-from rankr.db.models import Furu
+from rankr.db.snapshots import create_snapshot_session_from_cfg
 
 
 def format_days_as_str(days_float: float) -> str:
@@ -19,27 +20,40 @@ def calc_mid_entry_price(frame_row) -> float:
     return None
 
 
-def calc_days_held(frame_row) -> int:
-    return (
-        dt.date.today()
-        - dt.datetime.strptime(frame_row.earliest_entry, "%Y-%m-%d").date()
-    ).days
-
-
 def count_handles(frame_row) -> int:
     row_handles: str = frame_row.handles
     return row_handles.count("@")
 
 
+def get_days_held(earliest_entries: pd.Series, today: dt.date) -> pd.Series:
+    return (pd.Timestamp(today) - pd.to_datetime(earliest_entries)).dt.days
+
+
+def get_medals(trader_counts: pd.Series) -> pd.Series:
+    """Medals for the three symbols held by the most traders, ties going to the first rows"""
+    ranks = trader_counts.rank(method="first", ascending=False)
+    return ranks.map({1: "🥇", 2: "🥈", 3: "🥉"}).fillna("")
+
+
 def get_open_trades_by_furus(
-    dbsess: Session, list_of_furus: List[Furu]
+    dbsess: Session, furu_ids: Optional[List[int]] = None, today: dt.date = None
 ) -> pd.DataFrame:
-    if not list_of_furus:
-        list_of_furus: List[Furu] = dbsess.query(Furu).all()
-    furu_id_string = ",".join(str(furu.id) for furu in list_of_furus)
-    query = f"""
+    """
+    Open positions of the given furus grouped by symbol, of all furus when `furu_ids` is
+    None or empty. The furu ids are bound as one JSON array parameter, so any number of
+    furus is filtered in SQL.
+    """
+    today = today or dt.date.today()
+    furu_ids = furu_ids or None
+    furu_filter = ""
+    params = {}
+    if furu_ids is not None:
+        furu_filter = "AND ft.furu_id IN (SELECT value FROM json_each(:furu_ids))"
+        params["furu_ids"] = json.dumps([int(furu_id) for furu_id in furu_ids])
+    query = text(
+        f"""
         SELECT
-           t.symbol, 
+           t.symbol,
            count(ft.furu_id) AS trader_count,
            GROUP_CONCAT(f.handle, ' ') as handles,
            GROUP_CONCAT(ft.date_entered, ' ') as entry_dates,
@@ -48,38 +62,35 @@ def get_open_trades_by_furus(
            MIN(ft.price_entered) as least_price_paid,
            MAX(ft.price_entered) as max_price_paid,
            AVG(f.accuracy) as avg_accuracy,
-           AVG(f.average_holding_period_days) as avg_holding_period
+           AVG(f.average_holding_period_days) as avg_holding_period,
+           MAX(m.price_marked) as last_price,
+           AVG(m.unrealized_return) as avg_unrealized_return
         FROM furu_ticker ft
         JOIN furu f ON ft.furu_id = f.id
         JOIN ticker t on ft.ticker_id = t.id
-        WHERE ft.date_closed IS NULL AND ft.furu_id IN ({furu_id_string})
+        LEFT JOIN furu_position_mark m ON m.position_id = ft.id
+        WHERE ft.date_closed IS NULL {furu_filter}
         GROUP BY t.symbol
+        ORDER BY earliest_entry DESC
     """
-    frame_positions = pd.read_sql(sql=query, con=dbsess.bind)
-
-    frame_positions.sort_values(by="earliest_entry", inplace=True, ascending=False)
-    frame_positions["days_held"] = frame_positions.apply(
-        lambda x: calc_days_held(x), axis=1
     )
+    frame_positions = pd.read_sql(sql=query, con=dbsess.bind, params=params)
 
-    if len(list_of_furus) > 1:
-        frame_positions["most_present_traders"] = ["🥇", "🥈", "🥉"] + [
-            "" for _ in range(3, len(frame_positions))
-        ]
+    frame_positions["days_held"] = get_days_held(frame_positions.earliest_entry, today)
 
-    frame_positions.sort_values(by="earliest_entry", inplace=True, ascending=False)
+    if furu_ids is None or len(furu_ids) > 1:
+        frame_positions["most_present_traders"] = get_medals(frame_positions.trader_count)
 
     return frame_positions
 
 
 if __name__ == "__main__":
-    dbsess = create_db_session_from_cfg(echo=False)
+    dbsess = create_snapshot_session_from_cfg(echo=False)
 
     # furus_in = input("\nPlease type Furu handle(s) (separated by space):\n")
     # furu_list = furus_in.split() if furus_in is not None else ['CobraOTC']
-    # furus = dbsess.query(Furu).filter(Furu.handle.in_(furu_list)).all()
-    # furus = []
-    df = get_open_trades_by_furus(dbsess, None)
+    # furu_ids = [f.id for f in dbsess.query(Furu).filter(Furu.handle.in_(furu_list))]
+    df = get_open_trades_by_furus(dbsess)
 
     # df.to_excel(f'outputs/{len(furus)}_furus_open_positions.xlsx')
 
@@ -1,118 +1,248 @@
 import datetime as dt
+import json
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from rankr.db import create_db_session_from_cfg
-from rankr.db.models import Furu
-
-
-def golden_furu_position_count_score(frame_row: pd.Series) -> float:
-    max_furu_concentration = frame_row.max_golden_traders
-    return frame_row.furu_count / max_furu_concentration
-
-
-def ecosystem_saturation_score(frame_row: pd.Series) -> float:
-    crowd_size = frame_row.total_trader_count
-    max_size = (2 / 3) * frame_row.total_traders_tracked
-    if crowd_size > max_size:
-        return 0.0
-    score = crowd_size / max_size
-    return 1.0 - score
-
-
-def last_mention_score(frame_row_dates: str) -> float:
-    last_mentions = [
-        dt.datetime.strptime(date_str, "%Y-%m-%d").date()
-        for date_str in frame_row_dates.split()
-    ]
-    total_mentions = len(last_mentions)
-    recency_count = 0
-    for mention in last_mentions:
-        if mention > dt.date.today() - dt.timedelta(days=12):
-            recency_count += 1
-    return recency_count / total_mentions
-
-
-def entry_score(frame_row_dates: str) -> float:
-    entry_dates = [
-        dt.datetime.strptime(date_str, "%Y-%m-%d").date()
-        for date_str in frame_row_dates.split()
-    ]
-    total_entries = len(entry_dates)
-    score = 0
-    for entry in entry_dates:
-        if entry > dt.date.today() - dt.timedelta(days=3):
-            score += 1
-        elif entry > dt.date.today() - dt.timedelta(days=6):
-            score += 2 / 3
-        elif entry > dt.date.today() - dt.timedelta(days=9):
-            score += 1 / 3
-    return score / total_entries
-
-
-def get_all_open_ticker_saturation(dbsess: Session) -> pd.DataFrame:
+from rankr.actions.clones import get_independent_furu_counts
+from rankr.db.snapshots import create_snapshot_session_from_cfg
+from rankr.db.models import Furu, FuruWindowStats, TickerConsensus
+
+
+def golden_furu_position_count_score(frame: pd.DataFrame) -> pd.Series:
+    return frame.furu_count / frame.max_golden_traders
+
+
+def ecosystem_saturation_score(frame: pd.DataFrame) -> pd.Series:
+    crowd_size = frame.total_trader_count
+    max_size = (2 / 3) * frame.total_traders_tracked
+    return (1.0 - crowd_size / max_size).where(~(crowd_size > max_size), 0.0)
+
+
+ENTRY_SCORE_DAYS = 9
+LAST_MENTION_SCORE_DAYS = 12
+
+
+def get_days_ago(dates: pd.Series, today: dt.date) -> np.ndarray:
+    """Whole days between each date and today, NaN for missing dates"""
+    today = np.datetime64(today, "D")
+    days = (today - dates.values.astype("datetime64[D]")).astype(float)
+    return np.where(dates.isna(), np.nan, days)
+
+
+def last_mention_score(last_mention_days_ago: np.ndarray) -> np.ndarray:
+    """Per position: 1 if last mentioned within 12 days, NaN if never mentioned"""
+    return np.where(
+        np.isnan(last_mention_days_ago),
+        np.nan,
+        (last_mention_days_ago < LAST_MENTION_SCORE_DAYS).astype(float),
+    )
+
+
+def entry_score(entry_days_ago: np.ndarray) -> np.ndarray:
+    """Per position: 1 if entered within 3 days, decaying by thirds down to 0 after 9"""
+    return np.select(
+        [entry_days_ago < 3, entry_days_ago < 6, entry_days_ago < ENTRY_SCORE_DAYS],
+        [1, 2 / 3, 1 / 3],
+        0.0,
+    )
+
+
+def get_symbols_filter(column: str, symbols: Optional[List[str]]) -> str:
+    if symbols is None:
+        return ""
+    return f"AND {column} IN (SELECT value FROM json_each(:symbols))"
+
+
+def get_all_open_ticker_saturation(
+    dbsess: Session, symbols: List[str] = None
+) -> pd.DataFrame:
     query = text(
-        """
-        SELECT
-            t.symbol as symbol,
-            COUNT(ft.furu_id) as total_trader_count
-        FROM furu_ticker ft
-        JOIN ticker t on t.id = ft.ticker_id
-        WHERE ft.date_closed is null
-        GROUP BY t.symbol
-        ORDER BY COUNT(ft.furu_id) DESC
+        f"""
+        SELECT symbol, open_furu_count AS total_trader_count
+        FROM ticker_consensus
+        WHERE open_furu_count > 0 {get_symbols_filter("symbol", symbols)}
+        ORDER BY open_furu_count DESC
     """
     )
-    return pd.read_sql(query, dbsess.bind)
+    return pd.read_sql(query, dbsess.bind, params={"symbols": json.dumps(symbols)})
 
 
-def get_raw_golden_portfolio(dbsess: Session) -> pd.DataFrame:
+def get_consensus_golden_portfolio(
+    dbsess: Session, today: dt.date = None, symbols: List[str] = None
+) -> pd.DataFrame:
+    """
+    Golden portfolio symbols read from the maintained `ticker_consensus` aggregates.
+    Only the recency scores are computed here, from the few recently entered or
+    mentioned positions, as they depend on today's date. Passing `symbols` reads only
+    their rows and positions.
+    """
+    today = today or dt.date.today()
+    frame = pd.read_sql(
+        text(
+            f"""
+            SELECT
+                symbol,
+                golden_furu_count AS furu_count,
+                golden_mentioned_count,
+                handles,
+                earliest_entry,
+                latest_entry AS lastest_entry,
+                least_price_paid,
+                max_price_paid,
+                accuracy,
+                average_profit AS return,
+                holding_period,
+                last_price,
+                unrealized_return
+            FROM ticker_consensus
+            WHERE golden_furu_count > 0 {get_symbols_filter("symbol", symbols)}
+            """
+        ),
+        dbsess.bind,
+        params={"symbols": json.dumps(symbols)},
+    )
+    recent_positions = pd.read_sql(
+        text(
+            f"""
+            SELECT t.symbol, ft.date_entered, ft.date_last_mentioned
+            FROM furu_ticker ft
+            JOIN furu f ON ft.furu_id = f.id
+            JOIN ticker t on ft.ticker_id = t.id
+            WHERE {TickerConsensus.GOLDEN_FURU_CONDITION}
+                AND ft.date_closed IS NULL
+                {get_symbols_filter("t.symbol", symbols)}
+                AND (
+                    ft.date_entered > :entered_since
+                    OR ft.date_last_mentioned > :mentioned_since
+                )
+            """
+        ),
+        dbsess.bind,
+        params={
+            "entered_since": today - dt.timedelta(days=ENTRY_SCORE_DAYS),
+            "mentioned_since": today - dt.timedelta(days=LAST_MENTION_SCORE_DAYS),
+            "symbols": json.dumps(symbols),
+        },
+        parse_dates=["date_entered", "date_last_mentioned"],
+    )
+    recency_sums = (
+        recent_positions.assign(
+            last_mention_score=np.nan_to_num(
+                last_mention_score(
+                    get_days_ago(recent_positions.date_last_mentioned, today)
+                )
+            ),
+            entry_score=entry_score(get_days_ago(recent_positions.date_entered, today)),
+        )
+        .groupby("symbol")[["last_mention_score", "entry_score"]]
+        .sum()
+    )
+    recency_sums = recency_sums.reindex(frame.symbol, fill_value=0.0).to_numpy()
+    frame["last_mention_score"] = (
+        recency_sums[:, 0] / frame.golden_mentioned_count
+    ).where(frame.golden_mentioned_count > 0)
+    frame["entry_score"] = recency_sums[:, 1] / frame.furu_count
+    return frame.drop(columns=["golden_mentioned_count"])
+
+
+def get_raw_golden_portfolio(
+    dbsess: Session,
+    window_days: Optional[int] = None,
+    min_window_accuracy: Optional[float] = None,
+    min_window_performance_score: Optional[float] = None,
+    today: dt.date = None,
+) -> pd.DataFrame:
+    """
+    Open positions of leaderboard furus grouped by symbol. Passing `window_days` also
+    requires the furus' rolling scores over that window to pass the given minimums,
+    which are aggregated from the positions instead of the maintained consensus.
+    """
+    if window_days is None:
+        return get_consensus_golden_portfolio(dbsess, today)
+    assert (
+        window_days in FuruWindowStats.WINDOWS_DAYS
+    ), f"Rolling windows are {FuruWindowStats.WINDOWS_DAYS}"
+    window_join = (
+        "JOIN furu_window_stats w ON w.furu_id = f.id AND w.window_days = :window_days"
+    )
+    window_filter = ""
+    params = {"window_days": window_days}
+    if min_window_accuracy is not None:
+        window_filter += " AND w.accuracy > :min_window_accuracy"
+        params["min_window_accuracy"] = min_window_accuracy
+    if min_window_performance_score is not None:
+        window_filter += " AND w.performance_score > :min_window_performance_score"
+        params["min_window_performance_score"] = min_window_performance_score
     query = text(
-        """
+        f"""
         SELECT
-           t.symbol, 
-           count(ft.furu_id) AS furu_count,
-           GROUP_CONCAT(f.handle, ' ') as handles,
-           GROUP_CONCAT(ft.date_entered, ' ') as entry_dates,
-           GROUP_CONCAT(ft.date_last_mentioned, ' ') as last_mentions,
-           MIN(ft.date_entered) as earliest_entry,
-           MAX(ft.date_entered) as lastest_entry,
-           MIN(ft.price_entered) as least_price_paid,
-           MAX(ft.price_entered) as max_price_paid,
-           AVG(f.accuracy) as accuracy,
-           AVG(f.average_profit) as return,
-           AVG(f.average_holding_period_days) as holding_period
+            t.symbol,
+            ft.furu_id,
+            f.handle,
+            ft.date_entered,
+            ft.date_last_mentioned,
+            ft.price_entered,
+            f.accuracy,
+            f.average_profit,
+            f.average_holding_period_days,
+            m.price_marked,
+            m.unrealized_return
         FROM furu_ticker ft
         JOIN furu f ON ft.furu_id = f.id
         JOIN ticker t on ft.ticker_id = t.id
-        WHERE f.accuracy > 0.55 
-            AND f.performance_score > 0.3 
-            AND f.total_trades_measured > 30 
-            AND f.average_holding_period_days > 12 
+        LEFT JOIN furu_position_mark m ON m.position_id = ft.id
+        {window_join}
+        WHERE {Furu.get_leaderboard_condition("f")}
             AND ft.date_closed IS NULL
-        GROUP BY t.symbol;
+            {window_filter}
     """
     )
-    frame = pd.read_sql(query, dbsess.bind)
+    positions = pd.read_sql(query, dbsess.bind, params=params)
+    return aggregate_golden_positions(positions, today)
 
+
+def aggregate_golden_positions(
+    positions: pd.DataFrame, today: dt.date = None
+) -> pd.DataFrame:
+    """Groups one-row-per-open-position data by symbol, averaging the recency scores"""
+    today = today or dt.date.today()
+    dates = positions[["date_entered", "date_last_mentioned"]].apply(pd.to_datetime)
+    positions = positions.assign(
+        last_mention_score=last_mention_score(
+            get_days_ago(dates.date_last_mentioned, today)
+        ),
+        entry_score=entry_score(get_days_ago(dates.date_entered, today)),
+    )
+    frame = positions.groupby("symbol", as_index=False).agg(
+        furu_count=("furu_id", "count"),
+        handles=("handle", " ".join),
+        earliest_entry=("date_entered", "min"),
+        lastest_entry=("date_entered", "max"),
+        least_price_paid=("price_entered", "min"),
+        max_price_paid=("price_entered", "max"),
+        accuracy=("accuracy", "mean"),
+        **{"return": ("average_profit", "mean")},
+        holding_period=("average_holding_period_days", "mean"),
+        last_price=("price_marked", "max"),
+        unrealized_return=("unrealized_return", "mean"),
+        last_mention_score=("last_mention_score", "mean"),
+        entry_score=("entry_score", "mean"),
+    )
     return frame
 
 
 def add_scores_to_frame(frame: pd.DataFrame) -> pd.DataFrame:
     """
     This function needs the DF to have the following cols:
-    max_golden_traders, furu_count, total_trader_count, total_traders_tracked, last_mentions
+    max_golden_traders, furu_count, total_trader_count, total_traders_tracked,
+    last_mention_score, entry_score
     """
-    frame["golden_furu_pos_count_score"] = frame.apply(
-        lambda x: golden_furu_position_count_score(x), axis=1
-    )
-    frame["ecosystem_saturation_score"] = frame.apply(
-        lambda x: ecosystem_saturation_score(x), axis=1
-    )
-    frame["last_mention_score"] = frame.last_mentions.apply(last_mention_score)
-    frame["entry_score"] = frame.entry_dates.apply(entry_score)
+    frame["golden_furu_pos_count_score"] = golden_furu_position_count_score(frame)
+    frame["ecosystem_saturation_score"] = ecosystem_saturation_score(frame)
     frame["golden_rank"] = (
         (frame.golden_furu_pos_count_score * (5 / 10))
         + (frame.ecosystem_saturation_score * (2 / 10))
@@ -122,15 +252,40 @@ def add_scores_to_frame(frame: pd.DataFrame) -> pd.DataFrame:
     return frame
 
 
-def get_golden_portfolio(dbsess: Session) -> pd.DataFrame:
-    raw_frame = get_raw_golden_portfolio(dbsess)
+def deduplicate_clone_counts(dbsess: Session, frame: pd.DataFrame) -> pd.DataFrame:
+    """Replaces the furu and saturation counts with counts of independent furus"""
+    counts = get_independent_furu_counts(dbsess)
+    frame = frame.merge(counts, on="symbol", how="left")
+    # clusters can only lower the counts, also of window-filtered portfolios
+    frame["furu_count"] = np.fmin(frame.furu_count, frame.independent_golden_count)
+    frame["total_trader_count"] = np.fmin(
+        frame.total_trader_count, frame.independent_furu_count
+    )
+    frame["max_golden_traders"] = frame.furu_count.max()
+    return frame.drop(columns=["independent_furu_count", "independent_golden_count"])
+
+
+def get_golden_portfolio(
+    dbsess: Session,
+    deduplicate_clones: bool = False,
+    today: dt.date = None,
+    **window_filters,
+) -> pd.DataFrame:
+    """
+    Ranked golden portfolio, whose recency scores are as of `today`. With
+    `deduplicate_clones` each cluster of near-duplicate furus counts once towards a
+    symbol's furu and saturation counts.
+    """
+    raw_frame = get_raw_golden_portfolio(dbsess, today=today, **window_filters)
 
-    raw_frame["total_traders_tracked"] = len(dbsess.query(Furu).all())
-    raw_frame["max_golden_traders"] = max(raw_frame.furu_count)
+    raw_frame["total_traders_tracked"] = dbsess.query(Furu).count()
+    raw_frame["max_golden_traders"] = raw_frame.furu_count.max()
 
     sat_frame = get_all_open_ticker_saturation(dbsess)
 
     merged = pd.merge(raw_frame, sat_frame, on="symbol", how="left")
+    if deduplicate_clones:
+        merged = deduplicate_clone_counts(dbsess, merged)
     merged = add_scores_to_frame(merged)
 
     merged.drop(columns=["max_golden_traders", "total_traders_tracked"], inplace=True)
@@ -140,7 +295,7 @@ def get_golden_portfolio(dbsess: Session) -> pd.DataFrame:
 
 
 if __name__ == "__main__":
-    dbsess = create_db_session_from_cfg(echo=False)
+    dbsess = create_snapshot_session_from_cfg(echo=False)
     golden_folio = get_golden_portfolio(dbsess)
     # golden_folio.to_excel(f'outputs/golden_portfolio.xlsx')
 
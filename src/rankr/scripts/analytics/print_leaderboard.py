@@ -1,8 +1,32 @@
+import datetime as dt
+import sys
+
 import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from rankr.db import create_db_session_from_cfg
+from rankr.actions.leaderboards import LEADERBOARD_COLUMNS, get_leaderboard_as_of
+from rankr.db.models import Furu, FuruWindowStats
+from rankr.db.snapshots import create_snapshot_session_from_cfg
+
+
+LEADERBOARD_WINDOWS_DAYS = FuruWindowStats.WINDOWS_DAYS
+
+LEADERBOARD_WINDOW_COLUMNS = [
+    f"{column}_{window_days}d"
+    for window_days in LEADERBOARD_WINDOWS_DAYS
+    for column in ["accuracy", "average_profit", "performance_score"]
+]
+
+LEADERBOARD_SORT_COLUMNS = [
+    "performance_score",
+    "accuracy",
+    *LEADERBOARD_WINDOW_COLUMNS,
+    "sharpe_ratio",
+    "sortino_ratio",
+    "max_drawdown",
+    "max_days_under_water",
+]
 
 
 def add_emoji(frame_row) -> str:
@@ -31,9 +55,29 @@ def format_days_as_str(days_float: float) -> str:
     return str(rounded) + "d"
 
 
-def get_leaderboard(dbsess: Session) -> pd.DataFrame:
+def get_leaderboard(
+    dbsess: Session, sort_by: str = "performance_score"
+) -> pd.DataFrame:
+    if sort_by not in LEADERBOARD_SORT_COLUMNS:
+        raise ValueError(f"sort_by must be one of {', '.join(LEADERBOARD_SORT_COLUMNS)}")
+    # drawdowns are negative returns, so the shallowest one is the largest
+    order = "ASC" if sort_by == "max_days_under_water" else "DESC"
+    if sort_by in ["performance_score", "accuracy"]:
+        sort_by = f"f.{sort_by}"
+    elif sort_by not in LEADERBOARD_WINDOW_COLUMNS:
+        sort_by = f"r.{sort_by}"
+    window_columns = ",\n".join(
+        f"w{window_days}.{column} AS {column}_{window_days}d"
+        for window_days in LEADERBOARD_WINDOWS_DAYS
+        for column in ["accuracy", "average_profit", "performance_score"]
+    )
+    window_joins = "\n".join(
+        f"LEFT JOIN furu_window_stats w{window_days} "
+        f"ON w{window_days}.furu_id = f.id AND w{window_days}.window_days = {window_days}"
+        for window_days in LEADERBOARD_WINDOWS_DAYS
+    )
     query = text(
-        """
+        f"""
                 SELECT
                        f.handle,
                        f.accuracy,
@@ -41,18 +85,35 @@ def get_leaderboard(dbsess: Session) -> pd.DataFrame:
                        f.total_trades_measured,
                        f.average_profit,
                        f.average_loss,
-                       f.average_holding_period_days
+                       f.average_holding_period_days,
+                       r.sharpe_ratio,
+                       r.sortino_ratio,
+                       r.max_drawdown,
+                       r.max_days_under_water,
+                       {window_columns}
                 FROM furu f
-                WHERE f.accuracy > 0.55 
-                    AND f.performance_score > 0.3 
-                    AND f.total_trades_measured > 30 
-                    AND average_holding_period_days > 12
-                ORDER BY performance_score DESC
+                LEFT JOIN furu_risk r ON r.furu_id = f.id
+                {window_joins}
+                WHERE {Furu.get_leaderboard_condition("f")}
+                ORDER BY {sort_by} IS NULL, {sort_by} {order}
             """
     )
     frame = pd.read_sql(sql=query, con=dbsess.bind)
 
-    frame["emoji"] = ["🥇", "🥈", "🥉"] + ["" for _ in range(3, len(frame))]
+    return format_leaderboard(frame)
+
+
+def get_leaderboard_at_date(dbsess: Session, as_of: dt.date) -> pd.DataFrame:
+    """Leaderboard ranked on the positions closed by `as_of` instead of current scores"""
+    frame = get_leaderboard_as_of(dbsess, as_of)[LEADERBOARD_COLUMNS].copy()
+
+    return format_leaderboard(frame.reset_index(drop=True))
+
+
+def format_leaderboard(frame: pd.DataFrame) -> pd.DataFrame:
+    frame["emoji"] = (["🥇", "🥈", "🥉"] + ["" for _ in range(3, len(frame))])[
+        : len(frame)
+    ]
     frame["emoji"] = frame.apply(lambda x: add_emoji(x), axis=1)
 
     frame["handle"] = "@" + frame["handle"]
@@ -79,8 +140,13 @@ def get_leaderboard(dbsess: Session) -> pd.DataFrame:
 
 
 if __name__ == "__main__":
-    dbsess = create_db_session_from_cfg(echo=False)
-    df = get_leaderboard(dbsess)
+    dbsess = create_snapshot_session_from_cfg(echo=False)
+    if len(sys.argv) > 1 and sys.argv[1] in LEADERBOARD_SORT_COLUMNS:
+        df = get_leaderboard(dbsess, sort_by=sys.argv[1])
+    elif len(sys.argv) > 1:
+        df = get_leaderboard_at_date(dbsess, dt.date.fromisoformat(sys.argv[1]))
+    else:
+        df = get_leaderboard(dbsess)
     # df.to_csv(path_or_buf='outputs/leaderboard_output.csv', sep=' ', index=False, header=False)
     # df.to_excel('outputs/leaderboard_output.xlsx')
 
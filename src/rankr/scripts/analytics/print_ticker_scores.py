@@ -1,20 +1,45 @@
+import datetime as dt
 from typing import List
 
 import pandas as pd
 from sqlalchemy.orm import Session
 
-from rankr.db import create_db_session_from_cfg
+from rankr.db.models import Furu, TickerConsensus
+from rankr.db.snapshots import create_snapshot_session_from_cfg
+from rankr.scripts.analytics.print_golden_portfolio import (
+    add_scores_to_frame,
+    get_all_open_ticker_saturation,
+    get_consensus_golden_portfolio,
+)
 
 
-def get_ticker_scores_table(dbsess: Session, tickers_list: List[str]) -> pd.DataFrame:
-    from rankr.scripts.analytics.print_golden_portfolio import get_golden_portfolio
+def get_ticker_scores_table(
+    dbsess: Session, tickers_list: List[str], today: dt.date = None
+) -> pd.DataFrame:
+    """
+    Golden portfolio scores of the given symbols only. Their aggregates and open positions
+    are looked up by symbol, and only the score denominators are read globally, so the
+    cost follows the number of symbols rather than the size of the golden portfolio.
+    """
+    symbols = sorted({symbol.upper() for symbol in tickers_list})
+    frame = get_consensus_golden_portfolio(dbsess, today, symbols)
+    frame["total_traders_tracked"] = dbsess.query(Furu).count()
+    frame["max_golden_traders"] = TickerConsensus.get_max_golden_furu_count(
+        dbsess.connection()
+    )
+
+    sat_frame = get_all_open_ticker_saturation(dbsess, symbols)
+
+    merged = pd.merge(frame, sat_frame, on="symbol", how="left")
+    merged = add_scores_to_frame(merged)
 
-    golden_portfolio = get_golden_portfolio(dbsess)
-    return golden_portfolio[golden_portfolio.symbol.isin(tickers_list)]
+    merged.drop(columns=["max_golden_traders", "total_traders_tracked"], inplace=True)
+    merged.sort_values(by=["golden_rank"], ascending=False, inplace=True)
+    return merged
 
 
 if __name__ == "__main__":
-    dbsess = create_db_session_from_cfg(False)
+    dbsess = create_snapshot_session_from_cfg(False)
     tickers = [
         "IFAN",
         "BABL",
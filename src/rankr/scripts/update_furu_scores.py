@@ -1,9 +1,12 @@
-from rankr.actions.calculates import calculate_furu_performance
+import sys
+
+from rankr.actions.calculates import update_furu_scores, update_furu_scores_multi_process
 from rankr.db import create_db_session_from_cfg
-from rankr.db.models import Furu
 
 if __name__ == "__main__":
     dbsess = create_db_session_from_cfg(False)
-    furus = dbsess.query(Furu).all()
-    for furu in furus:
-        calculate_furu_performance(furu)
+    if "--processes" in sys.argv:
+        furu_ids = update_furu_scores_multi_process(dbsess)
+    else:
+        furu_ids = update_furu_scores(dbsess)
+    print(f"Updated scores of {len(furu_ids)} FURUs.")
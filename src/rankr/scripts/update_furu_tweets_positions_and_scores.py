@@ -7,6 +7,7 @@ from structlog import get_logger
 from tweepy import API
 
 import rankr.db
+from rankr.db.batches import BatchUnitOfWork
 from rankr.actions import instantiate_api_session_from_cfg
 from rankr.actions.calculates import (
     scoped_score_furu_from_tweets,
@@ -25,21 +26,18 @@ BATCH_SIZE = 50
 
 def update_furu_scores_from_new_tweets(db_session, list_of_furus):
     logger.info(f"Updating scores from new tweets for {len(list_of_furus)} FURUs")
-    i, j = 0, BATCH_SIZE
-    while list_of_furus[i:]:
-        for furu in list_of_furus[i:j]:
-            if furu.has_new_furu_tweets:
+    with BatchUnitOfWork(db_session, "scores from new tweets", BATCH_SIZE) as uow:
+        for furu in list_of_furus:
+            if not furu.has_new_furu_tweets:
+                logger.warning(f"Skipped scoring because of no tweets for {furu}.")
+                continue
+            with uow.item(furu.id):
                 try:
-                    score_furu_from_tweets(db_session, furu, furu.get_new_furu_tweets())
+                    score_furu_from_tweets(
+                        db_session, furu, furu.get_new_furu_tweets(), db_commit=False
+                    )
                 except KeyError as ex:
                     logger.warning(f"Skipped scoring for {furu}. Reason: {ex}")
-                except Exception as ex:
-                    logger.exception(f"Failed to score {furu}. Reason: {ex}")
-            else:
-                logger.warning(f"Skipped scoring because of no tweets for {furu}.")
-        db_session.commit()
-        i = j
-        j += BATCH_SIZE
 
     return list_of_furus
 
@@ -1,5 +1,8 @@
-from rankr.actions.calculates import update_furu_scores_multi_threaded
+from rankr.actions.calculates import update_furu_scores_multi_process
+from rankr.actions.clones import update_furu_clones
 from rankr.actions.creates import fill_prices_for_raw_furu_positions
+from rankr.actions.marks import mark_open_positions_to_market
+from rankr.actions.risks import update_furu_risks
 from rankr.db import create_db_session_from_cfg
 
 if __name__ == "__main__":
@@ -9,6 +12,9 @@ if __name__ == "__main__":
     )
     if v.upper() == "Y":
         fill_prices_for_raw_furu_positions(dbsess)
-        update_furu_scores_multi_threaded(dbsess)
+        update_furu_scores_multi_process(dbsess)
+        mark_open_positions_to_market(dbsess)
+        update_furu_risks(dbsess)
+        update_furu_clones(dbsess)
     else:
         print("Skipped.")
@@ -1,6 +1,37 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from rankr.db.models import Base
+
+
+def create_test_session(engine: Engine = None) -> Session:
+    """Session on `engine`, a fresh in-memory database by default, with every table created"""
+    engine = engine or create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+class InMemoryDbTestCase(unittest.TestCase):
+    """Test case whose `session` is on a fresh in-memory database for every test"""
+
+    def setUp(self) -> None:
+        self.session = create_test_session()
+        self.engine = self.session.get_bind()
+
+
 class MockSession:
     objects_in_db = set()
 
+    class MockTransaction:
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
     class MockQuery:
         query_results = {}
 
@@ -19,6 +50,12 @@ class MockSession:
     def commit(self):
         pass
 
+    def rollback(self):
+        pass
+
+    def begin_nested(self):
+        return self.MockTransaction()
+
     def add(self, obj):
         self.objects_in_db.add(obj)
 
@@ -0,0 +1,116 @@
+import datetime as dt
+import pathlib
+import tempfile
+import types
+
+from rankr.actions.archives import (
+    HISTORY_ARCHIVE,
+    TWEETS_ARCHIVE,
+    archive_furu_tweets,
+    archive_ticker_history,
+    list_partition_months,
+    load_archived_ticker_history,
+    load_archived_tweets_by_furu_id,
+)
+from rankr.db.models import Furu, FuruTweet, Ticker, TickerHistory
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestArchives(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.archive_path = pathlib.Path(self.archive_dir.name)
+
+        self.furu = Furu(handle="MaxTradezz")
+        self.other_furu = Furu(handle="PJ_Matlock")
+        self.ticker = Ticker(symbol="GGGM")
+        self.session.add_all([self.furu, self.other_furu, self.ticker])
+        self.session.flush()
+        self.furu.date_last_updated = dt.date(2021, 6, 1)
+        self.other_furu.date_last_updated = dt.date(2021, 6, 1)
+        tweet_id = 0
+        for furu, dates in [
+            (self.furu, [dt.date(2021, 4, 10), dt.date(2021, 4, 20), dt.date(2021, 5, 30)]),
+            (self.other_furu, [dt.date(2021, 4, 15), dt.date(2021, 5, 30)]),
+        ]:
+            for date in dates:
+                tweet_id += 1
+                self.session.add(self.get_tweet_chunk(furu.id, tweet_id, date))
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.archive_dir.cleanup()
+
+    @staticmethod
+    def get_tweet_chunk(furu_id: int, tweet_id: int, date: dt.date) -> FuruTweet:
+        tweet = types.SimpleNamespace(
+            id=tweet_id, created_at=dt.datetime.combine(date, dt.time(16)), text=f"#{tweet_id}"
+        )
+        chunk = FuruTweet(furu_id=furu_id, tweets=[tweet])
+        chunk.tweets_min_date = chunk.tweets_max_date = date
+        chunk.tweets_min_id = chunk.tweets_max_id = tweet_id
+        return chunk
+
+    def get_ticker_history(self, date: dt.date, close: float) -> TickerHistory:
+        return TickerHistory(
+            date,
+            high=close,
+            open=close,
+            close=close,
+            low=close,
+            volume=1,
+            ticker_id=self.ticker.id,
+        )
+
+    def archive(self, archive_function, horizon_date: dt.date) -> int:
+        return archive_function(self.session, horizon_date, self.archive_path)
+
+    def load_tweet_ids(self, furu_ids=None) -> dict:
+        return {
+            furu_id: [tweet.id for tweet in tweets]
+            for furu_id, tweets in load_archived_tweets_by_furu_id(
+                furu_ids, self.archive_path
+            ).items()
+        }
+
+    def test_archived_tweets_are_merged_into_month_partitions_and_reloaded(self):
+        self.assertEqual(1, self.archive(archive_furu_tweets, dt.date(2021, 4, 15)))
+        self.assertEqual({self.furu.id: [1]}, self.load_tweet_ids())
+
+        # the later chunks of April are merged into the existing partition
+        self.assertEqual(2, self.archive(archive_furu_tweets, dt.date(2021, 5, 1)))
+        self.assertEqual(["2021-04"], list_partition_months(TWEETS_ARCHIVE, self.archive_path))
+        self.assertEqual(
+            {self.furu.id: [1, 2], self.other_furu.id: [4]}, self.load_tweet_ids()
+        )
+        self.assertEqual({self.other_furu.id: [4]}, self.load_tweet_ids([self.other_furu.id]))
+
+        # each furu's latest chunk stays in the database
+        chunks = self.session.query(FuruTweet).order_by(FuruTweet.id).all()
+        self.assertEqual([3, 5], [chunk.tweets_max_id for chunk in chunks])
+
+    def test_archived_history_is_merged_into_month_partitions_and_reloaded(self):
+        self.session.add_all(
+            [
+                self.get_ticker_history(dt.date(2021, 4, 12), 10.0),
+                self.get_ticker_history(dt.date(2021, 4, 13), 11.0),
+                self.get_ticker_history(dt.date(2021, 5, 3), 12.0),
+            ]
+        )
+        self.session.commit()
+        self.assertEqual(1, self.archive(archive_ticker_history, dt.date(2021, 4, 13)))
+        self.assertEqual(1, self.archive(archive_ticker_history, dt.date(2021, 5, 1)))
+        self.assertEqual(["2021-04"], list_partition_months(HISTORY_ARCHIVE, self.archive_path))
+        self.assertEqual(1, self.session.query(TickerHistory).count())
+
+        histories = load_archived_ticker_history("GGGM", archive_path=self.archive_path)
+        self.assertEqual(
+            [(dt.date(2021, 4, 12), 10.0), (dt.date(2021, 4, 13), 11.0)],
+            [(h.date, h.close) for h in histories],
+        )
+        histories = load_archived_ticker_history(
+            "GGGM", start=dt.date(2021, 4, 13), archive_path=self.archive_path
+        )
+        self.assertEqual([dt.date(2021, 4, 13)], [h.date for h in histories])
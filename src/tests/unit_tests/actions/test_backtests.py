@@ -0,0 +1,69 @@
+import datetime as dt
+import unittest
+
+import numpy as np
+
+from rankr.actions.backtests import (
+    PositionRuleParameters,
+    backtest_position_rules,
+    get_parameter_grid,
+    init_backtest_worker,
+    backtest_position_rules_in_process,
+)
+
+
+def to_dates(*dates: str) -> np.ndarray:
+    return np.array(dates, dtype="datetime64[D]")
+
+
+class TestBacktestFunctions(unittest.TestCase):
+    def setUp(self) -> None:
+        self.today = np.datetime64(dt.date(2021, 12, 31), "D")
+        # mentions on Mon 2021-01-04 and 2021-01-11, then again from 2021-04-05
+        self.mention_dates = {
+            (1, "GGGM"): to_dates("2021-01-04", "2021-01-11", "2021-04-05"),
+        }
+        history_dates = np.arange(
+            np.datetime64("2021-01-01"), np.datetime64("2021-06-01")
+        )
+        opens = np.linspace(1.0, 2.0, len(history_dates))
+        self.price_arrays = {
+            "GGGM": {"date": history_dates, "open": opens, "close": opens + 0.5}
+        }
+
+    def test_default_rules_split_mentions_on_silence(self):
+        metrics = backtest_position_rules(
+            PositionRuleParameters(), self.mention_dates, self.price_arrays, self.today
+        )
+        self.assertEqual(1, len(metrics))
+        # 2021-01-04 -> 2021-01-14 and 2021-04-05 -> 2021-04-08, both rising
+        self.assertEqual(2, metrics.total_trades_measured.iloc[0])
+        self.assertEqual(1.0, metrics.accuracy.iloc[0])
+        self.assertEqual(6.5, metrics.average_holding_period_days.iloc[0])
+
+    def test_long_silence_rule_merges_positions(self):
+        metrics = backtest_position_rules(
+            PositionRuleParameters(days_silence_for_position_exit=90),
+            self.mention_dates,
+            self.price_arrays,
+            self.today,
+        )
+        self.assertEqual(1, metrics.total_trades_measured.iloc[0])
+        self.assertEqual(94, metrics.average_holding_period_days.iloc[0])
+
+    def test_open_positions_and_missing_prices_are_not_scored(self):
+        metrics = backtest_position_rules(
+            PositionRuleParameters(),
+            {(1, "GGGM"): to_dates("2021-12-20"), (2, "LAPK"): to_dates("2021-01-04")},
+            self.price_arrays,
+            self.today,
+        )
+        self.assertTrue(metrics.empty)
+
+    def test_sweep_summary_per_parameter_set(self):
+        init_backtest_worker(self.mention_dates, self.price_arrays, self.today)
+        grid = get_parameter_grid([45, 90], [3], ["mid", "open"])
+        summaries = [backtest_position_rules_in_process(p) for p in grid]
+        self.assertEqual([45, 45, 90, 90], [s["days_silence_for_position_exit"] for s in summaries])
+        self.assertEqual([2, 2, 1, 1], [s["total_trades_measured"] for s in summaries])
+        self.assertEqual(0, summaries[0]["leaderboard_furus"])
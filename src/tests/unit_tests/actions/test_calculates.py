@@ -0,0 +1,153 @@
+import datetime as dt
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from rankr.actions.calculates import (
+    FURU_METRIC_COLUMNS,
+    calculate_furu_metrics_from_closed_positions,
+    get_closed_position_rows_by_furu_id,
+    update_furu_scores,
+    update_furu_scores_multi_process,
+)
+from rankr.db.models import Furu, FuruTicker
+from tests.mocks.base import create_test_session
+
+
+class TestCalculatesFunctions(unittest.TestCase):
+    def setUp(self) -> None:
+        self.position_values = [
+            (dt.date(2021, 1, 4), dt.date(2021, 2, 4), 1.0, 1.5),
+            (dt.date(2021, 2, 8), dt.date(2021, 3, 1), 2.0, 1.0),
+            (dt.date(2021, 3, 8), dt.date(2021, 5, 3), 0.5, 2.0),
+            (dt.date(2021, 4, 1), dt.date(2021, 4, 19), 3.0, 3.0),
+            (dt.date(2021, 6, 1), None, 3.0, None),
+        ]
+
+    def test_metrics_from_closed_positions(self):
+        metrics = calculate_furu_metrics_from_closed_positions(self.position_values)
+
+        self.assertEqual(4, metrics["total_trades_measured"])
+        self.assertAlmostEqual(0.5, metrics["accuracy"])
+        self.assertAlmostEqual(1.75, metrics["average_profit"])
+        self.assertAlmostEqual(-0.25, metrics["average_loss"])
+        self.assertAlmostEqual(31.5, metrics["average_holding_period_days"])
+        self.assertAlmostEqual(0.75, metrics["expected_return"])
+        self.assertAlmostEqual(-0.125, metrics["performance_score"])
+
+    def test_metrics_without_closed_positions_are_empty(self):
+        self.assertEqual(
+            {}, calculate_furu_metrics_from_closed_positions(self.position_values[-1:])
+        )
+
+    def test_set_based_scores_match_metrics_from_closed_positions(self):
+        session = create_test_session()
+        furu, cancelled_furu = Furu(handle="MaxTradezz"), Furu(handle="MehYouKnow")
+        cancelled_furu.status = Furu.Status.CANCELLED
+        for date_entered, date_closed, price_entered, price_closed in self.position_values:
+            for position_furu in [furu, cancelled_furu]:
+                FuruTicker(
+                    furu=position_furu,
+                    ticker_symbol="GGGM",
+                    date_entered=date_entered,
+                    date_closed=date_closed,
+                    price_entered=price_entered,
+                    price_closed=price_closed,
+                )
+        session.add_all([furu, cancelled_furu])
+        session.commit()
+
+        self.assertEqual([furu.id], update_furu_scores(session))
+
+        metrics = calculate_furu_metrics_from_closed_positions(self.position_values)
+        for column in FURU_METRIC_COLUMNS:
+            self.assertAlmostEqual(metrics[column], getattr(furu, column))
+        self.assertIsNone(cancelled_furu.accuracy)
+
+    def create_file_session(self):
+        db_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(db_dir.cleanup)
+        self.database_url = f"sqlite:///{pathlib.Path(db_dir.name, 'fururankr.db')}"
+        engine = create_engine(self.database_url)
+        self.addCleanup(engine.dispose)
+        session = create_test_session(engine)
+        self.addCleanup(session.close)
+        # scoring publishes a snapshot of file databases, which must not land in the db folder
+        patcher = mock.patch("rankr.actions.calculates.publish_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return session
+
+    def create_session_on_database(self):
+        return sessionmaker(bind=create_engine(self.database_url))()
+
+    def test_furus_left_without_priced_closed_positions_are_reset(self):
+        session = self.create_file_session()
+        furu = Furu(handle="MaxTradezz")
+        position = FuruTicker(
+            furu=furu,
+            ticker_symbol="GGGM",
+            date_entered=dt.date(2021, 1, 4),
+            date_closed=dt.date(2021, 2, 4),
+            price_entered=1.0,
+            price_closed=1.5,
+        )
+        # uncommitted positions of the caller's session are scored too
+        session.add(furu)
+        session.flush()
+        self.assertEqual([furu.id], update_furu_scores(session))
+        self.assertEqual(1, furu.total_trades_measured)
+
+        position.price_closed = None
+        session.commit()
+        self.assertEqual([furu.id], update_furu_scores(session))
+        for column in FURU_METRIC_COLUMNS:
+            self.assertIsNone(getattr(furu, column))
+
+    def test_multi_process_scores_match_set_based_scores(self):
+        session = self.create_file_session()
+        furus = [Furu(handle=f"Furu{i}") for i in range(3)]
+        for i, furu in enumerate(furus):
+            for position_values in self.position_values[i * 2 :]:
+                date_entered, date_closed, price_entered, price_closed = position_values
+                FuruTicker(
+                    furu=furu,
+                    ticker_symbol="GGGM",
+                    date_entered=date_entered,
+                    date_closed=date_closed,
+                    price_entered=price_entered,
+                    price_closed=price_closed,
+                )
+        session.add_all(furus)
+        session.commit()
+        furu_ids = [furu.id for furu in furus]
+
+        rows_by_furu_id = get_closed_position_rows_by_furu_id(session, furu_ids)
+        self.assertEqual(
+            [p for p in self.position_values if p[1] is not None],
+            sorted(rows_by_furu_id[furu_ids[0]]),
+        )
+        # the last furu has only an open position
+        self.assertNotIn(furu_ids[2], rows_by_furu_id)
+
+        expected = {}
+        update_furu_scores(session)
+        for furu in furus:
+            expected[furu.id] = [getattr(furu, column) for column in FURU_METRIC_COLUMNS]
+        session.execute(Furu.__table__.update().values(accuracy=None, total_trades_measured=None))
+        session.commit()
+
+        with mock.patch(
+            "rankr.actions.calculates.create_db_session_from_cfg",
+            self.create_session_on_database,
+        ):
+            self.assertEqual(furu_ids, update_furu_scores_multi_process(session, workers=2))
+        session.expire_all()
+        for furu in furus:
+            self.assertEqual(
+                expected[furu.id], [getattr(furu, column) for column in FURU_METRIC_COLUMNS]
+            )
@@ -0,0 +1,87 @@
+import datetime as dt
+import unittest
+
+import pandas as pd
+
+from rankr.actions.clones import (
+    find_furu_clones,
+    get_clone_clusters,
+    get_independent_furu_counts,
+    update_furu_clones,
+)
+from rankr.db.models import Furu, FuruClone, FuruTicker, Ticker
+from rankr.scripts.analytics.print_golden_portfolio import get_golden_portfolio
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestCloneDetection(unittest.TestCase):
+    def test_near_duplicate_furus_are_clustered(self):
+        calls = [f"S{i}:2021-{i % 52:02d}" for i in range(40)]
+        tokens = pd.DataFrame(
+            [(1, token) for token in calls]
+            # furu 2 mirrors all but two of furu 1's calls, furu 3 mirrors furu 2
+            + [(2, token) for token in calls[2:]]
+            + [(3, token) for token in calls[4:] + ["X:2021-01"]]
+            + [(4, f"O{i}:2021-01") for i in range(40)]
+            # too few positions to be compared
+            + [(5, token) for token in calls[:3]],
+            columns=["furu_id", "token"],
+        )
+        clones = find_furu_clones(tokens).set_index("furu_id")
+        self.assertEqual([1, 2, 3], sorted(clones.index))
+        self.assertEqual({1}, set(clones.cluster_id))
+        self.assertGreater(clones.loc[2, "max_similarity"], 0.8)
+
+    def test_clusters_are_connected_components(self):
+        clusters = get_clone_clusters([(4, 7, 0.9), (7, 2, 0.7), (5, 6, 0.8)])
+        clusters = clusters.set_index("furu_id").cluster_id.to_dict()
+        self.assertEqual({2: 2, 4: 2, 7: 2, 5: 5, 6: 5}, clusters)
+
+
+class TestCloneDeduplication(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furus = [
+            Furu(
+                handle=handle,
+                accuracy=0.6,
+                average_profit=0.1,
+                avg_holding_period=20,
+                total_trades_measured=40,
+                average_loss=-0.1,
+                performance_score=0.5,
+            )
+            for handle in ["MaxTradezz", "MaxTradezzCopy", "FuruForLife"]
+        ]
+        ticker = Ticker("GGGM")
+        for i, furu in enumerate(self.furus):
+            # the first two furus called the same symbols in the same weeks
+            symbols = ["LAPK", "TSLA", "AMC", "NFLX", "TWTR", "AAPL"]
+            for week, symbol in enumerate(symbols):
+                FuruTicker(
+                    furu=furu,
+                    ticker_symbol=symbol if i < 2 else f"{symbol}{i}",
+                    date_entered=dt.date(2021, 1, 4) + dt.timedelta(weeks=week),
+                    date_closed=dt.date(2021, 1, 8) + dt.timedelta(weeks=week),
+                )
+            FuruTicker(furu=furu, ticker=ticker, date_entered=dt.date(2021, 3, 1))
+        self.session.add_all(self.furus)
+        self.session.commit()
+
+    def test_clustered_furus_count_once_in_the_golden_portfolio(self):
+        self.assertEqual(2, update_furu_clones(self.session))
+        clustered_furu_ids = {clone.furu_id for clone in self.session.query(FuruClone)}
+        self.assertEqual({self.furus[0].id, self.furus[1].id}, clustered_furu_ids)
+
+        counts = get_independent_furu_counts(self.session).set_index("symbol")
+        self.assertEqual(2, counts.loc["GGGM", "independent_furu_count"])
+        self.assertEqual(2, counts.loc["GGGM", "independent_golden_count"])
+
+        today = dt.date(2021, 3, 10)
+        portfolio = get_golden_portfolio(self.session, today=today).set_index("symbol")
+        self.assertEqual(3, portfolio.loc["GGGM", "furu_count"])
+        portfolio = get_golden_portfolio(
+            self.session, deduplicate_clones=True, today=today
+        ).set_index("symbol")
+        self.assertEqual(2, portfolio.loc["GGGM", "furu_count"])
+        self.assertEqual(2, portfolio.loc["GGGM", "total_trader_count"])
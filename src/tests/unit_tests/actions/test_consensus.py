@@ -0,0 +1,98 @@
+import datetime as dt
+import json
+
+from rankr.actions.consensus import (
+    detect_consensus_entries,
+    find_consensus_windows,
+    get_consensus_entries,
+)
+from rankr.actions.rebuilds import replace_furu_positions
+from rankr.db.models import ConsensusDetectorState, Furu, FuruTicker
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestConsensusDetector(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furus = [
+            Furu(
+                handle=f"Golden{i}",
+                accuracy=0.6,
+                average_profit=0.1,
+                avg_holding_period=20,
+                total_trades_measured=40,
+                performance_score=0.5,
+            )
+            for i in range(4)
+        ]
+        self.furus.append(Furu(handle="JeffBezos", accuracy=0.4))
+        self.session.add_all(self.furus)
+        self.session.commit()
+
+    def enter(self, furu: Furu, date_entered: dt.date, symbol: str = "GGGM"):
+        self.session.add(
+            FuruTicker(furu=furu, ticker_symbol=symbol, date_entered=date_entered)
+        )
+        self.session.commit()
+
+    def test_windows_need_distinct_furus_within_window(self):
+        d = dt.date(2021, 1, 4)
+        entries = [(d, 1), (d, 1), (d + dt.timedelta(days=2), 2)]
+        self.assertEqual([], find_consensus_windows(entries, [d]))
+        entries.append((d + dt.timedelta(days=3), 3))
+        # the first entry falls out of the window ending at the third furu's entry
+        self.assertEqual([], find_consensus_windows(entries, [entries[-1][0]]))
+        entries.append((d + dt.timedelta(days=4), 1))
+        self.assertEqual(
+            [(d + dt.timedelta(days=2), d + dt.timedelta(days=4), [1, 2, 3])],
+            find_consensus_windows(entries, [entries[-1][0]]),
+        )
+
+    def test_events_are_emitted_once_per_consensus(self):
+        d = dt.date(2021, 1, 4)
+        self.enter(self.furus[0], d)
+        self.enter(self.furus[4], d)
+        self.enter(self.furus[1], d + dt.timedelta(days=1))
+        self.assertEqual([], detect_consensus_entries(self.session))
+
+        # late-arriving earlier entries still complete the window
+        self.enter(self.furus[2], d - dt.timedelta(days=1))
+        events = detect_consensus_entries(self.session)
+        self.assertEqual(1, len(events))
+        furu_ids = json.loads(events[0].furu_ids)
+        self.assertEqual(self.furus[:3], [self.session.get(Furu, i) for i in furu_ids])
+
+        # joining an ongoing consensus does not emit again, a new burst does
+        self.enter(self.furus[3], d + dt.timedelta(days=1))
+        self.assertEqual([], detect_consensus_entries(self.session))
+        later = d + dt.timedelta(days=30)
+        for furu in self.furus[:3]:
+            self.enter(furu, later)
+        self.assertEqual(1, len(detect_consensus_entries(self.session)))
+
+        frame = get_consensus_entries(self.session)
+        self.assertEqual(2, len(frame))
+        self.assertEqual("Golden0 Golden1 Golden2", frame.handles.iloc[0])
+
+    def test_rebuilt_positions_are_not_replayed(self):
+        d = dt.date(2021, 1, 4)
+        self.enter(self.furus[0], d)
+        self.enter(self.furus[1], d, "LAPK")
+        self.enter(self.furus[2], d, "LAPK")
+        self.assertEqual([], detect_consensus_entries(self.session))
+
+        # the rebuilt positions form a historical consensus and take the ids of replaced ones
+        furu_ids = [self.furus[1].id, self.furus[2].id]
+        rows = [
+            {"furu_id": furu_id, "ticker_symbol": "GGGM", "date_entered": d}
+            for furu_id in furu_ids
+        ]
+        replace_furu_positions(self.session, furu_ids, rows)
+        positions = self.session.query(FuruTicker).order_by(FuruTicker.id).all()
+        self.assertEqual([1, 2, 3], [position.id for position in positions])
+        self.assertEqual([], detect_consensus_entries(self.session))
+
+        # deleting positions through the session rewinds the watermark
+        self.session.delete(self.session.get(FuruTicker, 3))
+        self.session.commit()
+        self.assertEqual(2, self.session.get(ConsensusDetectorState, 1).last_position_id)
@@ -0,0 +1,167 @@
+import datetime as dt
+import importlib.util
+import pathlib
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from rankr.actions.exports import ParquetPartitionWriter, export_tables, get_row_hash
+from rankr.db.models import Furu, FuruTicker, FuruTweet, Ticker, TickerHistory
+from tests.mocks.base import InMemoryDbTestCase
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class TestParquetExports(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.export_path = pathlib.Path(self.export_dir.name, "exports")
+        self.archive_path = pathlib.Path(self.export_dir.name, "archive")
+
+        self.furu = Furu(handle="MaxTradezz")
+        ticker = Ticker(symbol="GGGM")
+        self.session.add_all([self.furu, ticker])
+        self.session.flush()
+        self.session.add_all(
+            [
+                FuruTicker(
+                    furu_id=self.furu.id,
+                    ticker_symbol="GGGM",
+                    date_entered=dt.date(2021, 4, 12),
+                    date_closed=dt.date(2021, 4, 30),
+                ),
+                FuruTicker(
+                    furu_id=self.furu.id,
+                    ticker_symbol="TSLA",
+                    date_entered=dt.date(2021, 5, 3),
+                ),
+                self.get_ticker_history(ticker.id, dt.date(2021, 4, 12), 10.0),
+                FuruTweet(
+                    furu_id=self.furu.id,
+                    tweets=[
+                        types.SimpleNamespace(
+                            id=1,
+                            created_at=dt.datetime(2021, 5, 1, 16),
+                            text="long $TSLA and $gggm",
+                        )
+                    ],
+                ),
+            ]
+        )
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.export_dir.cleanup()
+
+    @staticmethod
+    def get_ticker_history(ticker_id: int, date: dt.date, close: float) -> TickerHistory:
+        return TickerHistory(
+            date, high=close, open=close, close=close, low=close, volume=1, ticker_id=ticker_id
+        )
+
+    def export(self, **kwargs):
+        return export_tables(
+            self.session, self.export_path, archive_path=self.archive_path, **kwargs
+        )
+
+    def read(self, dataset: str):
+        import pyarrow.dataset
+
+        return (
+            pyarrow.dataset.dataset(
+                self.export_path.joinpath(dataset), partitioning="hive"
+            )
+            .to_table()
+            .to_pandas()
+        )
+
+    def test_exports_partitioned_datasets(self):
+        self.assertEqual(
+            {"furu": 1, "furu_ticker": 2, "ticker_history": 1, "mention": 2},
+            self.export(),
+        )
+        positions = self.read("furu_ticker").sort_values(by="id")
+        self.assertEqual(["2021-04", "2021-05"], list(positions.month))
+        self.assertEqual(dt.date(2021, 4, 30), positions.date_closed.iloc[0])
+        self.assertEqual(["GGGM", "TSLA"], sorted(self.read("mention").symbol))
+        self.assertEqual("MaxTradezz", self.read("furu").handle.iloc[0])
+
+    def test_exports_only_what_changed(self):
+        self.export()
+        self.assertEqual(
+            {"furu": 0, "furu_ticker": 0, "ticker_history": 0, "mention": 0},
+            self.export(),
+        )
+
+        position = self.session.query(FuruTicker).filter_by(ticker_symbol="TSLA").one()
+        position.date_closed = dt.date(2021, 5, 20)
+        self.session.add(self.get_ticker_history(1, dt.date(2021, 4, 13), 11.0))
+        self.session.commit()
+        # only the changed month of positions is rewritten, history rows are appended
+        self.assertEqual(
+            {"furu": 0, "furu_ticker": 1, "ticker_history": 1, "mention": 0},
+            self.export(),
+        )
+        positions = self.read("furu_ticker")
+        self.assertEqual(2, len(positions))
+        self.assertEqual(0, positions.date_closed.isna().sum())
+        self.assertEqual(2, len(self.read("ticker_history")))
+
+        self.assertEqual(
+            {"furu": 1, "furu_ticker": 2, "ticker_history": 2, "mention": 2},
+            self.export(full=True),
+        )
+
+    def test_same_length_edits_are_exported(self):
+        self.export()
+        position = self.session.query(FuruTicker).filter_by(ticker_symbol="TSLA").one()
+        position.ticker_symbol = "TSLY"
+        self.session.commit()
+        self.assertEqual(1, self.export()["furu_ticker"])
+        self.assertEqual(["GGGM", "TSLY"], sorted(self.read("furu_ticker").ticker_symbol))
+
+    def test_only_partitions_with_changed_fingerprints_are_hashed(self):
+        self.export()
+        position = self.session.query(FuruTicker).filter_by(ticker_symbol="TSLA").one()
+        position.price_entered = 700.0
+        self.session.commit()
+
+        with mock.patch(
+            "rankr.actions.exports.get_row_hash", wraps=get_row_hash
+        ) as row_hash:
+            self.assertEqual(1, self.export()["furu_ticker"])
+        # only the row of the changed month was hashed
+        self.assertEqual(1, row_hash.call_count)
+        self.assertEqual([700.0], self.read("furu_ticker").price_entered.dropna().tolist())
+
+    def test_emptied_partitions_are_kept_when_the_export_fails(self):
+        self.export()
+        april_position = self.session.query(FuruTicker).filter_by(ticker_symbol="GGGM").one()
+        self.session.delete(april_position)
+        self.session.query(FuruTicker).filter_by(ticker_symbol="TSLA").one().price_entered = 1.0
+        self.session.commit()
+
+        with mock.patch.object(
+            ParquetPartitionWriter, "write", side_effect=RuntimeError("Disk full")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.export()
+        self.assertEqual(2, len(self.read("furu_ticker")))
+
+        self.export()
+        self.assertEqual(["TSLA"], self.read("furu_ticker").ticker_symbol.tolist())
+
+    def test_failed_exports_leave_no_partial_files(self):
+        import pyarrow as pa
+
+        schema = pa.schema([pa.field("id", pa.int64())])
+        dataset_path = self.export_path.joinpath("dataset")
+        with self.assertRaises(RuntimeError):
+            with ParquetPartitionWriter(dataset_path, schema, "part-0.parquet") as writer:
+                writer.write("2021-04", pd.DataFrame({"id": [1, 2]}))
+                raise RuntimeError("Export failed")
+        self.assertEqual([], [p for p in dataset_path.rglob("*") if p.is_file()])
@@ -0,0 +1,106 @@
+import datetime as dt
+
+import pandas as pd
+
+from rankr.actions.calculates import calculate_furu_metrics_from_closed_positions
+from rankr.actions.leaderboards import PointInTimeScores, get_leaderboard_as_of
+from rankr.db.models import Furu, FuruTicker
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestPointInTimeScores(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu, self.other_furu = Furu(handle="MaxTradezz"), Furu(handle="MehYouKnow")
+        self.position_values = [
+            (dt.date(2021, 1, 4), dt.date(2021, 2, 4), 1.0, 1.5),
+            (dt.date(2021, 2, 8), dt.date(2021, 3, 1), 2.0, 1.0),
+            (dt.date(2021, 3, 8), dt.date(2021, 5, 3), 0.5, 2.0),
+        ]
+        for date_entered, date_closed, price_entered, price_closed in self.position_values:
+            FuruTicker(
+                furu=self.furu,
+                ticker_symbol="GGGM",
+                date_entered=date_entered,
+                date_closed=date_closed,
+                price_entered=price_entered,
+                price_closed=price_closed,
+            )
+        FuruTicker(
+            furu=self.other_furu,
+            ticker_symbol="LAPK",
+            date_entered=dt.date(2021, 1, 4),
+            date_closed=dt.date(2021, 4, 1),
+            price_entered=1.0,
+            price_closed=1.1,
+        )
+        self.session.add_all([self.furu, self.other_furu])
+        self.session.commit()
+        self.scores = PointInTimeScores.from_db(self.session)
+
+    def test_metrics_as_of_match_rescoring_positions_closed_by_then(self):
+        for as_of, closed_count in [
+            (dt.date(2021, 2, 4), 1),
+            (dt.date(2021, 3, 31), 2),
+            (dt.date(2022, 1, 1), 3),
+        ]:
+            metrics = self.scores.get_metrics_as_of(as_of).set_index("furu_id")
+            expected = calculate_furu_metrics_from_closed_positions(
+                self.position_values[:closed_count]
+            )
+            for column, value in expected.items():
+                if value is None:
+                    self.assertTrue(pd.isna(metrics.loc[self.furu.id, column]))
+                else:
+                    self.assertAlmostEqual(value, metrics.loc[self.furu.id, column])
+
+    def test_scores_are_rebuilt_only_after_the_data_changes(self):
+        self.assertIs(self.scores, PointInTimeScores.from_db(self.session))
+
+        FuruTicker(
+            furu=self.other_furu,
+            ticker_symbol="LAPK",
+            date_entered=dt.date(2021, 5, 3),
+            date_closed=dt.date(2021, 6, 1),
+            price_entered=1.0,
+            price_closed=0.9,
+        )
+        self.session.commit()
+        scores = PointInTimeScores.from_db(self.session)
+        self.assertIsNot(self.scores, scores)
+        metrics = scores.get_metrics_as_of(dt.date(2022, 1, 1)).set_index("furu_id")
+        self.assertEqual(2, metrics.loc[self.other_furu.id, "total_trades_measured"])
+
+    def test_furus_without_closed_positions_are_not_ranked(self):
+        self.assertTrue(self.scores.get_metrics_as_of(dt.date(2021, 1, 31)).empty)
+        metrics = self.scores.get_metrics_as_of(dt.date(2021, 3, 1))
+        self.assertEqual([self.furu.id], metrics.furu_id.tolist())
+
+    def test_leaderboard_as_of_applies_thresholds(self):
+        leaderboard = get_leaderboard_as_of(
+            self.session, dt.date(2022, 1, 1), self.scores
+        )
+        self.assertIsInstance(leaderboard, pd.DataFrame)
+        self.assertTrue(leaderboard.empty)
+
+        # enough winning trades held long enough to pass every threshold
+        ranked_furu = Furu(handle="FuruForLife")
+        for week in range(31):
+            date_entered = dt.date(2021, 1, 4) + dt.timedelta(weeks=week)
+            FuruTicker(
+                furu=ranked_furu,
+                ticker_symbol="NFLX",
+                date_entered=date_entered,
+                date_closed=date_entered + dt.timedelta(days=20),
+                price_entered=1.0,
+                price_closed=1.5,
+            )
+        self.session.add(ranked_furu)
+        self.session.commit()
+
+        leaderboard = get_leaderboard_as_of(self.session, dt.date(2022, 1, 1))
+        self.assertEqual([ranked_furu.id], leaderboard.furu_id.tolist())
+        self.assertEqual(["FuruForLife"], leaderboard.handle.tolist())
+        # not yet ranked before its 31st trade closed
+        leaderboard = get_leaderboard_as_of(self.session, dt.date(2021, 7, 31))
+        self.assertTrue(leaderboard.empty)
@@ -0,0 +1,53 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from rankr.actions.marks import get_latest_closes, mark_open_positions_to_market
+from rankr.db.models import Furu, FuruPositionMark, FuruTicker
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestMarkToMarket(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        furu = Furu(handle="MaxTradezz")
+        self.open_position = FuruTicker(
+            furu=furu, ticker_symbol="GGGM", date_entered=dt.date(2021, 1, 4), price_entered=2.0
+        )
+        self.unpriced_position = FuruTicker(
+            furu=furu, ticker_symbol="LAPK", date_entered=dt.date(2021, 1, 4)
+        )
+        self.closed_position = FuruTicker(
+            furu=furu,
+            ticker_symbol="GGGM",
+            date_entered=dt.date(2020, 1, 6),
+            date_closed=dt.date(2020, 2, 6),
+            price_entered=1.0,
+            price_closed=1.5,
+        )
+        self.session.add(furu)
+        self.session.commit()
+        self.price_matrix = pd.DataFrame(
+            {"GGGM": [2.5, 3.0, np.nan], "LAPK": [1.0, 1.1, 1.2], "BNMM": np.nan},
+            index=pd.to_datetime(["2021-03-01", "2021-03-02", "2021-03-03"]),
+        )
+
+    def test_latest_closes_skip_missing_prices(self):
+        closes = get_latest_closes(self.price_matrix).set_index("symbol")
+        self.assertEqual(["GGGM", "LAPK"], closes.index.tolist())
+        self.assertEqual(3.0, closes.loc["GGGM", "price_marked"])
+        self.assertEqual(dt.date(2021, 3, 2), closes.loc["GGGM", "date_marked"])
+        self.assertEqual(1.2, closes.loc["LAPK", "price_marked"])
+
+    def test_only_open_priced_positions_are_marked(self):
+        self.assertEqual(1, mark_open_positions_to_market(self.session, self.price_matrix))
+        mark = self.session.query(FuruPositionMark).one()
+        self.assertEqual(self.open_position.id, mark.position_id)
+        self.assertAlmostEqual(0.5, mark.unrealized_return)
+
+        # marks are replaced on every run
+        self.open_position.date_closed = dt.date(2021, 3, 4)
+        self.session.commit()
+        self.assertEqual(0, mark_open_positions_to_market(self.session, self.price_matrix))
+        self.assertEqual(0, self.session.query(FuruPositionMark).count())
@@ -0,0 +1,54 @@
+import datetime as dt
+import unittest
+
+from rankr.actions.positions import PositionInterval, advance_positions
+
+
+class TestPositionEngine(unittest.TestCase):
+    def setUp(self) -> None:
+        self.today = dt.date(2021, 6, 1)
+
+    def test_silence_closes_and_reopens_positions(self):
+        changes = advance_positions(
+            "GGGM",
+            [dt.date(2021, 1, 2), dt.date(2021, 1, 6), dt.date(2021, 5, 20)],
+            today=self.today,
+            days_silence_for_position_exit=30,
+            days_taken_to_exit_position=2,
+        )
+        self.assertIsNone(changes.existing)
+        self.assertEqual(
+            [
+                PositionInterval(
+                    "GGGM", dt.date(2021, 1, 4), dt.date(2021, 1, 6), dt.date(2021, 1, 8)
+                ),
+                PositionInterval("GGGM", dt.date(2021, 5, 20), dt.date(2021, 5, 20)),
+            ],
+            changes.opened,
+        )
+        self.assertEqual([changes.opened[0]], changes.closed)
+        self.assertEqual(changes.opened[1], changes.open_position)
+
+    def test_existing_open_position_is_extended_or_closed(self):
+        open_position = PositionInterval("GGGM", dt.date(2021, 5, 3), dt.date(2021, 5, 10))
+        changes = advance_positions(
+            "GGGM",
+            [dt.date(2021, 5, 25)],
+            open_position,
+            today=self.today,
+            days_silence_for_position_exit=30,
+        )
+        self.assertEqual(dt.date(2021, 5, 25), changes.existing.date_last_mentioned)
+        self.assertEqual([], changes.opened)
+        self.assertEqual(changes.existing, changes.open_position)
+
+        changes = advance_positions(
+            "GGGM",
+            [],
+            open_position,
+            today=dt.date(2021, 7, 1),
+            days_silence_for_position_exit=30,
+            days_taken_to_exit_position=2,
+        )
+        self.assertEqual(dt.date(2021, 5, 12), changes.existing.date_closed)
+        self.assertIsNone(changes.open_position)
@@ -0,0 +1,184 @@
+import datetime as dt
+import types
+
+from rankr.actions.rebuilds import (
+    get_raw_position_rows,
+    get_shard_position_rows,
+    replace_furu_positions,
+    replace_shard_positions,
+)
+from rankr.db.models import (
+    Furu,
+    FuruPositionCursor,
+    FuruPositionMark,
+    FuruStats,
+    FuruTicker,
+    FuruTweet,
+    Ticker,
+)
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestShardedRebuild(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu = Furu(handle="MaxTradezz")
+        self.furu.positions.append(
+            FuruTicker(
+                ticker_symbol="LAPK",
+                date_entered=dt.date(2020, 1, 6),
+                date_closed=dt.date(2020, 2, 6),
+                price_entered=1.0,
+                price_closed=1.5,
+            )
+        )
+        self.session.add(self.furu)
+        self.session.commit()
+
+    def test_rows_follow_silence_rules(self):
+        today = dt.date.today()
+        recent = today - dt.timedelta(days=3)
+        rows = get_raw_position_rows(
+            self.furu.id,
+            "GGGM",
+            # a saturday mention enters on monday, the long silence closes the position
+            [dt.date(2021, 1, 2), dt.date(2021, 1, 6), recent],
+            today,
+        )
+        self.assertEqual(2, len(rows))
+        self.assertEqual(dt.date(2021, 1, 4), rows[0]["date_entered"])
+        self.assertEqual(
+            dt.date(2021, 1, 6) + dt.timedelta(days=Furu.DAYS_TAKEN_TO_EXIT_POSITION),
+            rows[0]["date_closed"],
+        )
+        self.assertEqual(dt.date(2021, 1, 6), rows[0]["date_last_mentioned"])
+        self.assertIsNone(rows[1]["date_closed"])
+        self.assertEqual(recent, rows[1]["date_last_mentioned"])
+
+    def test_shard_rows_combine_all_chunks_of_each_furu(self):
+        other_furu = Furu(handle="MehYouKnow")
+        self.session.add(other_furu)
+        self.session.flush()
+        today = dt.date.today()
+        recent = dt.datetime.combine(today - dt.timedelta(days=3), dt.time(16))
+        # chunks are stored interleaved across furus
+        for furu_id, text in [
+            (self.furu.id, "$GGGM to the moon"),
+            (other_furu.id, "$LAPK"),
+            (self.furu.id, "adding $LAPK"),
+        ]:
+            tweet = types.SimpleNamespace(id=1, created_at=recent, text=text)
+            self.session.add(FuruTweet(furu_id=furu_id, tweets=[tweet]))
+        self.session.commit()
+
+        rows = get_shard_position_rows(
+            self.session, [self.furu.id, other_furu.id], include_archived=False
+        )
+        self.assertEqual(
+            [(self.furu.id, "GGGM"), (self.furu.id, "LAPK"), (other_furu.id, "LAPK")],
+            sorted((row["furu_id"], row["ticker_symbol"]) for row in rows),
+        )
+
+    def test_replace_positions_rebuilds_derived_tables(self):
+        today = dt.date.today()
+        rows = get_raw_position_rows(
+            self.furu.id, "GGGM", [today - dt.timedelta(days=3)], today
+        )
+        replace_furu_positions(self.session, [self.furu.id], rows)
+
+        positions = self.session.query(FuruTicker).all()
+        self.assertEqual(["GGGM"], [p.ticker_symbol for p in positions])
+        # the replaced closed position no longer counts towards the furu's stats
+        self.assertEqual(0, self.session.query(FuruStats).count())
+        cursor = self.session.query(FuruPositionCursor).one()
+        self.assertEqual(positions[0].id, cursor.open_position_id)
+
+    def test_rebuilt_positions_keep_stored_prices(self):
+        ticker = Ticker(symbol="LAPK")
+        open_position = FuruTicker(
+            ticker=ticker,
+            ticker_symbol="LAPK",
+            date_entered=dt.date(2020, 3, 2),
+            price_entered=2.0,
+        )
+        self.furu.positions.append(open_position)
+        self.session.flush()
+        self.session.add(
+            FuruPositionMark(
+                position_id=open_position.id,
+                furu_id=self.furu.id,
+                symbol="LAPK",
+                date_marked=dt.date(2020, 3, 3),
+                price_marked=3.0,
+                unrealized_return=0.5,
+            )
+        )
+        self.session.commit()
+        closed_position_id = (
+            self.session.query(FuruTicker.id).filter(FuruTicker.ticker_id.is_(None)).scalar()
+        )
+
+        rows = [
+            {
+                "furu_id": self.furu.id,
+                "ticker_symbol": "LAPK",
+                "date_entered": dt.date(2020, 1, 6),
+                "date_closed": dt.date(2020, 2, 6),
+            },
+            {
+                "furu_id": self.furu.id,
+                "ticker_symbol": "LAPK",
+                "date_entered": dt.date(2020, 3, 2),
+                "date_closed": None,
+            },
+            {
+                "furu_id": self.furu.id,
+                "ticker_symbol": "GGGM",
+                "date_entered": dt.date(2020, 3, 2),
+                "date_closed": None,
+            },
+        ]
+        replace_furu_positions(self.session, [self.furu.id], rows)
+        self.session.expire_all()
+
+        closed, kept_open, new = self.session.query(FuruTicker).order_by(
+            FuruTicker.ticker_symbol.desc(), FuruTicker.date_entered
+        )
+        self.assertEqual(
+            (closed_position_id, 1.0, 1.5, 0.5),
+            (closed.id, closed.price_entered, closed.price_closed, closed.realized_return),
+        )
+        self.assertEqual(
+            (open_position.id, ticker.id, 2.0),
+            (kept_open.id, kept_open.ticker_id, kept_open.price_entered),
+        )
+        self.assertIsNone(new.price_entered)
+        # the mark of the position still open is kept
+        self.assertEqual(
+            [open_position.id], [m.position_id for m in self.session.query(FuruPositionMark)]
+        )
+
+        # a position closing on another date is priced again
+        rows[0]["date_closed"] = dt.date(2020, 2, 10)
+        replace_furu_positions(self.session, [self.furu.id], rows[:1])
+        position = self.session.query(FuruTicker).one()
+        self.assertEqual((1.0, None), (position.price_entered, position.price_closed))
+        self.assertEqual(0, self.session.query(FuruPositionMark).count())
+
+    def test_failed_shard_writes_are_returned_and_left_untouched(self):
+        other_furu = Furu(handle="MehYouKnow")
+        self.session.add(other_furu)
+        self.session.commit()
+        today = dt.date.today()
+        rows = get_raw_position_rows(
+            other_furu.id, "GGGM", [today - dt.timedelta(days=3)], today
+        )
+        bad_rows = [{"furu_id": self.furu.id, "ticker_symbol": "GGGM", "no_column": 1}]
+
+        total_positions, failed_shards = replace_shard_positions(
+            self.session, [([self.furu.id], bad_rows), ([other_furu.id], rows)]
+        )
+        self.assertEqual(1, total_positions)
+        self.assertEqual([[self.furu.id]], failed_shards)
+        positions = self.session.query(FuruTicker).order_by(FuruTicker.furu_id).all()
+        self.assertEqual(["LAPK", "GGGM"], [p.ticker_symbol for p in positions])
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from rankr.actions.risks import calculate_risk_metrics, get_furu_risk_frame
+
+
+class TestRiskFunctions(unittest.TestCase):
+    def test_risk_metrics_of_known_curve(self):
+        # inactive day, then +10%, -50%, +20%, +100%
+        metrics = calculate_risk_metrics(np.array([[np.nan, 0.1, -0.5, 0.2, 1.0]]))
+
+        self.assertEqual(4, metrics["trading_days"][0])
+        self.assertAlmostEqual(1.1 * 0.5 * 1.2 * 2.0 - 1, metrics["total_return"][0])
+        self.assertAlmostEqual(-0.5, metrics["max_drawdown"][0])
+        self.assertEqual(2, metrics["max_days_under_water"][0])
+        self.assertAlmostEqual(0.5, metrics["share_days_under_water"][0])
+        returns = np.array([0.1, -0.5, 0.2, 1.0])
+        self.assertAlmostEqual(
+            returns.mean() / returns.std(ddof=1) * np.sqrt(252), metrics["sharpe_ratio"][0]
+        )
+        self.assertAlmostEqual(
+            returns.mean() / 0.25 * np.sqrt(252), metrics["sortino_ratio"][0]
+        )
+
+    def test_equal_weight_book_of_concurrent_positions(self):
+        dates = np.array(
+            ["2021-01-04", "2021-01-05", "2021-01-06", "2021-01-07"], dtype="datetime64[D]"
+        )
+        price_arrays = {
+            "GGGM": {"date": dates, "close": np.array([1.0, 1.1, 1.21, 1.21])},
+            "LAPK": {"date": dates, "close": np.array([2.0, 2.0, 1.0, 1.0])},
+        }
+        positions = pd.DataFrame(
+            {
+                "furu_id": [1, 1, 2],
+                "symbol": ["GGGM", "LAPK", "LAPK"],
+                "date_entered": pd.to_datetime(["2021-01-04", "2021-01-05", "2021-01-04"]),
+                "date_closed": pd.to_datetime(["2021-01-06", None, "2021-01-05"]),
+            }
+        )
+        risks = get_furu_risk_frame(positions, price_arrays).set_index("furu_id")
+
+        # furu 1: +10% alone, then (+10% - 50%) / 2, then flat LAPK
+        self.assertEqual(3, risks.loc[1, "trading_days"])
+        self.assertAlmostEqual(1.1 * 0.8 - 1, risks.loc[1, "total_return"])
+        self.assertAlmostEqual(-0.2, risks.loc[1, "max_drawdown"])
+        # furu 2 only held a single flat day
+        self.assertEqual(1, risks.loc[2, "trading_days"])
+        self.assertTrue(np.isnan(risks.loc[2, "sharpe_ratio"]))
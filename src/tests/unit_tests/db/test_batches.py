@@ -0,0 +1,69 @@
+import pathlib
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from rankr.db import enable_sqlite_savepoints, enable_sqlite_write_ahead_log
+from rankr.db.batches import BatchUnitOfWork
+from rankr.db.models import Base, Furu
+from tests.mocks.base import create_test_session
+
+
+class TestBatchUnitOfWork(unittest.TestCase):
+    def setUp(self) -> None:
+        self.session = create_test_session(enable_sqlite_savepoints(create_engine("sqlite://")))
+
+    def test_failed_item_only_rolls_back_its_own_changes(self):
+        handles = ["MaxTradezz", "JibbyTrading", "MehYouKnow", "FuruForLife", "DBTrades"]
+        with BatchUnitOfWork(self.session, "test", batch_size=2) as uow:
+            for handle in handles:
+                with uow.item(handle):
+                    self.session.add(Furu(handle=handle))
+                    if handle == "MehYouKnow":
+                        raise ValueError("Bad furu")
+
+        self.session.rollback()
+        saved_handles = {furu.handle for furu in self.session.query(Furu).all()}
+        self.assertEqual(set(handles) - {"MehYouKnow"}, saved_handles)
+        self.assertEqual(["MehYouKnow"], uow.failed_item_ids)
+        self.assertEqual(3, uow.report["commits"])
+        self.assertEqual(5, uow.report["items_processed"])
+
+    def test_exception_outside_items_rolls_back_uncommitted_batch(self):
+        with self.assertRaises(RuntimeError):
+            with BatchUnitOfWork(self.session, "test", batch_size=2) as uow:
+                for handle in ["MaxTradezz", "JibbyTrading", "MehYouKnow"]:
+                    with uow.item(handle):
+                        self.session.add(Furu(handle=handle))
+                raise RuntimeError("Stage failed")
+
+        saved_handles = {furu.handle for furu in self.session.query(Furu).all()}
+        self.assertEqual({"MaxTradezz", "JibbyTrading"}, saved_handles)
+
+
+class TestSqliteLocking(unittest.TestCase):
+    def test_open_read_transaction_does_not_block_batch_commits(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(
+                f"sqlite:///{pathlib.Path(directory, 'fururankr.db')}",
+                connect_args={"timeout": 0.1},
+            )
+            enable_sqlite_write_ahead_log(enable_sqlite_savepoints(engine))
+            Base.metadata.create_all(engine)
+            reader, writer = sessionmaker(bind=engine)(), sessionmaker(bind=engine)()
+            try:
+                self.assertEqual(0, reader.query(Furu).count())
+                with BatchUnitOfWork(writer, "test", batch_size=1) as uow:
+                    with uow.item("MaxTradezz"):
+                        writer.add(Furu(handle="MaxTradezz"))
+                self.assertEqual([], uow.failed_item_ids)
+                # the reader keeps its consistent view until its transaction ends
+                self.assertEqual(0, reader.query(Furu).count())
+                reader.rollback()
+                self.assertEqual(1, reader.query(Furu).count())
+            finally:
+                reader.close()
+                writer.close()
+                engine.dispose()
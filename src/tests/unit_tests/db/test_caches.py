@@ -0,0 +1,68 @@
+import pathlib
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from rankr.db import enable_sqlite_savepoints, enable_sqlite_write_ahead_log
+from rankr.db.caches import ReportCache, get_data_version
+from rankr.db.models import Base, Furu
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestReportCache(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.cache_dir.name)
+        self.computed = 0
+
+    def tearDown(self) -> None:
+        self.cache_dir.cleanup()
+
+    def count_furus(self, session, offset: int = 0) -> int:
+        self.computed += 1
+        return session.query(Furu).count() + offset
+
+    def test_commits_to_versioned_tables_bump_the_data_version(self):
+        self.assertEqual(0, get_data_version(self.session))
+        self.session.add(Furu(handle="MaxTradezz"))
+        self.session.commit()
+        self.assertEqual(1, get_data_version(self.session))
+
+    def test_reports_are_served_until_the_data_changes(self):
+        cache = ReportCache(self.cache_path)
+        self.assertEqual(0, cache.get_report(self.session, "furus", self.count_furus))
+        self.assertEqual(0, cache.get_report(self.session, "furus", self.count_furus))
+        self.assertEqual(1, self.computed)
+        # arguments are part of the key
+        self.assertEqual(2, cache.get_report(self.session, "furus", self.count_furus, 2))
+        self.assertEqual(2, self.computed)
+
+        self.session.add(Furu(handle="MaxTradezz"))
+        self.session.commit()
+        self.assertEqual(1, cache.get_report(self.session, "furus", self.count_furus))
+        self.assertEqual(3, self.computed)
+
+        # results survive in the disk cache
+        cache = ReportCache(self.cache_path)
+        self.assertEqual(1, cache.get_report(self.session, "furus", self.count_furus))
+        self.assertEqual(3, self.computed)
+
+    def test_data_version_is_read_past_the_session_transaction(self):
+        db_path = self.cache_path.joinpath("fururankr.db")
+        engine = create_engine(f"sqlite:///{db_path}")
+        enable_sqlite_write_ahead_log(enable_sqlite_savepoints(engine))
+        Base.metadata.create_all(engine)
+        reader, writer = sessionmaker(bind=engine)(), sessionmaker(bind=engine)()
+        try:
+            self.assertEqual(0, reader.query(Furu).count())
+            self.assertEqual(0, get_data_version(reader))
+            writer.add(Furu(handle="MaxTradezz"))
+            writer.commit()
+            # the reader's transaction is still open on the data before the commit
+            self.assertEqual(1, get_data_version(reader))
+        finally:
+            reader.close()
+            writer.close()
+            engine.dispose()
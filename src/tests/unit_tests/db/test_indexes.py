@@ -0,0 +1,70 @@
+import datetime as dt
+
+from rankr.db.models import Furu, FuruTicker
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestPositionIntervalIndex(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu = Furu(handle="MaxTradezz")
+        self.closed = FuruTicker(
+            furu=self.furu,
+            ticker_symbol="GGGM",
+            date_entered=dt.date(2021, 1, 4),
+            date_closed=dt.date(2021, 2, 4),
+        )
+        self.open = FuruTicker(
+            furu=self.furu, ticker_symbol="GGGM", date_entered=dt.date(2021, 3, 1)
+        )
+        self.other_symbol = FuruTicker(
+            furu=self.furu, ticker_symbol="LAPK", date_entered=dt.date(2021, 1, 1)
+        )
+        self.session.add(self.furu)
+        self.session.commit()
+
+    def test_stabbing_queries(self):
+        index = self.furu.position_index
+        self.assertEqual([], index.get_positions_at("GGGM", dt.date(2021, 1, 1)))
+        self.assertEqual([self.closed], index.get_positions_at("GGGM", dt.date(2021, 2, 4)))
+        self.assertEqual([], index.get_positions_at("GGGM", dt.date(2021, 2, 10)))
+        self.assertEqual([self.open], index.get_positions_at("GGGM", dt.date(2022, 1, 1)))
+        self.assertEqual(
+            [self.other_symbol], index.get_positions_at("LAPK", dt.date(2021, 2, 10))
+        )
+
+    def test_index_follows_opened_and_redated_positions(self):
+        index = self.furu.position_index
+        new_position = FuruTicker(
+            furu=self.furu, ticker_symbol="GGGM", date_entered=dt.date(2021, 2, 8)
+        )
+        self.assertEqual(
+            [new_position], index.get_positions_at("GGGM", dt.date(2021, 2, 10))
+        )
+
+        new_position.date_closed = dt.date(2021, 2, 9)
+        self.assertEqual([], index.get_positions_at("GGGM", dt.date(2021, 2, 10)))
+        self.assertIs(
+            self.furu.get_furu_position_by_symbol_and_entry_date(
+                "GGGM", dt.date(2021, 2, 9)
+            ),
+            new_position,
+        )
+
+    def test_merged_positions_leave_the_index(self):
+        self.closed.close_raw_position(dt.date(2021, 3, 5))
+        self.assertEqual(dt.date(2021, 3, 5), self.closed.date_closed)
+        self.assertNotIn(self.open, self.furu.positions)
+        self.assertEqual(
+            [self.closed],
+            self.furu.position_index.get_positions_at("GGGM", dt.date(2021, 3, 2)),
+        )
+
+    def test_index_is_rebuilt_after_reload(self):
+        index = self.furu.position_index
+        self.session.expire(self.furu)
+        self.assertIsNot(index, self.furu.position_index)
+        self.assertEqual(
+            [self.open],
+            self.furu.position_index.get_positions_at("GGGM", dt.date(2021, 3, 1)),
+        )
@@ -0,0 +1,318 @@
+import datetime as dt
+from unittest import mock
+
+from sqlalchemy import create_engine, text
+
+from rankr.actions.calculates import (
+    calculate_furu_metrics_from_closed_positions,
+    update_furu_window_scores,
+)
+from rankr.actions.creates import create_furu_positions_entries_exits_from_tweets
+from rankr.db import enable_sqlite_savepoints, upgrade_db_schema
+from rankr.db.batches import BatchUnitOfWork
+from rankr.db.models import (
+    Furu,
+    FuruPositionCursor,
+    FuruStats,
+    FuruTicker,
+    FuruWindowStats,
+    Ticker,
+    TickerConsensus,
+)
+from tests.mocks.base import InMemoryDbTestCase, create_test_session
+
+
+class TestFuruStats(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu = Furu(handle="MaxTradezz")
+        self.positions = [
+            FuruTicker(
+                furu=self.furu,
+                ticker_symbol="GGGM",
+                date_entered=dt.date(2021, 1, 4),
+                date_closed=dt.date(2021, 2, 4),
+                price_entered=1.0,
+                price_closed=1.5,
+            ),
+            FuruTicker(
+                furu=self.furu,
+                ticker_symbol="LAPK",
+                date_entered=dt.date(2021, 2, 8),
+                date_closed=dt.date(2021, 3, 1),
+                price_entered=2.0,
+                price_closed=1.0,
+            ),
+            FuruTicker(
+                furu=self.furu,
+                ticker_symbol="BNMM",
+                date_entered=dt.date(2021, 3, 8),
+            ),
+        ]
+        self.session.add(self.furu)
+        self.session.commit()
+
+    def get_stats(self) -> tuple:
+        stats = self.session.query(FuruStats).get(self.furu.id)
+        return tuple(getattr(stats, column) for column in FuruStats.STAT_COLUMNS)
+
+    def test_stats_follow_inserted_positions(self):
+        self.assertEqual((1, 1, 0.5, -0.5, 52), self.get_stats())
+
+    def test_stats_follow_closed_repriced_and_deleted_positions(self):
+        self.positions[2].date_closed = dt.date(2021, 3, 18)
+        self.positions[2].price_entered = 4.0
+        self.positions[2].price_closed = 5.0
+        self.session.commit()
+        self.assertEqual((2, 1, 0.75, -0.5, 62), self.get_stats())
+
+        self.positions[1].price_closed = 3.0
+        self.session.commit()
+        self.assertEqual((3, 0, 1.25, 0.0, 62), self.get_stats())
+
+        self.session.delete(self.positions[0])
+        self.session.commit()
+        self.assertEqual((2, 0, 0.75, 0.0, 31), self.get_stats())
+
+        incremental = self.get_stats()
+        FuruStats.rebuild(self.session.connection())
+        self.session.commit()
+        self.assertEqual(incremental, self.get_stats())
+
+
+class TestFuruPositionCursor(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu = Furu(handle="MaxTradezz")
+        self.session.add(self.furu)
+        self.session.commit()
+
+    def mention(self, *dates: dt.date):
+        tweets = [mock.Mock(created_at=dt.datetime.combine(d, dt.time())) for d in dates]
+        create_furu_positions_entries_exits_from_tweets(self.furu, "$GGGM", tweets)
+        self.session.commit()
+
+    def test_cursor_only_processes_new_mentions(self):
+        today = dt.date.today()
+        self.mention(today - dt.timedelta(days=20), today - dt.timedelta(days=10))
+        cursor = self.furu.position_cursors["GGGM"]
+        position = cursor.open_position
+        self.assertIsNotNone(position)
+
+        # already processed mentions are skipped, new ones extend the open position
+        self.mention(today - dt.timedelta(days=10), today - dt.timedelta(days=5))
+        self.assertIs(position, cursor.open_position)
+        self.assertEqual(today - dt.timedelta(days=5), position.date_last_mentioned)
+        self.assertEqual(today - dt.timedelta(days=5), cursor.date_last_mentioned)
+        self.assertEqual(1, len(self.furu.positions))
+
+    def test_cursor_opens_new_position_after_silence(self):
+        self.mention(dt.date(2021, 1, 4), dt.date(2021, 1, 6))
+        cursor = self.furu.position_cursors["GGGM"]
+        self.assertIsNone(cursor.open_position)
+        first_position = self.furu.positions[0]
+        self.assertEqual(
+            dt.date(2021, 1, 6) + dt.timedelta(days=Furu.DAYS_TAKEN_TO_EXIT_POSITION),
+            first_position.date_closed,
+        )
+
+        self.mention(dt.date.today())
+        self.assertIsNot(first_position, cursor.open_position)
+        self.assertGreaterEqual(cursor.open_position.date_entered, dt.date.today())
+        self.assertEqual(2, len(self.furu.positions))
+
+    def test_rebuild_matches_incremental_cursor(self):
+        self.mention(dt.date(2021, 1, 4), dt.date(2021, 6, 1))
+        cursor = self.furu.position_cursors["GGGM"]
+        expected = (cursor.open_position_id, cursor.date_last_mentioned)
+
+        FuruPositionCursor.rebuild(self.session.connection())
+        self.session.expire_all()
+        cursor = self.session.query(FuruPositionCursor).one()
+        self.assertEqual(expected, (cursor.open_position_id, cursor.date_last_mentioned))
+
+
+class TestFuruWindowStats(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furu = Furu(handle="MaxTradezz")
+        self.session.add(self.furu)
+        for days_closed_ago, price_closed in [(400, 2.0), (100, 0.5), (60, 1.5), (10, 3.0)]:
+            self.add_position(dt.date(2022, 1, 1) - dt.timedelta(days=days_closed_ago), price_closed)
+        self.session.commit()
+
+    def add_position(self, date_closed: dt.date, price_closed: float) -> FuruTicker:
+        return FuruTicker(
+            furu=self.furu,
+            ticker_symbol="GGGM",
+            date_entered=date_closed - dt.timedelta(days=20),
+            date_closed=date_closed,
+            price_entered=1.0,
+            price_closed=price_closed,
+        )
+
+    def assert_windows_match_positions(self, as_of: dt.date):
+        update_furu_window_scores(self.session, as_of)
+        self.session.commit()
+        for window_days in FuruWindowStats.WINDOWS_DAYS:
+            closed_positions = [
+                (p.date_entered, p.date_closed, p.price_entered, p.price_closed)
+                for p in self.furu.positions
+                if as_of - dt.timedelta(days=window_days) < p.date_closed <= as_of
+            ]
+            expected = calculate_furu_metrics_from_closed_positions(closed_positions)
+            window = self.session.query(FuruWindowStats).get((self.furu.id, window_days))
+            self.session.refresh(window)
+            self.assertEqual(as_of, window.as_of_date)
+            self.assertEqual(0, window.is_stale)
+            self.assertEqual(
+                expected.get("total_trades_measured", 0),
+                window.trades_won + window.trades_lost,
+            )
+            for column in ["accuracy", "average_profit", "performance_score"]:
+                if expected.get(column) is None:
+                    self.assertIsNone(getattr(window, column))
+                else:
+                    self.assertAlmostEqual(expected[column], getattr(window, column))
+
+    def test_windows_follow_closes_and_advances(self):
+        self.assert_windows_match_positions(dt.date(2022, 1, 1))
+
+        # a late close inside the windows and a repriced one are applied on flush
+        self.add_position(dt.date(2021, 12, 20), 0.8)
+        self.furu.positions[1].price_closed = 1.2
+        self.session.commit()
+        self.assert_windows_match_positions(dt.date(2022, 1, 1))
+
+        self.assert_windows_match_positions(dt.date(2022, 2, 15))
+        self.assert_windows_match_positions(dt.date(2023, 6, 1))
+
+
+class TestTickerConsensus(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.golden_furu = Furu(
+            handle="MaxTradezz",
+            accuracy=0.6,
+            average_profit=0.2,
+            avg_holding_period=20,
+            total_trades_measured=40,
+            performance_score=0.5,
+        )
+        self.furu = Furu(handle="JeffBezos", accuracy=0.4)
+        self.ticker = Ticker("GGGM")
+        self.golden_position = FuruTicker(
+            furu=self.golden_furu,
+            ticker=self.ticker,
+            date_entered=dt.date(2021, 1, 4),
+            price_entered=2.0,
+        )
+        self.position = FuruTicker(
+            furu=self.furu,
+            ticker=self.ticker,
+            date_entered=dt.date(2021, 1, 5),
+            price_entered=3.0,
+        )
+        self.session.add_all([self.golden_furu, self.furu])
+        self.session.commit()
+
+    def get_consensus(self) -> TickerConsensus:
+        self.session.expire_all()
+        return self.session.query(TickerConsensus).one_or_none()
+
+    def test_consensus_follows_positions_and_golden_eligibility(self):
+        consensus = self.get_consensus()
+        self.assertEqual(2, consensus.open_furu_count)
+        self.assertEqual(1, consensus.golden_furu_count)
+        self.assertEqual("MaxTradezz", consensus.handles)
+        self.assertEqual(2.0, consensus.max_price_paid)
+
+        self.furu.accuracy, self.furu.performance_score = 0.7, 0.4
+        self.furu.total_trades_measured, self.furu.average_holding_period_days = 50, 15
+        self.session.commit()
+        consensus = self.get_consensus()
+        self.assertEqual(2, consensus.golden_furu_count)
+        self.assertEqual(dt.date(2021, 1, 5), consensus.latest_entry)
+        self.assertAlmostEqual(0.65, consensus.accuracy)
+
+        self.golden_position.date_closed = dt.date(2021, 2, 1)
+        self.session.delete(self.position)
+        self.session.commit()
+        self.assertIsNone(self.get_consensus())
+
+    def test_consensus_is_rebuilt_once_per_commit(self):
+        session = create_test_session(enable_sqlite_savepoints(create_engine("sqlite://")))
+        furu = Furu(handle="MaxTradezz")
+        session.add(furu)
+        session.commit()
+
+        with mock.patch.object(
+            TickerConsensus, "rebuild", wraps=TickerConsensus.rebuild
+        ) as rebuild:
+            with BatchUnitOfWork(session, "test", batch_size=3) as uow:
+                for symbol in ["GGGM", "LAPK", "BNMM"]:
+                    with uow.item(symbol):
+                        FuruTicker(
+                            furu=furu, ticker=Ticker(symbol), date_entered=dt.date(2021, 1, 4)
+                        )
+                        session.flush()
+            self.assertEqual(1, rebuild.call_count)
+            self.assertEqual(3, len(rebuild.call_args.args[1]))
+
+            # changes rolled back are forgotten
+            FuruTicker(furu=furu, ticker=Ticker("NFLX"), date_entered=dt.date(2021, 1, 4))
+            session.flush()
+            session.rollback()
+            session.commit()
+            self.assertEqual(1, rebuild.call_count)
+        self.assertEqual(3, session.query(TickerConsensus).count())
+        session.close()
+
+    def test_rebuild_matches_maintained_consensus(self):
+        maintained = self.get_consensus().to_dict()
+        TickerConsensus.rebuild(self.session.connection())
+        self.session.commit()
+        self.assertEqual(maintained, self.get_consensus().to_dict())
+
+
+class TestRealizedReturn(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.position = FuruTicker(
+            furu=Furu(handle="MaxTradezz"),
+            ticker_symbol="GGGM",
+            date_entered=dt.date(2021, 1, 4),
+            price_entered=2.0,
+        )
+        self.session.add(self.position)
+        self.session.commit()
+
+    def test_realized_return_is_stored_when_the_position_is_priced(self):
+        self.assertIsNone(self.position.realized_return)
+        self.position.date_closed = dt.date(2021, 2, 4)
+        self.session.commit()
+        self.assertIsNone(self.position.realized_return)
+        self.position.price_closed = 3.0
+        self.session.commit()
+        self.assertAlmostEqual(0.5, self.position.realized_return)
+
+    def test_schema_upgrade_adds_and_backfills_the_column(self):
+        self.position.date_closed = dt.date(2021, 2, 4)
+        self.position.price_closed = 1.0
+        self.session.commit()
+        self.session.close()
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_furu_ticker_realized_return"))
+            connection.execute(text("DROP INDEX ix_furu_ticker_furu_id_realized_return"))
+            connection.execute(text("ALTER TABLE furu_ticker DROP COLUMN realized_return"))
+
+        upgrade_db_schema(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                -0.5,
+                connection.execute(text("SELECT realized_return FROM furu_ticker")).scalar(),
+            )
+            indexes = connection.execute(
+                text("SELECT name FROM sqlite_master WHERE tbl_name = 'furu_ticker'")
+            ).scalars()
+            self.assertIn("ix_furu_ticker_furu_id_realized_return", list(indexes))
@@ -0,0 +1,67 @@
+import pathlib
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from rankr.db import enable_sqlite_savepoints, enable_sqlite_write_ahead_log
+from rankr.db.models import Furu
+from rankr.db.snapshots import (
+    SnapshotSessionPool,
+    create_snapshot_session_from_cfg,
+    publish_snapshot,
+)
+from tests.mocks.base import create_test_session
+
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self) -> None:
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        directory = pathlib.Path(self.snapshot_dir.name)
+        self.database_path = directory.joinpath("fururankr.db")
+        self.snapshot_path = directory.joinpath("snapshots", "fururankr_snapshot.db")
+        self.engine = enable_sqlite_write_ahead_log(
+            enable_sqlite_savepoints(create_engine(f"sqlite:///{self.database_path}"))
+        )
+        self.session = create_test_session(self.engine)
+        self.session.add(Furu(handle="MaxTradezz"))
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        self.session.close()
+        self.engine.dispose()
+        self.snapshot_dir.cleanup()
+
+    def publish(self):
+        return publish_snapshot(self.session, "test", snapshot_path=self.snapshot_path)
+
+    def get_handles(self, session) -> list:
+        return sorted(handle for (handle,) in session.query(Furu.handle))
+
+    def test_republished_snapshots_are_read_by_new_sessions(self):
+        self.assertEqual(self.snapshot_path, self.publish())
+        pool = SnapshotSessionPool(self.snapshot_path, self.database_path)
+        with pool.session() as session:
+            self.assertEqual(["MaxTradezz"], self.get_handles(session))
+
+        self.session.add(Furu(handle="PJ_Matlock"))
+        self.session.commit()
+        self.publish()
+        with pool.session() as session:
+            self.assertEqual(["MaxTradezz", "PJ_Matlock"], self.get_handles(session))
+        session = create_snapshot_session_from_cfg(snapshot_path=self.snapshot_path)
+        try:
+            self.assertEqual(["MaxTradezz", "PJ_Matlock"], self.get_handles(session))
+        finally:
+            session.close()
+            session.get_bind().dispose()
+        pool.dispose()
+
+        # no temporary copies are left next to the snapshot
+        self.assertEqual([self.snapshot_path], list(self.snapshot_path.parent.iterdir()))
+
+    def test_pool_reads_the_database_until_a_snapshot_is_published(self):
+        pool = SnapshotSessionPool(self.snapshot_path, self.database_path)
+        with pool.session() as session:
+            self.assertEqual(["MaxTradezz"], self.get_handles(session))
+        pool.dispose()
@@ -0,0 +1,114 @@
+import datetime as dt
+import json
+import pathlib
+import tempfile
+import threading
+import types
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from sqlalchemy import create_engine
+
+from rankr.db.caches import ReportCache
+from rankr.db.models import Furu, FuruTicker, Ticker
+from rankr.db.snapshots import SnapshotSessionPool
+from rankr.interfaces.api.server import ReadAPIServer
+from tests.mocks.base import create_test_session
+
+
+class TestReadAPIServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db_dir = tempfile.TemporaryDirectory()
+        db_path = pathlib.Path(self.db_dir.name, "fururankr.db")
+        self.session = create_test_session(create_engine(f"sqlite:///{db_path}"))
+        self.session.add_all([self.get_golden_furu(f"Furu{i}", 0.6 + i / 100) for i in range(3)])
+        self.session.commit()
+
+        self.server = ReadAPIServer(
+            ("127.0.0.1", 0),
+            SnapshotSessionPool(pathlib.Path(self.db_dir.name, "missing.db"), db_path),
+            ReportCache(None),
+        )
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.session.close()
+        self.db_dir.cleanup()
+
+    @staticmethod
+    def get_golden_furu(handle: str, accuracy: float) -> Furu:
+        furu = Furu(handle=handle)
+        furu.accuracy = accuracy
+        furu.performance_score = accuracy
+        furu.total_trades_measured = 40
+        furu.average_holding_period_days = 20
+        furu.average_profit = 0.2
+        furu.average_loss = -0.1
+        return furu
+
+    def get(self, path: str, etag: str = None):
+        request = urllib.request.Request(self.url + path)
+        if etag is not None:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers.get("ETag"), json.load(response)
+        except urllib.error.HTTPError as ex:
+            body = ex.read()
+            return ex.code, ex.headers.get("ETag"), json.loads(body) if body else None
+
+    def test_paginates_reports_with_an_etag_of_the_data_version(self):
+        status, etag, body = self.get("/leaderboard?page=2&page_size=2")
+        self.assertEqual(200, status)
+        self.assertEqual(3, body["total"])
+        self.assertEqual(["@Furu0"], [item["handle"] for item in body["items"]])
+
+        self.assertEqual((304, etag, None), self.get("/leaderboard?page=2&page_size=2", etag))
+        # another page is another entity
+        self.assertEqual(200, self.get("/leaderboard?page=1&page_size=2", etag)[0])
+
+        self.session.add(self.get_golden_furu("Furu3", 0.9))
+        self.session.commit()
+        status, new_etag, body = self.get("/leaderboard?page=2&page_size=2", etag)
+        self.assertEqual(200, status)
+        self.assertNotEqual(etag, new_etag)
+        self.assertEqual(4, body["total"])
+
+    def test_rejects_unknown_endpoints_and_parameters(self):
+        self.assertEqual(404, self.get("/furus")[0])
+        self.assertEqual(404, self.get("/furus/Nobody/portfolio")[0])
+        self.assertEqual(400, self.get("/leaderboard?sort_by=handle")[0])
+        self.assertEqual(400, self.get("/ticker-scores")[0])
+        self.assertEqual(400, self.get("/best-trades?page_size=0")[0])
+
+    def test_date_dependent_reports_change_with_the_day(self):
+        furu = self.session.query(Furu).filter(Furu.handle == "Furu0").one()
+        self.session.add(
+            FuruTicker(furu=furu, ticker=Ticker("GGGM"), date_entered=dt.date(2021, 6, 1))
+        )
+        self.session.commit()
+
+        class FrozenDate(dt.date):
+            frozen_today = dt.date(2021, 6, 10)
+
+            @classmethod
+            def today(cls):
+                return cls.frozen_today
+
+        frozen_dt = types.SimpleNamespace(date=FrozenDate)
+        with mock.patch("rankr.interfaces.api.server.dt", frozen_dt):
+            status, etag, body = self.get("/furus/Furu0/portfolio")
+            self.assertEqual(9, body["items"][0]["days_held"])
+            self.assertEqual(304, self.get("/furus/Furu0/portfolio", etag)[0])
+
+            # the data did not change, but a day passed
+            FrozenDate.frozen_today = dt.date(2021, 6, 11)
+            status, new_etag, body = self.get("/furus/Furu0/portfolio", etag)
+            self.assertEqual(200, status)
+            self.assertNotEqual(etag, new_etag)
+            self.assertEqual(10, body["items"][0]["days_held"])
@@ -0,0 +1,44 @@
+import datetime as dt
+
+from rankr.db.models import Furu, FuruTicker, Ticker
+from rankr.scripts.analytics.print_best_trades import (
+    get_best_trades_df,
+    get_worst_trades_df,
+)
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestBestTrades(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.furus = [Furu(handle="MaxTradezz"), Furu(handle="JeffBezos")]
+        ticker = Ticker("GGGM")
+        for furu, month, price_closed in [
+            (self.furus[0], 1, 3.0),
+            (self.furus[0], 2, 0.5),
+            (self.furus[1], 3, 2.0),
+            (self.furus[1], 4, None),
+        ]:
+            self.session.add(
+                FuruTicker(
+                    furu=furu,
+                    ticker=ticker,
+                    date_entered=dt.date(2021, month, 1),
+                    date_closed=dt.date(2021, month, 20),
+                    price_entered=1.0,
+                    price_closed=price_closed,
+                )
+            )
+        self.session.commit()
+
+    def test_best_and_worst_trades(self):
+        best_trades = get_best_trades_df(self.session)
+        self.assertEqual([3.0, 2.0, 0.5], list(best_trades.investment_return))
+        worst_trades = get_worst_trades_df(self.session, limit=2)
+        self.assertEqual([0.5, 2.0], list(worst_trades.price_closed))
+        furu_trades = get_best_trades_df(self.session, furu_id=self.furus[1].id)
+        self.assertEqual(["JeffBezos"], list(furu_trades.handle))
+        period_trades = get_best_trades_df(
+            self.session, closed_from=dt.date(2021, 2, 1), closed_to=dt.date(2021, 2, 28)
+        )
+        self.assertEqual([0.5], list(period_trades.price_closed))
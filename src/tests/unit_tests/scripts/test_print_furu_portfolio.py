@@ -0,0 +1,57 @@
+import datetime as dt
+
+from rankr.db.models import Furu, FuruTicker, Ticker
+from rankr.scripts.analytics.print_furu_portfolio import get_open_trades_by_furus
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestFuruPortfolio(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.today = dt.date(2021, 6, 10)
+        self.furus = [Furu(handle=handle) for handle in ["MaxTradezz", "JeffBezos", "Gal"]]
+        tickers = {symbol: Ticker(symbol) for symbol in ["GGGM", "LAPK", "TSLA", "AMC"]}
+        holdings = {
+            "MaxTradezz": ["GGGM", "LAPK", "TSLA", "AMC"],
+            "JeffBezos": ["GGGM", "LAPK"],
+            "Gal": ["GGGM"],
+        }
+        for furu in self.furus:
+            for days_ago, symbol in enumerate(holdings[furu.handle]):
+                self.session.add(
+                    FuruTicker(
+                        furu=furu,
+                        ticker=tickers[symbol],
+                        date_entered=self.today - dt.timedelta(days=10 * (days_ago + 1)),
+                    )
+                )
+        self.session.add(
+            FuruTicker(
+                furu=self.furus[2],
+                ticker=tickers["TSLA"],
+                date_entered=dt.date(2021, 1, 4),
+                date_closed=dt.date(2021, 2, 1),
+            )
+        )
+        self.session.commit()
+
+    def test_all_furus_portfolio_with_medals(self):
+        frame = get_open_trades_by_furus(self.session, today=self.today).set_index("symbol")
+        self.assertEqual(["GGGM", "LAPK", "TSLA", "AMC"], list(frame.index))
+        # an empty selection means all furus too
+        empty_selection_frame = get_open_trades_by_furus(self.session, [], self.today)
+        self.assertEqual(list(frame.index), list(empty_selection_frame.symbol))
+        self.assertEqual([3, 2, 1, 1], list(frame.trader_count))
+        self.assertEqual([10, 20, 30, 40], list(frame.days_held))
+        self.assertEqual(["🥇", "🥈", "🥉", ""], list(frame.most_present_traders))
+
+    def test_selected_furus_portfolio(self):
+        frame = get_open_trades_by_furus(
+            self.session, [self.furus[1].id, self.furus[2].id], self.today
+        )
+        self.assertEqual(["GGGM", "LAPK"], list(frame.symbol))
+        self.assertEqual(["🥇", "🥈"], list(frame.most_present_traders))
+
+        frame = get_open_trades_by_furus(self.session, [self.furus[2].id], self.today)
+        self.assertEqual(["GGGM"], list(frame.symbol))
+        self.assertNotIn("most_present_traders", frame.columns)
@@ -0,0 +1,123 @@
+import datetime as dt
+import unittest
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from rankr.db.models import Furu, FuruTicker, Ticker
+from rankr.scripts.analytics.print_golden_portfolio import (
+    add_scores_to_frame,
+    aggregate_golden_positions,
+    get_consensus_golden_portfolio,
+    get_golden_portfolio,
+)
+from rankr.scripts.analytics.print_ticker_scores import get_ticker_scores_table
+from tests.mocks.base import create_test_session
+
+
+class TestGoldenPortfolio(unittest.TestCase):
+    def setUp(self) -> None:
+        self.today = dt.date(2021, 6, 10)
+        self.positions = pd.DataFrame(
+            {
+                "symbol": ["GGGM", "GGGM", "LAPK"],
+                "furu_id": [1, 2, 1],
+                "handle": ["MaxTradezz", "JeffBezos", "MaxTradezz"],
+                "date_entered": ["2021-06-09", "2021-06-03", "2021-05-03"],
+                "date_last_mentioned": ["2021-06-09", None, "2021-05-20"],
+                "price_entered": [1.0, 2.0, 3.0],
+                "accuracy": [0.6, 0.8, 0.6],
+                "average_profit": [0.1, 0.3, 0.1],
+                "average_holding_period_days": [20.0, 30.0, 20.0],
+                "price_marked": [None, None, None],
+                "unrealized_return": [None, None, None],
+            }
+        )
+
+    def test_scores_are_aggregated_per_symbol(self):
+        frame = aggregate_golden_positions(self.positions, self.today).set_index("symbol")
+        self.assertEqual(2, frame.loc["GGGM", "furu_count"])
+        self.assertEqual("MaxTradezz JeffBezos", frame.loc["GGGM", "handles"])
+        self.assertEqual("2021-06-03", frame.loc["GGGM", "earliest_entry"])
+        self.assertAlmostEqual(0.7, frame.loc["GGGM", "accuracy"])
+        # missing last mentions are left out, like GROUP_CONCAT skipping NULLs
+        self.assertEqual(1.0, frame.loc["GGGM", "last_mention_score"])
+        self.assertAlmostEqual((1 + 1 / 3) / 2, frame.loc["GGGM", "entry_score"])
+        self.assertEqual(0.0, frame.loc["LAPK", "last_mention_score"])
+        self.assertEqual(0.0, frame.loc["LAPK", "entry_score"])
+
+    def test_golden_rank(self):
+        frame = aggregate_golden_positions(self.positions, self.today)
+        frame["max_golden_traders"] = frame.furu_count.max()
+        frame["total_traders_tracked"] = 3
+        frame["total_trader_count"] = [2, 3]
+        frame = add_scores_to_frame(frame).set_index("symbol")
+        self.assertAlmostEqual(1 - 2 / 2, frame.loc["GGGM", "ecosystem_saturation_score"])
+        # crowds larger than two thirds of all tracked furus are saturated
+        self.assertEqual(0.0, frame.loc["LAPK", "ecosystem_saturation_score"])
+        self.assertAlmostEqual(
+            0.5 + 0.2 * 1.0 + 0.1 * (2 / 3), frame.loc["GGGM", "golden_rank"]
+        )
+
+    def create_positions_session(self) -> Session:
+        session = create_test_session()
+        furus = {
+            furu_id: Furu(
+                handle=handle,
+                accuracy=0.6,
+                average_profit=0.1,
+                avg_holding_period=20,
+                total_trades_measured=40,
+                performance_score=0.5,
+            )
+            for furu_id, handle in [(1, "MaxTradezz"), (2, "JeffBezos")]
+        }
+        tickers = {symbol: Ticker(symbol) for symbol in ["GGGM", "LAPK"]}
+        for row in self.positions.itertuples():
+            session.add(
+                FuruTicker(
+                    furu=furus[row.furu_id],
+                    ticker=tickers[row.symbol],
+                    date_entered=dt.date.fromisoformat(row.date_entered),
+                    date_last_mentioned=dt.date.fromisoformat(row.date_last_mentioned)
+                    if row.date_last_mentioned
+                    else None,
+                    price_entered=row.price_entered,
+                )
+            )
+        session.add(Furu(handle="Unscored"))
+        session.commit()
+        return session
+
+    def test_consensus_portfolio_matches_aggregated_positions(self):
+        session = self.create_positions_session()
+        consensus = get_consensus_golden_portfolio(session, self.today)
+        positions = self.positions.assign(accuracy=0.6, average_profit=0.1)
+        positions["average_holding_period_days"] = 20.0
+        expected = aggregate_golden_positions(positions, self.today)
+        columns = [
+            "symbol",
+            "furu_count",
+            "earliest_entry",
+            "lastest_entry",
+            "max_price_paid",
+            "accuracy",
+            "holding_period",
+            "last_mention_score",
+            "entry_score",
+        ]
+        pd.testing.assert_frame_equal(
+            expected[columns].sort_values("symbol").reset_index(drop=True),
+            consensus[columns].sort_values("symbol").reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    def test_ticker_scores_match_the_golden_portfolio(self):
+        session = self.create_positions_session()
+        portfolio = get_golden_portfolio(session).set_index("symbol")
+        scores = get_ticker_scores_table(session, ["gggm", "NONE"]).set_index("symbol")
+        self.assertEqual(["GGGM"], list(scores.index))
+        for column in ["furu_count", "ecosystem_saturation_score", "golden_rank"]:
+            self.assertAlmostEqual(
+                portfolio.loc["GGGM", column], scores.loc["GGGM", column]
+            )
@@ -0,0 +1,48 @@
+import datetime as dt
+
+from rankr.db.models import Furu, FuruRisk
+from rankr.scripts.analytics.print_leaderboard import get_leaderboard
+from tests.mocks.base import InMemoryDbTestCase
+
+
+class TestLeaderboard(InMemoryDbTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for handle, max_drawdown, max_days_under_water in [
+            ("MaxTradezz", -0.4, 10),
+            ("JibbyTrading", -0.1, 30),
+        ]:
+            furu = Furu(
+                handle=handle,
+                accuracy=0.6,
+                average_profit=0.2,
+                avg_holding_period=20,
+                total_trades_measured=40,
+                average_loss=-0.1,
+                performance_score=0.5,
+            )
+            self.session.add(furu)
+            self.session.flush()
+            self.session.add(
+                FuruRisk(
+                    furu_id=furu.id,
+                    date_computed=dt.date(2021, 6, 1),
+                    trading_days=100,
+                    max_drawdown=max_drawdown,
+                    max_days_under_water=max_days_under_water,
+                )
+            )
+        self.session.commit()
+
+    def get_handles(self, sort_by: str) -> list:
+        return get_leaderboard(self.session, sort_by).handle.tolist()
+
+    def test_least_risky_furus_rank_first(self):
+        self.assertEqual(["@JibbyTrading", "@MaxTradezz"], self.get_handles("max_drawdown"))
+        self.assertEqual(
+            ["@MaxTradezz", "@JibbyTrading"], self.get_handles("max_days_under_water")
+        )
+
+    def test_unknown_sort_column_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_leaderboard(self.session, "handle; DROP TABLE furu")